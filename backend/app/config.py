@@ -39,7 +39,43 @@ class Settings(BaseSettings):
     
     # Database
     db_url: str = "sqlite:///storage/db/events.sqlite"
+    sqlite_synchronous: str = "NORMAL"  # NORMAL is safe with WAL; FULL also fsyncs every commit
+    sqlite_cache_kb: int = 16384
+    sqlite_mmap_mb: int = 64
+    sqlite_busy_timeout_ms: int = 5000
+    db_workers: int = 4  # Threads running blocking DB calls for async routes
     
+    # Event writer (single thread, group commit)
+    event_write_batch: int = 1000  # Max rows per transaction
+    event_write_delay_ms: int = 20  # Max time a write waits for others to share its commit
+
+    # Event retention (older whole days move to compressed archive files)
+    event_retention_days: int = 30  # 0 = keep everything in the database
+    archive_interval_sec: int = 3600
+    archive_format: str = "auto"  # auto (parquet when pyarrow is installed), parquet, json
+
+    # Heatmaps (event boxes binned into fixed-size cells of the camera frame)
+    heatmap_cell_px: int = 16
+    heatmap_width_px: int = 1920  # Largest frame size covered; boxes beyond are clamped
+    heatmap_height_px: int = 1080
+    heatmap_flush_sec: float = 5.0
+
+    # Uploads
+    upload_chunk_kb: int = 1024  # Read size when streaming uploads to disk
+    upload_session_ttl_hours: int = 24  # Unfinished resumable uploads are discarded after this
+
+    # Storage budgets (MB per category under storage_root; 0 = unlimited). Files of events
+    # in the database are kept; archived events lose their refs when their files are evicted
+    storage_budget_videos_mb: int = 8192
+    storage_budget_snaps_mb: int = 2048
+    storage_budget_clips_mb: int = 4096
+    storage_budget_uploads_mb: int = 2048
+    storage_min_free_mb: int = 512  # Also evict while the disk has less free space than this
+    storage_scan_interval_sec: int = 300
+
+    # Responses
+    response_gzip_min_bytes: int = 32768  # Gzip large event pages (0 = never)
+
     # Security
     jwt_secret: str = "change_me_in_production"
     jwt_algorithm: str = "HS256"
@@ -47,7 +83,12 @@ class Settings(BaseSettings):
     
     # Detection Service
     detection_service_url: str = "http://localhost:8010"
-    
+
+    # WebSocket relays
+    live_client_queue_size: int = 1  # Pending frames per client (1 = latest only)
+    alert_client_queue_size: int = 100  # Pending alerts per client before the oldest is dropped
+    alert_replay_size: int = 20  # Recent alerts sent to newly connected clients
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -0,0 +1,422 @@
+"""Day-partitioned archive for events past the retention period."""
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, func
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+import gzip
+import heapq
+import itertools
+import json
+import os
+import threading
+
+from app.config import settings
+from .models import Event
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: fall back to gzip'd JSON columns
+    pa = None
+    pq = None
+
+DAY_SEC = 86400
+COLUMNS = [
+    "id", "event_id", "camera_id", "model", "type", "zone", "cls", "track_id", "conf",
+    "t_start", "t_end", "snapshot_path", "video_ref", "bbox_xyxy", "event_metadata", "created_at"
+]
+# Rows per database fetch and per Parquet row group while archiving (and so per batch read back)
+ARCHIVE_BATCH = 5000
+
+
+@lru_cache(maxsize=16)
+def arrow_schema(columns: Tuple[str, ...] = tuple(COLUMNS)):
+    """Fixed Arrow schema for archive columns (requires pyarrow).
+
+    Types never depend on the data, so a column that happens to be all
+    null in one batch or day file is still typed like every other.
+    """
+    types = {
+        "id": pa.int64(),
+        "event_id": pa.string(),
+        "camera_id": pa.string(),
+        "model": pa.string(),
+        "type": pa.string(),
+        "zone": pa.string(),
+        "cls": pa.string(),
+        "track_id": pa.int64(),
+        "conf": pa.float64(),
+        "t_start": pa.float64(),
+        "t_end": pa.float64(),
+        "snapshot_path": pa.string(),
+        "video_ref": pa.string(),
+        "bbox_xyxy": pa.list_(pa.float64()),
+        "event_metadata": pa.string(),  # JSON text
+        "created_at": pa.timestamp("us")
+    }
+    return pa.schema([(col, types[col]) for col in columns])
+
+
+def _parse_created(columns: Dict[str, List]) -> Dict[str, List]:
+    """created_at as datetimes (JSON files and older Parquet files hold ISO strings)."""
+    values = columns.get("created_at") or []
+    if any(isinstance(v, str) for v in values):
+        columns["created_at"] = [datetime.fromisoformat(v) if isinstance(v, str) else v for v in values]
+    return columns
+
+
+def _day_name(day: int) -> str:
+    """File stem for a UTC day number."""
+    from datetime import datetime, timezone
+    return datetime.fromtimestamp(day * DAY_SEC, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class EventArchive:
+    """Compressed columnar files holding one UTC day of events each.
+
+    Files are Parquet when pyarrow is installed, otherwise gzip'd JSON
+    columns. Rows are sorted by (t_start, id). Everything older than
+    `horizon` lives only in the archive, so readers merge the two.
+
+    Parquet days are read back one row group at a time, skipping groups
+    whose t_start statistics fall outside the range, so readers hold at
+    most one group in memory. A JSON day has to be decoded whole.
+    """
+
+    def __init__(self, root: Path, fmt: str = "auto"):
+        self.root = root
+        self.format = "parquet" if fmt == "parquet" or (fmt == "auto" and pq is not None) else "json"
+        if self.format == "parquet" and pq is None:
+            print("pyarrow not installed; archiving events as gzip'd JSON columns")
+            self.format = "json"
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # One day rewrite at a time (archiving, dropped references)
+        self._days: Optional[Dict[int, Path]] = None
+
+    # Partitions
+
+    def days(self) -> Dict[int, Path]:
+        """Archived UTC day numbers mapped to their files."""
+        with self.lock:
+            if self._days is None:
+                from datetime import datetime, timezone
+                days = {}
+                if self.root.exists():
+                    for path in self.root.iterdir():
+                        stem = path.name.split(".")[0]
+                        try:
+                            ts = datetime.strptime(stem, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+                        except ValueError:
+                            continue
+                        days[int(ts) // DAY_SEC] = path
+                self._days = days
+            return dict(self._days)
+
+    @property
+    def horizon(self) -> float:
+        """Events before this timestamp may be archived (0 when nothing is)."""
+        days = self.days()
+        return (max(days) + 1) * DAY_SEC if days else 0.0
+
+    def days_in_range(self, t_start: Optional[float], t_end: Optional[float]) -> List[int]:
+        """Archived days overlapping a time range (partition pruning), oldest first."""
+        first = int(t_start // DAY_SEC) if t_start is not None else None
+        last = int(t_end // DAY_SEC) if t_end is not None else None
+        return sorted(
+            day for day in self.days()
+            if (first is None or day >= first) and (last is None or day <= last)
+        )
+
+    # File IO
+
+    def _path(self, day: int) -> Path:
+        """File path for a day in the configured format."""
+        return self.root / (_day_name(day) + (".parquet" if self.format == "parquet" else ".json.gz"))
+
+    def read_batches(
+        self,
+        day: int,
+        columns: Optional[Sequence[str]] = None,
+        t_start: Optional[float] = None,
+        t_end: Optional[float] = None,
+        newest_first: bool = False
+    ) -> Iterator[Dict[str, List]]:
+        """Decode a day's columns a batch at a time, in file order or reversed.
+
+        Batches are whole Parquet row groups; those entirely outside
+        [t_start, t_end] are skipped (rows inside a batch are not filtered).
+        """
+        path = self.days().get(day)
+        if path is None:
+            return
+        columns = list(columns or COLUMNS)
+        if path.suffix == ".parquet":
+            if pq is None:
+                raise RuntimeError(f"pyarrow is required to read {path.name}")
+            parquet = pq.ParquetFile(path)
+            t_index = parquet.schema_arrow.get_field_index("t_start")
+            groups = range(parquet.num_row_groups)
+            for i in (reversed(groups) if newest_first else groups):
+                stats = parquet.metadata.row_group(i).column(t_index).statistics
+                if stats is not None and stats.has_min_max:
+                    if (t_start is not None and stats.max < t_start) or (t_end is not None and stats.min > t_end):
+                        continue
+                yield _parse_created(parquet.read_row_group(i, columns=columns).to_pydict())
+        else:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                decoded = json.load(f)["columns"]
+            yield _parse_created({col: decoded[col] for col in columns})
+
+    def _write_day(self, day: int, rows: Iterable[Dict[str, Any]]):
+        """Write one day's rows, already in (t_start, id) order, atomically (temp file + rename).
+
+        Parquet is written a row group at a time, so the day is never held in
+        memory; the JSON fallback needs every column complete before writing.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(day)
+        tmp = path.with_name(path.name + ".tmp")
+        if self.format == "parquet":
+            schema = arrow_schema()
+            with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+                batch = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= ARCHIVE_BATCH:
+                        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                        batch = []
+                if batch:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        else:
+            columns = {col: [] for col in COLUMNS}
+            for row in rows:
+                for col in COLUMNS:
+                    columns[col].append(row[col])
+            columns["created_at"] = [v.isoformat() if v else None for v in columns["created_at"]]
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump({"version": 1, "columns": columns}, f, separators=(",", ":"))
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        with self.lock:
+            old = (self._days or {}).get(day)
+            if old is not None and old != path:
+                old.unlink(missing_ok=True)
+            if self._days is not None:
+                self._days[day] = path
+
+    def _archived_rows(self, day: int) -> Iterator[Dict[str, Any]]:
+        """Rows already in a day's file, in file order."""
+        for columns in self.read_batches(day):
+            for i in range(len(columns["id"])):
+                yield {col: columns[col][i] for col in COLUMNS}
+
+    def drop_references(self, urls: Set[str]) -> int:
+        """Null out snapshot_path and video_ref of archived events pointing at deleted files.
+
+        `urls` are /storage URLs without fragments. Only days referencing one
+        of them are rewritten; returns how many were.
+        """
+        def dropped(ref: Optional[str]) -> bool:
+            return ref is not None and ref.split("#", 1)[0] in urls
+
+        rewritten = 0
+        for day in sorted(self.days()):
+            with self.write_lock:
+                if not any(
+                    dropped(ref)
+                    for batch in self.read_batches(day, ("snapshot_path", "video_ref"))
+                    for refs in batch.values() for ref in refs
+                ):
+                    continue
+                self._write_day(day, (
+                    dict(row, **{col: None for col in ("snapshot_path", "video_ref") if dropped(row[col])})
+                    for row in self._archived_rows(day)
+                ))
+            rewritten += 1
+        return rewritten
+
+    # Archiving
+
+    def archive_older_than(self, db: Session, cutoff: float) -> int:
+        """Move events from whole UTC days before `cutoff` into the archive.
+
+        Returns the number of events archived.
+        """
+        cutoff_day = int(cutoff // DAY_SEC)
+        oldest = db.execute(select(func.min(Event.t_start))).scalar()
+        if oldest is None:
+            return 0
+
+        archived = 0
+        for day in range(int(oldest // DAY_SEC), cutoff_day):
+            start, end = day * DAY_SEC, (day + 1) * DAY_SEC
+            # Column tuples through a streaming cursor, not ORM objects
+            result = db.execute(
+                select(*[getattr(Event, col) for col in COLUMNS])
+                .where(Event.t_start >= start, Event.t_start < end)
+                .order_by(Event.t_start, Event.id)
+                .execution_options(yield_per=ARCHIVE_BATCH)
+            ).mappings()
+            first = next(result, None)
+            if first is None:
+                result.close()
+                continue
+
+            stats = {"count": 0, "max_id": 0}
+            rows = self._counted(itertools.chain([first], result), stats)
+            with self.write_lock:
+                if day in self.days():
+                    # Late events for a day that is already archived: merge
+                    rows = _merge_rows(rows, self._archived_rows(day))
+                self._write_day(day, rows)
+            db.commit()  # End the read so the delete starts from a fresh snapshot
+
+            # Only drop the rows once their file is durable. Events inserted for
+            # this day meanwhile have higher ids and wait for the next run.
+            db.execute(delete(Event).where(
+                Event.t_start >= start, Event.t_start < end, Event.id <= stats["max_id"]
+            ))
+            db.commit()
+            archived += stats["count"]
+            print(f"Archived {stats['count']} events for {_day_name(day)}")
+        return archived
+
+    def _counted(self, rows: Iterator, stats: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+        """Convert database rows, tallying their count and highest id into `stats`."""
+        for row in rows:
+            stats["count"] += 1
+            stats["max_id"] = max(stats["max_id"], row["id"])
+            yield self._row(row)
+
+    @staticmethod
+    def _row(event) -> Dict[str, Any]:
+        """Flatten an event row (column mapping) into archive column values."""
+        return {
+            "id": event["id"],
+            "event_id": event["event_id"],
+            "camera_id": event["camera_id"],
+            "model": event["model"],
+            "type": event["type"],
+            "zone": event["zone"],
+            "cls": event["cls"],
+            "track_id": event["track_id"],
+            "conf": event["conf"],
+            "t_start": event["t_start"],
+            "t_end": event["t_end"],
+            "snapshot_path": event["snapshot_path"],
+            "video_ref": event["video_ref"],
+            "bbox_xyxy": [float(v) for v in (event["bbox_xyxy"] or [])],
+            "event_metadata": json.dumps(event["event_metadata"] or {}),
+            "created_at": event["created_at"]
+        }
+
+    # Reading
+
+    def scan(
+        self,
+        filters: Optional[Dict[str, Set]] = None,
+        t_start: Optional[float] = None,
+        t_end: Optional[float] = None,
+        min_conf: Optional[float] = None,
+        before: Optional[Tuple[float, int]] = None,
+        newest_first: bool = True,
+        end_inclusive: bool = True,
+        columns: Optional[Sequence[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield archived rows matching equality filters and a time range.
+
+        `filters` maps column names to sets of accepted values; `before` is a
+        keyset cursor (t_start, id) that rows must sort strictly before.
+        With `columns`, rows only hold those columns (and only the columns
+        needed for filtering are read besides).
+        """
+        upper = t_end
+        if before is not None:
+            upper = before[0] if upper is None else min(upper, before[0])
+        days = self.days_in_range(t_start, upper)
+        if newest_first:
+            days.reverse()
+        checks = [(col, values) for col, values in (filters or {}).items() if values]
+        wanted = list(columns or COLUMNS)
+        needed = set(wanted) | {"t_start", "id"} | {col for col, _ in checks}
+        if min_conf is not None:
+            needed.add("conf")
+        read = [col for col in COLUMNS if col in needed]
+
+        for day in days:
+            for batch in self.read_batches(day, read, t_start, upper, newest_first):
+                ts = batch["t_start"]
+                indices = range(len(ts) - 1, -1, -1) if newest_first else range(len(ts))
+                for i in indices:
+                    t = ts[i]
+                    if t_start is not None and t < t_start:
+                        continue
+                    if t_end is not None and (t > t_end if end_inclusive else t >= t_end):
+                        continue
+                    if before is not None and (t, batch["id"][i]) >= before:
+                        continue
+                    if min_conf is not None and (batch["conf"][i] or 0.0) < min_conf:
+                        continue
+                    if any(batch[col][i] not in values for col, values in checks):
+                        continue
+                    yield {col: batch[col][i] for col in wanted}
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Set]] = None,
+        t_start: Optional[float] = None,
+        t_end: Optional[float] = None,
+        min_conf: Optional[float] = None,
+        before: Optional[Tuple[float, int]] = None,
+        limit: int = 100,
+        columns: Optional[Sequence[str]] = None
+    ) -> List[Event]:
+        """Newest matching archived events as detached Event objects.
+
+        With `columns`, returns named tuples of those columns instead.
+        """
+        row_type = _row_type(tuple(columns)) if columns is not None else None
+        events = []
+        for row in self.scan(filters, t_start, t_end, min_conf, before, columns=columns):
+            events.append(to_event(row) if row_type is None else row_type._make(row[col] for col in columns))
+            if len(events) >= limit:
+                break
+        return events
+
+
+@lru_cache(maxsize=16)
+def _row_type(columns: Tuple[str, ...]):
+    """Named tuple type for a column projection."""
+    return namedtuple("ArchivedRow", columns)
+
+
+def _merge_rows(new: Iterator[Dict[str, Any]], archived: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Merge two (t_start, id)-ordered row streams; a new row replaces an archived one with the same id."""
+    last = None
+    tagged_new = ((row["t_start"], row["id"], 0, row) for row in new)
+    tagged_archived = ((row["t_start"], row["id"], 1, row) for row in archived)
+    for t, row_id, _, row in heapq.merge(tagged_new, tagged_archived, key=lambda item: item[:3]):
+        if (t, row_id) != last:
+            yield row
+        last = (t, row_id)
+
+
+def to_event(row: Dict[str, Any]) -> Event:
+    """Build a transient Event from an archived row."""
+    data = dict(row)
+    data["event_metadata"] = json.loads(data["event_metadata"] or "{}")
+    return Event(**data)
+
+
+def merge_newest(hot: List[Event], archived: List[Event], limit: int, offset: int = 0) -> List[Event]:
+    """Merge two newest-first event lists by (t_start, id) and take a page."""
+    merged = sorted(hot + archived, key=lambda e: (e.t_start, e.id), reverse=True)
+    return merged[offset:offset + limit]
+
+
+event_archive = EventArchive(settings.storage_root_path / "archive" / "events", settings.archive_format)
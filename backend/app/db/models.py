@@ -1,5 +1,5 @@
 """Database models."""
-from sqlalchemy import Column, String, Float, Integer, Boolean, DateTime, JSON, Text
+from sqlalchemy import Column, String, Float, Integer, Boolean, DateTime, JSON, Text, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -27,6 +27,42 @@ class Event(Base):
     bbox_xyxy = Column(JSON)  # [x1, y1, x2, y2]
     event_metadata = Column(JSON, default={})  # Renamed from 'metadata' (SQLAlchemy reserved)
     created_at = Column(DateTime, server_default=func.now())
+    
+    # Equality filter + time order; the trailing id serves keyset pagination on (t_start, id)
+    __table_args__ = (
+        Index("ix_events_t_start_id", "t_start", "id"),
+        Index("ix_events_zone_t_start", "zone", "t_start", "id"),
+        Index("ix_events_cls_t_start", "cls", "t_start", "id"),
+        Index("ix_events_zone_cls_t_start", "zone", "cls", "t_start", "id"),
+        Index("ix_events_model_t_start", "model", "t_start", "id"),
+        Index("ix_events_camera_t_start", "camera_id", "t_start", "id"),
+        Index("ix_events_type_t_start", "type", "t_start", "id"),
+        # Storage eviction checks whether any event still points at a file
+        Index("ix_events_snapshot_path", "snapshot_path"),
+        Index("ix_events_video_ref", "video_ref"),
+    )
+
+
+class EventRollup(Base):
+    """Pre-aggregated event counts per time bucket (minute and hour)."""
+    __tablename__ = "event_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    bucket_size = Column(Integer)  # Seconds: 60 or 3600
+    bucket_start = Column(Integer)  # Epoch seconds, multiple of bucket_size
+    camera_id = Column(String, default="")
+    zone = Column(String, default="")  # "" when the event has no zone
+    cls = Column(String, default="")
+    type = Column(String, default="")
+    count = Column(Integer, default=0)
+    conf_sum = Column(Float, default=0.0)
+    conf_min = Column(Float)
+    conf_max = Column(Float)
+    
+    __table_args__ = (
+        UniqueConstraint("bucket_size", "bucket_start", "camera_id", "zone", "cls", "type",
+                         name="uq_event_rollups_key"),
+    )
 
 
 class Zone(Base):
@@ -87,3 +123,14 @@ class SOSLog(Base):
     event_id = Column(String, nullable=True)
     timestamp = Column(DateTime, server_default=func.now())
 
+
+class StoredFile(Base):
+    """Index of files under the storage root, for budgets and LRU eviction."""
+    __tablename__ = "stored_files"
+    
+    id = Column(Integer, primary_key=True)
+    path = Column(String, unique=True, index=True)  # Relative to the storage root, e.g. snaps/x.jpg
+    category = Column(String, index=True)  # videos, snaps, clips, uploads
+    size = Column(Integer, default=0)
+    sha256 = Column(String, nullable=True)  # Set for content-addressed uploads
+    last_access = Column(Float, index=True)  # Epoch seconds
@@ -1,11 +1,35 @@
 """Database repository."""
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional, Dict, Any
+from sqlalchemy import and_, or_, insert, select, delete, func, cast, literal, Integer
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import List, Optional, Dict, Any, Sequence, Tuple
 from datetime import datetime
+import base64
 import json
+import threading
 
-from .models import Event, Zone, Model, User, SOSLog
+from .models import Event, EventRollup, Zone, Model, User, SOSLog, StoredFile
+from .archive import event_archive, merge_newest
+
+# Rollup granularities (seconds) maintained on insert
+ROLLUP_BUCKETS = (60, 3600)
+# Bucket sizes /stats may pick from, smallest first
+STATS_BUCKETS = (60, 300, 900, 3600, 3 * 3600, 6 * 3600, 86400, 7 * 86400)
+
+
+def encode_cursor(t_start: float, row_id: int) -> str:
+    """Encode a keyset pagination cursor for the (t_start, id) position of a row."""
+    return base64.urlsafe_b64encode(json.dumps([t_start, row_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Decode a cursor from encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        t_start, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(t_start), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
 
 
 class EventRepo:
@@ -16,10 +40,49 @@ class EventRepo:
         """Create event."""
         event = Event(**event_data)
         db.add(event)
+        RollupRepo.add(db, [event_data])
         db.commit()
         db.refresh(event)
         return event
     
+    @staticmethod
+    def create_many(db: Session, events_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create events in a single transaction, skipping event_ids that already exist.
+        
+        Returns the rows that were actually inserted.
+        """
+        new_rows = EventRepo.insert_new(db, events_data)
+        db.commit()
+        return new_rows
+    
+    @staticmethod
+    def insert_new(db: Session, events_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert events whose event_id is not stored yet, without committing.
+        
+        Returns the rows that were inserted.
+        """
+        # De-duplicate within the batch first (first occurrence wins)
+        unique: Dict[str, Dict[str, Any]] = {}
+        for event_data in events_data:
+            unique.setdefault(event_data["event_id"], event_data)
+        if not unique:
+            return []
+        
+        # Look up already stored IDs in chunks to stay under SQLite's variable limit
+        event_ids = list(unique)
+        existing = set()
+        for i in range(0, len(event_ids), 500):
+            chunk = event_ids[i:i + 500]
+            existing.update(
+                row[0] for row in db.query(Event.event_id).filter(Event.event_id.in_(chunk))
+            )
+        
+        new_rows = [data for event_id, data in unique.items() if event_id not in existing]
+        if new_rows:
+            db.execute(insert(Event), new_rows)
+            RollupRepo.add(db, new_rows)
+        return new_rows
+    
     @staticmethod
     def get_by_id(db: Session, event_id: str) -> Optional[Event]:
         """Get event by ID."""
@@ -34,10 +97,21 @@ class EventRepo:
         t_start: Optional[float] = None,
         t_end: Optional[float] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        camera_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        cursor: Optional[Tuple[float, int]] = None,
+        columns: Optional[Sequence[str]] = None
     ) -> List[Event]:
-        """List events with filters."""
-        query = db.query(Event)
+        """List events with filters, newest first.
+        
+        Pass `cursor` (the (t_start, id) of the last row of the previous page)
+        for keyset pagination; `offset` still works but gets slower with depth.
+        Ranges reaching past the retention horizon also read archived days.
+        With `columns` (which must include t_start and id), rows are returned
+        as named tuples of just those columns instead of Event entities.
+        """
+        query = db.query(Event) if columns is None else db.query(*[getattr(Event, col) for col in columns])
         
         if zone:
             query = query.filter(Event.zone == zone)
@@ -45,12 +119,195 @@ class EventRepo:
             query = query.filter(Event.cls == cls)
         if model:
             query = query.filter(Event.model == model)
+        if camera_id:
+            query = query.filter(Event.camera_id == camera_id)
+        if event_type:
+            query = query.filter(Event.type == event_type)
         if t_start:
             query = query.filter(Event.t_start >= t_start)
         if t_end:
             query = query.filter(Event.t_start <= t_end)
+        if cursor:
+            last_t, last_id = cursor
+            query = query.filter(or_(
+                Event.t_start < last_t,
+                and_(Event.t_start == last_t, Event.id < last_id)
+            ))
+        
+        query = query.order_by(Event.t_start.desc(), Event.id.desc())
+        horizon = event_archive.horizon
+        if not horizon or (t_start and t_start >= horizon):
+            query = query.limit(limit)
+            if offset:
+                query = query.offset(offset)
+            return query.all()
+        
+        # Archived rows are all older than the horizon, so they are only needed
+        # when the page isn't filled by newer rows from the database
+        wanted = offset + limit
+        hot = query.limit(wanted).all()
+        if len(hot) >= wanted and hot[-1].t_start >= horizon:
+            return hot[offset:]
+        filters = {
+            col: {value}
+            for col, value in (("zone", zone), ("cls", cls), ("model", model),
+                               ("camera_id", camera_id), ("type", event_type))
+            if value
+        }
+        archived = event_archive.query(
+            filters, t_start or None, t_end or None, before=cursor, limit=wanted, columns=columns
+        )
+        return merge_newest(hot, archived, limit, offset)
+
+
+class RollupRepo:
+    """Event rollup repository (per-minute and per-hour counts)."""
+    
+    KEY_COLUMNS = ("camera_id", "zone", "cls", "type")
+    
+    @staticmethod
+    def add(db: Session, events_data: List[Dict[str, Any]]):
+        """Fold new events into the rollups, in the caller's transaction."""
+        buckets: Dict[Tuple, List[float]] = {}
+        for data in events_data:
+            t_start = data.get("t_start") or 0.0
+            conf = data.get("conf") or 0.0
+            key = tuple(data.get(col) or "" for col in RollupRepo.KEY_COLUMNS)
+            for size in ROLLUP_BUCKETS:
+                agg = buckets.get((size, int(t_start // size) * size) + key)
+                if agg is None:
+                    buckets[(size, int(t_start // size) * size) + key] = [1, conf, conf, conf]
+                else:
+                    agg[0] += 1
+                    agg[1] += conf
+                    agg[2] = min(agg[2], conf)
+                    agg[3] = max(agg[3], conf)
+        if not buckets:
+            return
+        
+        rows = [
+            {
+                "bucket_size": key[0], "bucket_start": key[1],
+                "camera_id": key[2], "zone": key[3], "cls": key[4], "type": key[5],
+                "count": agg[0], "conf_sum": agg[1], "conf_min": agg[2], "conf_max": agg[3]
+            }
+            for key, agg in buckets.items()
+        ]
+        stmt = sqlite_insert(EventRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["bucket_size", "bucket_start", *RollupRepo.KEY_COLUMNS],
+            set_={
+                "count": EventRollup.count + stmt.excluded["count"],
+                "conf_sum": EventRollup.conf_sum + stmt.excluded.conf_sum,
+                "conf_min": func.min(EventRollup.conf_min, stmt.excluded.conf_min),
+                "conf_max": func.max(EventRollup.conf_max, stmt.excluded.conf_max)
+            }
+        )
+        db.execute(stmt, rows)
+    
+    @staticmethod
+    def rebuild(db: Session):
+        """Recompute all rollups from the events table."""
+        db.execute(delete(EventRollup))
+        for size in ROLLUP_BUCKETS:
+            keys = [func.coalesce(getattr(Event, col), "") for col in RollupRepo.KEY_COLUMNS]
+            bucket = cast(Event.t_start / size, Integer) * size
+            source = select(
+                literal(size), bucket, *keys,
+                func.count(), func.sum(Event.conf), func.min(Event.conf), func.max(Event.conf)
+            ).group_by(bucket, *keys)
+            db.execute(insert(EventRollup).from_select(
+                ["bucket_size", "bucket_start", *RollupRepo.KEY_COLUMNS,
+                 "count", "conf_sum", "conf_min", "conf_max"],
+                source
+            ))
+        db.commit()
+    
+    @staticmethod
+    def is_empty(db: Session) -> bool:
+        """Check whether any rollup rows exist."""
+        return db.query(EventRollup.id).first() is None
+    
+    @staticmethod
+    def pick_bucket(t_start: float, t_end: float, max_buckets: int = 300) -> int:
+        """Smallest bucket size that covers the range in at most `max_buckets` buckets."""
+        span = max(t_end - t_start, 1.0)
+        for size in STATS_BUCKETS:
+            if span / size <= max_buckets:
+                return size
+        return STATS_BUCKETS[-1]
+    
+    @staticmethod
+    def stats(
+        db: Session,
+        t_start: float,
+        t_end: float,
+        bucket_size: int,
+        zone: Optional[str] = None,
+        cls: Optional[str] = None,
+        camera_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        group_by: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Bucketed counts and confidence aggregates from the rollups."""
+        # Read the coarsest rollup that divides the requested bucket size
+        source_size = max(size for size in ROLLUP_BUCKETS if bucket_size % size == 0)
+        bucket = cast(EventRollup.bucket_start / bucket_size, Integer) * bucket_size
+        columns = [bucket.label("ts")]
+        group_columns = [bucket]
+        if group_by:
+            key = getattr(EventRollup, group_by)
+            columns.append(key.label("key"))
+            group_columns.append(key)
+        columns += [
+            func.sum(EventRollup.count).label("count"),
+            func.sum(EventRollup.conf_sum).label("conf_sum"),
+            func.min(EventRollup.conf_min).label("conf_min"),
+            func.max(EventRollup.conf_max).label("conf_max")
+        ]
+        
+        query = select(*columns).where(
+            EventRollup.bucket_size == source_size,
+            EventRollup.bucket_start >= int(t_start // source_size) * source_size,
+            EventRollup.bucket_start <= t_end
+        )
+        if zone:
+            query = query.where(EventRollup.zone == zone)
+        if cls:
+            query = query.where(EventRollup.cls == cls)
+        if camera_id:
+            query = query.where(EventRollup.camera_id == camera_id)
+        if event_type:
+            query = query.where(EventRollup.type == event_type)
+        query = query.group_by(*group_columns).order_by(bucket)
         
-        return query.order_by(Event.t_start.desc()).limit(limit).offset(offset).all()
+        results = []
+        for row in db.execute(query).mappings():
+            results.append({
+                "ts": row["ts"],
+                "key": (row["key"] or None) if group_by else None,
+                "count": row["count"],
+                "conf_avg": row["conf_sum"] / row["count"] if row["count"] else None,
+                "conf_min": row["conf_min"],
+                "conf_max": row["conf_max"]
+            })
+        return results
+
+
+class ConfigVersion:
+    """Counter bumped on every zone/model write so config caches can tell they are stale."""
+    
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+    
+    def bump(self):
+        """Mark cached zone/model configuration as stale."""
+        with self.lock:
+            self.value += 1
+
+
+config_version = ConfigVersion()
 
 
 class ZoneRepo:
@@ -62,6 +319,7 @@ class ZoneRepo:
         zone = Zone(**zone_data)
         db.add(zone)
         db.commit()
+        config_version.bump()
         db.refresh(zone)
         return zone
     
@@ -86,6 +344,7 @@ class ZoneRepo:
             setattr(zone, key, value)
         
         db.commit()
+        config_version.bump()
         db.refresh(zone)
         return zone
     
@@ -98,6 +357,7 @@ class ZoneRepo:
         
         db.delete(zone)
         db.commit()
+        config_version.bump()
         return True
 
 
@@ -110,6 +370,7 @@ class ModelRepo:
         model = Model(**model_data)
         db.add(model)
         db.commit()
+        config_version.bump()
         db.refresh(model)
         return model
     
@@ -134,6 +395,91 @@ class ModelRepo:
             setattr(model, key, value)
         
         db.commit()
+        config_version.bump()
         db.refresh(model)
         return model
+    
+    @staticmethod
+    def delete(db: Session, name: str) -> bool:
+        """Delete model config."""
+        model = ModelRepo.get_by_name(db, name)
+        if not model:
+            return False
+        
+        db.delete(model)
+        db.commit()
+        config_version.bump()
+        return True
 
+
+class SOSRepo:
+    """SOS log repository."""
+    
+    @staticmethod
+    def create(db: Session, log_data: Dict[str, Any]) -> SOSLog:
+        """Log an SOS action."""
+        log = SOSLog(**log_data)
+        db.add(log)
+        db.commit()
+        return log
+
+
+
+class FileRepo:
+    """Stored file index repository."""
+    
+    @staticmethod
+    def upsert(db: Session, files: List[Dict[str, Any]]):
+        """Add or refresh index rows (path, category, size, last_access, sha256)."""
+        if not files:
+            return
+        stmt = sqlite_insert(StoredFile)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["path"],
+            set_={
+                "category": stmt.excluded.category,
+                "size": stmt.excluded.size,
+                "sha256": func.coalesce(stmt.excluded.sha256, StoredFile.sha256),
+                "last_access": func.max(StoredFile.last_access, stmt.excluded.last_access)
+            }
+        )
+        db.execute(stmt, [dict({"sha256": None}, **f) for f in files])
+        db.commit()
+    
+    @staticmethod
+    def touch(db: Session, accessed: Dict[str, float]):
+        """Move last_access forward for the given paths."""
+        for path, ts in accessed.items():
+            db.query(StoredFile).filter(StoredFile.path == path, StoredFile.last_access < ts).update(
+                {StoredFile.last_access: ts}, synchronize_session=False
+            )
+        db.commit()
+    
+    @staticmethod
+    def sizes(db: Session, category: str) -> Dict[str, int]:
+        """Indexed path -> size for a category."""
+        return dict(db.execute(select(StoredFile.path, StoredFile.size).where(StoredFile.category == category)).all())
+    
+    @staticmethod
+    def usage(db: Session) -> Dict[str, Tuple[int, int]]:
+        """Category -> (files, bytes)."""
+        rows = db.execute(
+            select(StoredFile.category, func.count(), func.coalesce(func.sum(StoredFile.size), 0))
+            .group_by(StoredFile.category)
+        ).all()
+        return {category: (files, size) for category, files, size in rows}
+    
+    @staticmethod
+    def least_recent(db: Session, category: Optional[str] = None, limit: int = 500, offset: int = 0) -> List[StoredFile]:
+        """Oldest-accessed files first."""
+        query = db.query(StoredFile)
+        if category:
+            query = query.filter(StoredFile.category == category)
+        return query.order_by(StoredFile.last_access, StoredFile.id).offset(offset).limit(limit).all()
+    
+    @staticmethod
+    def delete(db: Session, paths: List[str]):
+        """Drop index rows."""
+        for i in range(0, len(paths), 500):
+            db.execute(delete(StoredFile).where(StoredFile.path.in_(paths[i:i + 500])))
+        db.commit()
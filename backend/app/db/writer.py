@@ -0,0 +1,116 @@
+"""Single-thread event writer with group commit."""
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import queue
+import threading
+import time
+
+from app.config import settings
+from app.deps import SessionLocal
+from app.services.heatmap import heatmap_store
+from .repo import EventRepo
+
+
+class EventWriter:
+    """Serializes event inserts through one thread and commits them in groups.
+
+    Writes queued within `event_write_delay_ms` of each other (up to
+    `event_write_batch` rows) share one transaction, so many events cost a
+    single fsync. Callers get their inserted rows back once the commit is done.
+    """
+
+    def __init__(self, batch_rows: int = 1000, max_delay: float = 0.02):
+        self.batch_rows = batch_rows
+        self.max_delay = max_delay
+        self.queue: "queue.Queue[Optional[Tuple[List[Dict[str, Any]], Future]]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.transactions = 0
+        self.rows_written = 0
+
+    def start(self):
+        """Start the writer thread (idempotent)."""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+                self.thread.start()
+
+    def close(self, timeout: float = 10.0):
+        """Write what is queued, then stop the thread."""
+        if self.thread and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+        self.thread = None
+
+    def write(self, events_data: List[Dict[str, Any]]) -> Future:
+        """Queue events; the future resolves to the inserted rows once committed."""
+        self.start()
+        future: Future = Future()
+        self.queue.put((events_data, future))
+        return future
+
+    async def write_async(self, events_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Queue events and wait for their commit without blocking the event loop."""
+        return await asyncio.wrap_future(self.write(events_data))
+
+    def _run(self):
+        """Collect queued writes into groups and commit each group once."""
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is None:
+                break
+            group = [item]
+            rows = len(item[0])
+            deadline = time.monotonic() + self.max_delay
+            while rows < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+                rows += len(item[0])
+            self._commit(group)
+
+    def _commit(self, group: List[Tuple[List[Dict[str, Any]], Future]]):
+        """Insert a group in one transaction, falling back to one per write on error."""
+        db = SessionLocal()
+        try:
+            try:
+                results = [EventRepo.insert_new(db, events_data) for events_data, _ in group]
+                db.commit()
+            except Exception:
+                db.rollback()
+                if len(group) == 1:
+                    raise
+                # Isolate the failing write so the rest still get stored
+                for item in group:
+                    self._commit([item])
+                return
+            self.transactions += 1
+            try:
+                heatmap_store.add(row for inserted in results for row in inserted)
+            except Exception as e:
+                print(f"Heatmap update failed: {e}")
+            for (_, future), inserted in zip(group, results):
+                self.rows_written += len(inserted)
+                future.set_result(inserted)
+        except Exception as e:
+            print(f"Event write failed: {e}")
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            db.close()
+
+
+event_writer = EventWriter(settings.event_write_batch, settings.event_write_delay_ms / 1000.0)
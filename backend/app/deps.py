@@ -1,10 +1,14 @@
 """Dependencies."""
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, select, func
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from typing import Any, Callable, Dict, Generator, Optional, TypeVar
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import itertools
 from app.config import settings
-from app.db.models import Base
+from app.db.models import Base, Event
 
 # Ensure database directory exists
 def _ensure_db_dir():
@@ -37,13 +41,73 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def init_db():
-    """Initialize database - creates all tables."""
+if "sqlite" in db_url:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Tune every SQLite connection: WAL so readers never wait on the writer."""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_kb}")
+        cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_mb * 1024 * 1024}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+def init_db() -> Optional[Dict[str, Any]]:
+    """Initialize database - creates all tables.
+    
+    Returns what backfill_derived should rebuild in the background, or None.
+    """
     # Ensure directory exists
     _ensure_db_dir()
     # Create all tables
     Base.metadata.create_all(bind=engine)
+    # create_all skips indexes of tables that already exist
+    for index in Event.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
     print(f"Database initialized at: {db_url}")
+    
+    # Rollups and heatmaps are missing for databases created before they existed
+    from app.db.repo import RollupRepo
+    from app.services.heatmap import heatmap_store
+    db = SessionLocal()
+    try:
+        max_id = db.query(func.max(Event.id)).scalar()
+        if max_id is None:
+            return None
+        plan = {
+            "rollups": RollupRepo.is_empty(db),
+            "heatmaps": heatmap_store.is_empty(),
+            # Later events reach the heatmaps through the event writer
+            "max_id": max_id
+        }
+    finally:
+        db.close()
+    return plan if plan["rollups"] or plan["heatmaps"] else None
+
+
+def backfill_derived(plan: Dict[str, Any]):
+    """Build the rollups and heatmaps init_db found missing (runs off the event loop)."""
+    from app.db.repo import RollupRepo
+    from app.services.heatmap import heatmap_store
+    from app.db.archive import event_archive
+    db = SessionLocal()
+    try:
+        if plan["rollups"]:
+            print("Building event rollups...")
+            RollupRepo.rebuild(db)
+        if plan["heatmaps"]:
+            print("Building event heatmaps from stored and archived events...")
+            columns = (Event.camera_id, Event.cls, Event.t_start, Event.bbox_xyxy)
+            stored = db.execute(
+                select(*columns).where(Event.id <= plan["max_id"]).execution_options(yield_per=5000)
+            ).mappings()
+            heatmap_store.rebuild(itertools.chain(event_archive.scan(newest_first=False), stored))
+        print("Event rollups and heatmaps are up to date")
+    finally:
+        db.close()
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -54,3 +118,26 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+
+# Bounded pool for blocking DB work, so queries never run on the event loop
+_db_executor = ThreadPoolExecutor(max_workers=settings.db_workers, thread_name_prefix="db")
+
+T = TypeVar("T")
+
+
+def _call_with_session(fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+    """Call fn with a fresh session (on a DB worker thread)."""
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def run_db(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run fn(db, *args, **kwargs) on the DB executor with its own session."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _db_executor, functools.partial(_call_with_session, fn, args, kwargs)
+    )
+
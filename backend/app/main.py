@@ -1,14 +1,21 @@
 """Main FastAPI application."""
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
 from app.config import settings
-from app.deps import init_db
-from app.routers import models, zones, events, upload, query, sos, system
+from app.deps import init_db, run_db, backfill_derived
+from app.routers import models, zones, events, upload, query, sos, system, analytics
 from app.ws import live, alerts
+from app.db.writer import event_writer
+from app.db.archive import event_archive
+from app.services.query_engine import query_engine
+from app.services.heatmap import heatmap_store
+from app.services.detection_client import detection_client
+from app.services.storage_manager import storage_manager, TrackedStaticFiles
+import asyncio
 import httpx
+import time
 
 
 app = FastAPI(
@@ -24,57 +31,152 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Initialize database
-init_db()
+backfill_plan = init_db()
+
+
+def _sync_model_records(db, detector_models):
+    """Create or refresh model records from the detection service's list."""
+    from app.db.repo import ModelRepo
+    
+    for model_data in detector_models:
+        existing = ModelRepo.get_by_name(db, model_data["name"])
+        if not existing:
+            # Create new model record
+            ModelRepo.create(db, {
+                "name": model_data["name"],
+                "type": model_data["type"],
+                "enabled": model_data.get("enabled", False),
+                "conf": model_data.get("conf", 0.35),
+                "iou": model_data.get("iou", 0.45),
+                "labels": model_data.get("labels", []),
+                "enabled_classes": model_data.get("enabled_classes", {})
+            })
+        else:
+            # Update existing - preserve enabled state, only update labels and classes
+            ModelRepo.update(db, model_data["name"], {
+                "labels": model_data.get("labels", []),
+                "enabled_classes": model_data.get("enabled_classes", {})
+                # Note: We don't update 'enabled' here to preserve user's choice
+            })
+
 
 # Sync models from detection service on startup
 @app.on_event("startup")
 async def sync_models():
     """Sync models from detection service to backend DB."""
     try:
-        from app.services.detection_client import detection_client
-        from app.db.repo import ModelRepo
-        from app.deps import SessionLocal
-        
         # Get models from detection service
         async with httpx.AsyncClient() as client:
             response = await client.get(f"{settings.detection_service_url}/detector/models")
             if response.status_code == 200:
-                detector_models = response.json()
-                
-                db = SessionLocal()
-                try:
-                    for model_data in detector_models:
-                        existing = ModelRepo.get_by_name(db, model_data["name"])
-                        if not existing:
-                            # Create new model record
-                            ModelRepo.create(db, {
-                                "name": model_data["name"],
-                                "type": model_data["type"],
-                                "enabled": model_data.get("enabled", False),
-                                "conf": model_data.get("conf", 0.35),
-                                "iou": model_data.get("iou", 0.45),
-                                "labels": model_data.get("labels", []),
-                                "enabled_classes": model_data.get("enabled_classes", {})
-                            })
-                        else:
-                            # Update existing - preserve enabled state, only update labels and classes
-                            ModelRepo.update(db, model_data["name"], {
-                                "labels": model_data.get("labels", []),
-                                "enabled_classes": model_data.get("enabled_classes", {})
-                                # Note: We don't update 'enabled' here to preserve user's choice
-                            })
-                finally:
-                    db.close()
+                await run_db(_sync_model_records, response.json())
     except Exception as e:
         print(f"Failed to sync models: {e}")
 
-# Static files (for serving uploaded images, snapshots, etc.)
+# Alerts are relayed over one persistent connection for the life of the app
+@app.on_event("startup")
+async def start_alert_relay():
+    """Start the alert relay from the detection service."""
+    alerts.alert_manager.start()
+
+
+@app.on_event("shutdown")
+async def stop_alert_relay():
+    """Stop the alert relay."""
+    await alerts.alert_manager.stop()
+
+
+@app.on_event("shutdown")
+def stop_event_writer():
+    """Commit queued event writes and stop the writer thread."""
+    event_writer.close()
+    heatmap_store.flush()
+
+
+async def _backfill():
+    """Build the rollups/heatmaps init_db found missing."""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, backfill_derived, backfill_plan)
+        query_engine.invalidate()
+    except Exception as e:
+        print(f"Rollup/heatmap backfill failed: {e}")
+
+
+@app.on_event("startup")
+async def start_backfill():
+    """Run the backfill in the background so startup isn't held up by it."""
+    if backfill_plan:
+        app.state.backfill_task = asyncio.create_task(_backfill())
+
+
+async def _archive_events():
+    """Periodically move events past the retention period into the archive."""
+    backfill = getattr(app.state, "backfill_task", None)
+    if backfill:
+        # The heatmap backfill reads stored and archived events; don't move them underneath it
+        await backfill
+    while True:
+        try:
+            cutoff = time.time() - settings.event_retention_days * 86400
+            if await run_db(event_archive.archive_older_than, cutoff):
+                query_engine.invalidate()
+        except Exception as e:
+            print(f"Event archiving failed: {e}")
+        await asyncio.sleep(settings.archive_interval_sec)
+
+
+@app.on_event("startup")
+async def start_event_archiver():
+    """Start the retention job (disabled when event_retention_days is 0)."""
+    if settings.event_retention_days > 0:
+        app.state.archive_task = asyncio.create_task(_archive_events())
+
+
+@app.on_event("shutdown")
+async def stop_event_archiver():
+    """Stop the retention job."""
+    task = getattr(app.state, "archive_task", None)
+    if task:
+        task.cancel()
+
+
+async def _maintain_storage():
+    """Periodically index stored files and evict past the storage budgets."""
+    while True:
+        try:
+            try:
+                job_files = [job["file_path"] for job in await detection_client.jobs()]
+            except Exception:
+                job_files = None  # Unknown; videos are left alone this round
+            evicted = await run_db(storage_manager.maintain, job_files)
+            if evicted:
+                print(f"Evicted {evicted} stored files to stay within storage budgets")
+        except Exception as e:
+            print(f"Storage maintenance failed: {e}")
+        await asyncio.sleep(settings.storage_scan_interval_sec)
+
+
+@app.on_event("startup")
+async def start_storage_manager():
+    """Start the storage budget job."""
+    app.state.storage_task = asyncio.create_task(_maintain_storage())
+
+
+@app.on_event("shutdown")
+async def stop_storage_manager():
+    """Stop the storage budget job."""
+    task = getattr(app.state, "storage_task", None)
+    if task:
+        task.cancel()
+
+# Static files (for serving uploaded images, snapshots, etc.); served files count as accesses for LRU eviction
 storage_path = settings.storage_root_path
 if storage_path.exists():
-    app.mount("/storage", StaticFiles(directory=str(storage_path)), name="storage")
+    app.mount("/storage", TrackedStaticFiles(directory=str(storage_path)), name="storage")
 
 # Routers
 app.include_router(models.router)
@@ -84,6 +186,7 @@ app.include_router(upload.router)
 app.include_router(query.router)
 app.include_router(sos.router)
 app.include_router(system.router)
+app.include_router(analytics.router)
 
 # WebSocket endpoints
 @app.websocket("/ws/live")
@@ -0,0 +1,68 @@
+"""Analytics router."""
+from fastapi import APIRouter, Query, HTTPException
+from pydantic import BaseModel
+from typing import List, Optional
+import time
+import numpy as np
+
+from app.deps import run_db
+from app.services.heatmap import heatmap_store
+
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+
+class HeatmapResponse(BaseModel):
+    """Heatmap response."""
+    t_start: float
+    t_end: float
+    camera_id: Optional[str]
+    cls: Optional[str]
+    cell_px: int  # Frame pixels per cell side
+    rows: int
+    cols: int
+    max: int
+    total: int  # Sum of all cells (box-cells, not events)
+    grid: List[List[int]]  # grid[row][col]
+
+
+@router.get("/heatmap", response_model=HeatmapResponse)
+async def get_heatmap(
+    t_start: Optional[float] = Query(None, description="Default: 24 hours before t_end"),
+    t_end: Optional[float] = Query(None, description="Default: now"),
+    camera_id: Optional[str] = Query(None, description="Default: all cameras"),
+    cls: Optional[str] = Query(None, description="Default: all classes"),
+    downsample: int = Query(1, ge=1, le=16, description="Merge NxN cells")
+):
+    """Where detections occurred, summed from hourly grids (range rounded out to whole hours)."""
+    t_end = t_end or time.time()
+    t_start = t_start or t_end - 86400
+    if t_start > t_end:
+        raise HTTPException(status_code=400, detail="t_start must be before t_end")
+
+    grid = await run_db(_heatmap_grid, t_start, t_end, camera_id, cls, downsample)
+
+    return HeatmapResponse(
+        t_start=t_start,
+        t_end=t_end,
+        camera_id=camera_id,
+        cls=cls,
+        cell_px=heatmap_store.cell_px * downsample,
+        rows=grid.shape[0],
+        cols=grid.shape[1],
+        max=int(grid.max()) if grid.size else 0,
+        total=int(grid.sum()),
+        grid=grid.tolist()
+    )
+
+
+def _heatmap_grid(db, t_start: float, t_end: float, camera_id: Optional[str], cls: Optional[str], downsample: int) -> np.ndarray:
+    """Sum and downsample a heatmap on a DB worker (the grids are files; `db` is unused)."""
+    grid = heatmap_store.heatmap(t_start, t_end, camera_id, cls)
+    if downsample > 1:
+        rows, cols = grid.shape
+        pad_r, pad_c = -rows % downsample, -cols % downsample
+        if pad_r or pad_c:
+            grid = np.pad(grid, ((0, pad_r), (0, pad_c)))
+        grid = grid.reshape(grid.shape[0] // downsample, downsample, grid.shape[1] // downsample, downsample).sum(axis=(1, 3))
+    return grid
@@ -1,11 +1,15 @@
 """Events router."""
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from pydantic import BaseModel
+import time
 
-from app.deps import get_db
-from app.db.repo import EventRepo
+from app.deps import run_db
+from app.db.repo import EventRepo, RollupRepo, STATS_BUCKETS, encode_cursor, decode_cursor
+from app.db.writer import event_writer
+from app.services import export
+from app.services.fastjson import encode_json, json_response
 
 
 router = APIRouter(prefix="/api/events", tags=["events"])
@@ -45,8 +49,47 @@ class EventCreate(BaseModel):
     bbox_xyxy: List[float] = []
 
 
+class EventBulkCreate(BaseModel):
+    """Bulk event creation request."""
+    events: List[EventCreate]
+
+
+class EventBulkResponse(BaseModel):
+    """Bulk event creation response."""
+    received: int
+    created: int
+    duplicates: int
+
+
+class EventStatsBucket(BaseModel):
+    """One time bucket of event statistics."""
+    ts: int
+    key: Optional[str] = None
+    count: int
+    conf_avg: Optional[float]
+    conf_min: Optional[float]
+    conf_max: Optional[float]
+
+
+class EventStatsResponse(BaseModel):
+    """Bucketed event statistics."""
+    t_start: float
+    t_end: float
+    bucket_sec: int
+    group_by: Optional[str]
+    total: int
+    buckets: List[EventStatsBucket]
+
+
+STATS_GROUP_BY = {"zone", "cls", "camera_id", "type"}
+
+# The list endpoint selects just these columns (id is only used for the cursor)
+LIST_FIELDS = list(EventResponse.model_fields)
+LIST_COLUMNS = LIST_FIELDS + ["id"]
+
+
 @router.post("/create")
-async def create_event(event: EventCreate, db: Session = Depends(get_db)):
+async def create_event(event: EventCreate):
     """Create a new event."""
     event_data = {
         "event_id": event.event_id,
@@ -63,63 +106,163 @@ async def create_event(event: EventCreate, db: Session = Depends(get_db)):
         "video_ref": event.video_ref,
         "bbox_xyxy": event.bbox_xyxy
     }
-    created = EventRepo.create(db, event_data)
-    return EventResponse(
-        event_id=created.event_id,
-        camera_id=created.camera_id,
-        model=created.model,
-        type=created.type,
-        zone=created.zone,
-        cls=created.cls,
-        track_id=created.track_id,
-        conf=created.conf,
-        t_start=created.t_start,
-        t_end=created.t_end,
-        snapshot_path=created.snapshot_path,
-        video_ref=created.video_ref,
-        bbox_xyxy=created.bbox_xyxy or []
+    # Group-committed by the writer thread; returns once stored
+    created = await event_writer.write_async([event_data])
+    if not created:
+        raise HTTPException(status_code=409, detail="Event already exists")
+    return EventResponse(**event_data)
+
+
+@router.post("/bulk", response_model=EventBulkResponse)
+async def create_events_bulk(request: EventBulkCreate):
+    """Create many events in one transaction (idempotent on event_id)."""
+    created = await event_writer.write_async([event.dict() for event in request.events])
+    return EventBulkResponse(
+        received=len(request.events),
+        created=len(created),
+        duplicates=len(request.events) - len(created)
+    )
+
+
+@router.get("/stats", response_model=EventStatsResponse)
+async def event_stats(
+    t_start: Optional[float] = Query(None, description="Default: 24 hours before t_end"),
+    t_end: Optional[float] = Query(None, description="Default: now"),
+    bucket_sec: Optional[int] = Query(None, description="Default: picked from the range"),
+    zone: Optional[str] = Query(None),
+    cls: Optional[str] = Query(None),
+    camera_id: Optional[str] = Query(None),
+    event_type: Optional[str] = Query(None, alias="type"),
+    group_by: Optional[str] = Query(None, description="zone, cls, camera_id or type")
+):
+    """Event counts and confidence per time bucket, served from the rollups."""
+    t_end = t_end or time.time()
+    t_start = t_start or t_end - 86400
+    if t_start >= t_end:
+        raise HTTPException(status_code=400, detail="t_start must be before t_end")
+    if group_by and group_by not in STATS_GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {sorted(STATS_GROUP_BY)}")
+    if bucket_sec is None:
+        bucket_sec = RollupRepo.pick_bucket(t_start, t_end)
+    elif bucket_sec not in STATS_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket_sec must be one of {list(STATS_BUCKETS)}")
+    
+    buckets = await run_db(
+        RollupRepo.stats,
+        t_start=t_start,
+        t_end=t_end,
+        bucket_size=bucket_sec,
+        zone=zone,
+        cls=cls,
+        camera_id=camera_id,
+        event_type=event_type,
+        group_by=group_by
+    )
+    return EventStatsResponse(
+        t_start=t_start,
+        t_end=t_end,
+        bucket_sec=bucket_sec,
+        group_by=group_by,
+        total=sum(b["count"] for b in buckets),
+        buckets=[EventStatsBucket(**b) for b in buckets]
+    )
+
+
+@router.get("/export")
+def export_events(
+    format: str = Query("ndjson", description="ndjson, csv, parquet or zip (CSV plus snapshots)"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns (default: all)"),
+    zone: Optional[str] = Query(None),
+    cls: Optional[str] = Query(None),
+    object_cls: Optional[str] = Query(None, alias="object", description="Same as cls"),
+    model: Optional[str] = Query(None),
+    t_start: Optional[float] = Query(None),
+    t_end: Optional[float] = Query(None),
+    camera_id: Optional[str] = Query(None),
+    event_type: Optional[str] = Query(None, alias="type")
+):
+    """Stream every matching event, oldest first, with constant memory use."""
+    if format not in export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(export.EXPORT_FORMATS)}")
+    if format == "parquet" and export.pq is None:
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+    columns = [c.strip() for c in fields.split(",") if c.strip()] if fields else list(export.EXPORT_COLUMNS)
+    unknown = [c for c in columns if c not in export.EXPORT_COLUMNS]
+    if unknown or not columns:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}; choose from {export.EXPORT_COLUMNS}")
+    
+    filters = {
+        col: {value}
+        for col, value in (("zone", zone), ("cls", cls or object_cls), ("model", model),
+                           ("camera_id", camera_id), ("type", event_type))
+        if value
+    }
+    media_type, extension = export.EXPORT_FORMATS[format]
+    body = export.ENCODERS[format](export.iter_batches(filters, t_start, t_end, columns), columns)
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="events_{int(time.time())}.{extension}"'}
     )
 
 
 @router.get("", response_model=List[EventResponse])
 async def list_events(
+    request: Request,
     zone: Optional[str] = Query(None),
     cls: Optional[str] = Query(None),
     model: Optional[str] = Query(None),
     t_start: Optional[float] = Query(None),
     t_end: Optional[float] = Query(None),
+    camera_id: Optional[str] = Query(None),
+    event_type: Optional[str] = Query(None, alias="type"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page")
 ):
-    """List events with filters."""
-    events = EventRepo.list(
-        db=db,
+    """List events with filters.
+    
+    When a full page is returned, the X-Next-Cursor header holds the cursor
+    for the next page. Rows are selected as column tuples and encoded
+    straight to JSON, skipping ORM entities and per-row response models.
+    """
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    body, headers, next_cursor = await run_db(
+        _list_page,
+        request.headers.get("accept-encoding", ""),
         zone=zone,
         cls=cls,
         model=model,
         t_start=t_start,
         t_end=t_end,
         limit=limit,
-        offset=offset
+        offset=offset,
+        camera_id=camera_id,
+        event_type=event_type,
+        cursor=position,
+        columns=LIST_COLUMNS
     )
-    
-    return [
-        EventResponse(
-            event_id=e.event_id,
-            camera_id=e.camera_id,
-            model=e.model,
-            type=e.type,
-            zone=e.zone,
-            cls=e.cls,
-            track_id=e.track_id,
-            conf=e.conf,
-            t_start=e.t_start,
-            t_end=e.t_end,
-            snapshot_path=e.snapshot_path,
-            video_ref=e.video_ref,
-            bbox_xyxy=e.bbox_xyxy or []
-        )
-        for e in events
-    ]
+    response = json_response(body, headers)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
+
+def _list_page(db, accept_encoding: str, **filters):
+    """Fetch, encode and compress a page of events on a DB worker, off the event loop.
+    
+    Returns (body, headers, next page cursor or None).
+    """
+    rows = EventRepo.list(db, **filters)
+    events = []
+    for row in rows:
+        event = dict(zip(LIST_FIELDS, row))
+        event["bbox_xyxy"] = [float(v) for v in event["bbox_xyxy"] or []]
+        events.append(event)
+    body, headers = encode_json(events, accept_encoding)
+    next_cursor = encode_cursor(rows[-1].t_start, rows[-1].id) if len(rows) == filters["limit"] else None
+    return body, headers, next_cursor
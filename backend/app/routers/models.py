@@ -1,20 +1,22 @@
 """Models router."""
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request
 from typing import List, Optional
 from pydantic import BaseModel
 from pathlib import Path
-import shutil
 import uuid
 
-from app.deps import get_db
+from app.deps import run_db
 from app.db.repo import ModelRepo
 from app.config import settings
 from app.services.detection_client import detection_client
+from app.services.storage import storage_service
+from app.services.config_cache import config_cache, cached_json
 
 
 router = APIRouter(prefix="/api/models", tags=["models"])
 
+MODEL_EXTENSIONS = ('.onnx', '.pt', '.pth')
+
 
 class ModelResponse(BaseModel):
     """Model response."""
@@ -36,45 +38,39 @@ class ModelUpdate(BaseModel):
 
 
 @router.get("", response_model=List[ModelResponse])
-async def list_models(db: Session = Depends(get_db)):
-    """List all models."""
-    models = ModelRepo.list(db)
-    return [
-        ModelResponse(
-            name=m.name,
-            type=m.type,
-            enabled=m.enabled,
-            conf=m.conf,
-            iou=m.iou,
-            labels=m.labels or [],
-            enabled_classes=m.enabled_classes or {}
-        )
-        for m in models
-    ]
+async def list_models(request: Request):
+    """List all models (served from the config cache, with ETag support)."""
+    config = await config_cache.get()
+    return cached_json(config.models_body, config.models_etag, request)
 
 
 @router.post("")
 async def upload_model(
     file: UploadFile = File(...),
-    type: str = "custom",
-    db: Session = Depends(get_db)
+    type: str = "custom"
 ):
     """Upload new model."""
-    if not file.filename.endswith(('.onnx', '.pt', '.pth')):
+    if not file.filename.endswith(MODEL_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Invalid model file format")
     
-    # Save to models directory
-    models_dir = settings.models_root_path
-    models_dir.mkdir(parents=True, exist_ok=True)
-    
-    file_path = models_dir / file.filename
+    # Stream to the models directory (temp file, renamed when complete)
+    file_path = settings.models_root_path / Path(file.filename).name
+    if await model_name_taken(file_path.name):
+        raise HTTPException(status_code=409, detail="A model with this name already exists")
+    _, sha256, _ = await storage_service.save_upload_file(file, file_path)
     
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    
-    # Create model record
+    return await register_model(file_path.name, type, sha256)
+
+
+async def model_name_taken(name: str) -> bool:
+    """Whether a model file or record with this name already exists."""
+    return (settings.models_root_path / name).exists() or await run_db(ModelRepo.get_by_name, name) is not None
+
+
+async def register_model(name: str, type: str, sha256: Optional[str] = None) -> dict:
+    """Create the record for a model file that is now in the models directory."""
     model_data = {
-        "name": file.filename,
+        "name": name,
         "type": type,
         "enabled": False,
         "conf": 0.35,
@@ -83,19 +79,18 @@ async def upload_model(
         "enabled_classes": {}
     }
     
-    model = ModelRepo.create(db, model_data)
-    return {"name": model.name, "type": model.type, "message": "Model uploaded"}
+    model = await run_db(ModelRepo.create, model_data)
+    return {"name": model.name, "type": model.type, "sha256": sha256, "message": "Model uploaded"}
 
 
 @router.put("/{model_name}")
 async def update_model(
     model_name: str,
-    update: ModelUpdate,
-    db: Session = Depends(get_db)
+    update: ModelUpdate
 ):
     """Update model settings."""
     update_data = update.dict(exclude_unset=True)
-    model = ModelRepo.update(db, model_name, update_data)
+    model = await run_db(ModelRepo.update, model_name, update_data)
     
     if not model:
         raise HTTPException(status_code=404, detail="Model not found")
@@ -122,12 +117,9 @@ async def update_model(
 
 
 @router.delete("/{model_name}")
-async def delete_model(
-    model_name: str,
-    db: Session = Depends(get_db)
-):
+async def delete_model(model_name: str):
     """Delete model."""
-    model = ModelRepo.get_by_name(db, model_name)
+    model = await run_db(ModelRepo.get_by_name, model_name)
     if not model:
         raise HTTPException(status_code=404, detail="Model not found")
     
@@ -138,8 +130,7 @@ async def delete_model(
         file_path.unlink()
     
     # Delete from DB
-    db.delete(model)
-    db.commit()
+    await run_db(ModelRepo.delete, model_name)
     
     return {"message": "Model deleted"}
 
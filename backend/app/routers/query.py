@@ -1,13 +1,11 @@
 """Query router (chatbot)."""
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
-from typing import List, Optional
-import re
-from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
 
-from app.deps import get_db
-from app.db.repo import EventRepo
+from app.deps import run_db
+from app.db.repo import encode_cursor, decode_cursor
+from app.services.query_engine import query_engine
 
 
 router = APIRouter(prefix="/api/query", tags=["query"])
@@ -18,6 +16,8 @@ class QueryRequest(BaseModel):
     query: str
     t_start: Optional[float] = None
     t_end: Optional[float] = None
+    limit: int = 100
+    cursor: Optional[str] = None  # X-Next-Cursor from the previous page
 
 
 class QueryResult(BaseModel):
@@ -31,74 +31,92 @@ class QueryResult(BaseModel):
     zone: Optional[str]
 
 
+class QueryGroup(BaseModel):
+    """One group of an aggregate answer."""
+    key: Optional[Any]
+    count: int
+
+
+class QueryAnswer(BaseModel):
+    """Structured chatbot answer."""
+    query: str
+    plan: Dict[str, Any]
+    kind: str  # count, list
+    answer: str
+    count: Optional[int] = None
+    groups: List[QueryGroup] = []
+    events: List[QueryResult] = []
+
+
+def _to_result(e) -> QueryResult:
+    """Convert an event row to a query result."""
+    return QueryResult(
+        event_id=e.event_id,
+        cls=e.cls,
+        conf=e.conf,
+        t_start=e.t_start,
+        snapshot_path=e.snapshot_path,
+        bbox_xyxy=e.bbox_xyxy or [],
+        zone=e.zone
+    )
+
+
+def _describe(plan) -> str:
+    """Short description of what a plan counts."""
+    what = " or ".join(plan.classes) if plan.classes else "events"
+    if plan.types:
+        what = f"{what} ({', '.join(plan.types)})"
+    if plan.zones:
+        what = f"{what} in {', '.join(plan.zones)}"
+    return what
+
+
 @router.post("", response_model=List[QueryResult])
 async def query_events(
     request: QueryRequest,
-    db: Session = Depends(get_db)
+    response: Response
 ):
     """Chatbot query - parse query string and return matching events."""
-    query = request.query.lower()
-    
-    # Extract object class from query
-    # Common patterns: "find me person", "show cars", "detect fire", etc.
-    class_keywords = {
-        "person": "person", "human": "person", "people": "person",
-        "car": "car", "vehicle": "car", "automobile": "car",
-        "dog": "dog", "dogs": "dog",
-        "cat": "cat", "cats": "cat",
-        "cow": "cow", "cattle": "cow",
-        "phone": "cell phone", "mobile": "cell phone", "smartphone": "cell phone",
-        "laptop": "laptop", "computer": "laptop",
-        "drone": "drone", "uav": "drone",
-        "bag": "handbag", "suitcase": "suitcase", "luggage": "suitcase",
-        "fire": "fire", "smoke": "smoke",
-        "face": "face"
-    }
-    
-    detected_class = None
-    for keyword, class_name in class_keywords.items():
-        if keyword in query:
-            detected_class = class_name
-            break
+    try:
+        position = decode_cursor(request.cursor) if request.cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    limit = max(1, min(request.limit, 1000))
     
-    # Extract time range from query if not provided
-    t_start = request.t_start
-    t_end = request.t_end
+    # This endpoint always lists events; /api/query/ask answers counts
+    plan = await run_db(query_engine.plan, request.query)
+    plan = plan._replace(aggregate=None, group_by=None, limit=limit)
+    events = await run_db(query_engine.execute, plan, request.t_start, request.t_end, position)
+    if len(events) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(events[-1].t_start, events[-1].id)
     
-    if not t_start or not t_end:
-        # Try to parse relative times: "last hour", "today", "yesterday"
-        now = datetime.now().timestamp()
-        if "last hour" in query or "past hour" in query:
-            t_start = now - 3600
-            t_end = now
-        elif "today" in query:
-            today_start = datetime.now().replace(hour=0, minute=0, second=0).timestamp()
-            t_start = today_start
-            t_end = now
-        elif "yesterday" in query:
-            yesterday = datetime.now() - timedelta(days=1)
-            t_start = yesterday.replace(hour=0, minute=0, second=0).timestamp()
-            t_end = yesterday.replace(hour=23, minute=59, second=59).timestamp()
-    
-    # Query events
-    events = EventRepo.list(
-        db=db,
-        cls=detected_class,
-        t_start=t_start,
-        t_end=t_end,
-        limit=100
-    )
+    return [_to_result(e) for e in events]
+
+
+@router.post("/ask", response_model=QueryAnswer)
+async def ask(request: QueryRequest):
+    """Chatbot question - counts ("how many cars per hour today") or event lists."""
+    plan = await run_db(query_engine.plan, request.query)
+    plan = plan._replace(limit=max(1, min(request.limit, 1000)))
+    result = await run_db(query_engine.execute, plan, request.t_start, request.t_end)
     
-    return [
-        QueryResult(
-            event_id=e.event_id,
-            cls=e.cls,
-            conf=e.conf,
-            t_start=e.t_start,
-            snapshot_path=e.snapshot_path,
-            bbox_xyxy=e.bbox_xyxy or [],
-            zone=e.zone
+    if plan.aggregate:
+        groups = [QueryGroup(**g) for g in result["groups"]]
+        answer = f"{result['count']} {_describe(plan)}"
+        if plan.group_by:
+            answer += f" across {len(groups)} {plan.group_by} group(s)"
+        return QueryAnswer(
+            query=request.query,
+            plan=plan.to_dict(),
+            kind="count",
+            answer=answer,
+            count=result["count"],
+            groups=groups
         )
-        for e in events
-    ]
-
+    return QueryAnswer(
+        query=request.query,
+        plan=plan.to_dict(),
+        kind="list",
+        answer=f"Found {len(result)} {_describe(plan)}" + (" (showing the newest)" if len(result) == plan.limit else ""),
+        events=[_to_result(e) for e in result]
+    )
@@ -1,11 +1,10 @@
 """SOS router."""
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 
-from app.deps import get_db
-from app.db.models import SOSLog
+from app.deps import run_db
+from app.db.repo import SOSRepo
 
 
 router = APIRouter(prefix="/api/sos", tags=["sos"])
@@ -25,10 +24,7 @@ class SOSResponse(BaseModel):
 
 
 @router.post("", response_model=SOSResponse)
-async def sos_action(
-    request: SOSRequest,
-    db: Session = Depends(get_db)
-):
+async def sos_action(request: SOSRequest):
     """Trigger or cancel SOS."""
     import time
     
@@ -36,13 +32,11 @@ async def sos_action(
         raise HTTPException(status_code=400, detail="Invalid action")
     
     # Log SOS action
-    log = SOSLog(
-        action=request.action,
-        triggered_by="manual",  # TODO: get from auth
-        event_id=request.event_id
-    )
-    db.add(log)
-    db.commit()
+    await run_db(SOSRepo.create, {
+        "action": request.action,
+        "triggered_by": "manual",  # TODO: get from auth
+        "event_id": request.event_id
+    })
     
     # TODO: Trigger GPIO signal, webhook, email, etc.
     
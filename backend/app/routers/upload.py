@@ -1,59 +1,69 @@
 """Upload router."""
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response
+from pydantic import BaseModel
+from typing import List, Optional
+import re
 import uuid
 from pathlib import Path
 
-from app.deps import get_db
+from app.config import settings
 from app.services.storage import storage_service
 from app.services.detection_client import detection_client
-from app.db.repo import ZoneRepo, ModelRepo
+from app.services.config_cache import config_cache
+from app.services.uploads import upload_sessions, UploadError
+from app.services.storage_manager import storage_manager
+from app.routers.models import MODEL_EXTENSIONS, model_name_taken, register_model
 
 
 router = APIRouter(prefix="/api/upload", tags=["upload"])
 
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class UploadSessionRequest(BaseModel):
+    """Resumable upload request."""
+    kind: str  # video, model
+    filename: str
+    size: int
+    sha256: Optional[str] = None  # Verified on completion when given
+    type: str = "custom"  # Model type (kind=model)
+
+
+class UploadSessionResponse(BaseModel):
+    """Resumable upload state."""
+    upload_id: str
+    kind: str
+    filename: str
+    size: int
+    offset: int
+    complete: bool = False
+    result: Optional[dict] = None
+
 
 @router.post("/video")
 async def upload_video(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    file: UploadFile = File(...)
 ):
     """Upload video for analysis."""
-    if not file.filename.endswith(('.mp4', '.avi', '.mov', '.mkv')):
+    if not file.filename.endswith(VIDEO_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Invalid video format")
     
-    # Save file
-    filename = f"{uuid.uuid4().hex}_{file.filename}"
-    file_path = await storage_service.save_upload(await file.read(), filename)
-    
+    # Stream to disk in chunks; the upload is never held in memory
+    filename = f"{uuid.uuid4().hex}_{Path(file.filename).name}"
+    file_path, sha256, _ = await storage_service.save_upload_file(file, storage_service.get_video_path(filename))
+    file_path = storage_manager.adopt(file_path, "videos", sha256)
+    # Pinned until the detection service lists the job
+    with storage_manager.pinned(file_path):
+        return await analyze_video(file_path)
+
+
+async def analyze_video(file_path: Path) -> dict:
+    """Queue an uploaded video for analysis with the active models and zones."""
     # Get active models and zones
-    models = ModelRepo.list(db)
-    zones = ZoneRepo.list(db)
-    
-    model_configs = [
-        {
-            "name": m.name,
-            "enabled": m.enabled,
-            "conf": m.conf,
-            "iou": m.iou,
-            "enabled_classes": m.enabled_classes or {}
-        }
-        for m in models if m.enabled
-    ]
-    
-    zone_configs = [
-        {
-            "zone_id": z.zone_id,
-            "name": z.name,
-            "type": z.type,
-            "points": z.points,
-            "allowed_classes": z.allowed_classes or [],
-            "min_size_px": z.min_size_px,
-            "dwell_sec": z.dwell_sec
-        }
-        for z in zones
-    ]
+    config = await config_cache.get()
+    model_configs = config.model_configs
+    zone_configs = config.zone_configs
     
     # Request analysis from detection service
     try:
@@ -73,46 +83,33 @@ async def upload_video(
 
 @router.post("/image")
 async def upload_image(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    file: UploadFile = File(...)
 ):
     """Upload image for analysis."""
     if not file.filename or not any(file.filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.webp']):
         raise HTTPException(status_code=400, detail="Invalid image format")
     
     # Save file
-    import aiofiles
-    from app.config import settings
-    
     uploads_dir = settings.storage_root_path / "uploads"
-    uploads_dir.mkdir(parents=True, exist_ok=True)
-    
-    filename = f"{uuid.uuid4().hex}_{file.filename}"
-    file_path = uploads_dir / filename
-    
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    filename = f"{uuid.uuid4().hex}_{Path(file.filename).name}"
+    file_path, sha256, _ = await storage_service.save_upload_file(file, uploads_dir / filename)
+    file_path = storage_manager.adopt(file_path, "uploads", sha256)
+    with storage_manager.pinned(file_path):
+        return await _analyze_image(file_path, file)
+
+
+async def _analyze_image(file_path: Path, file: UploadFile) -> dict:
+    """Send a stored image to the detection service."""
+    filename = file_path.name
     
     # Get active models
-    models = ModelRepo.list(db)
-    model_configs = [
-        {
-            "name": m.name,
-            "enabled": m.enabled,
-            "conf": m.conf,
-            "iou": m.iou,
-            "enabled_classes": m.enabled_classes or {}
-        }
-        for m in models if m.enabled
-    ]
+    model_configs = (await config_cache.get()).model_configs
     
     if not model_configs:
         raise HTTPException(status_code=400, detail="No models enabled. Please enable at least one model.")
     
     # Request analysis from detection service
     try:
-        from app.config import settings
         import httpx
         
         # Send image to detection service for analysis
@@ -132,7 +129,7 @@ async def upload_image(
                     return {
                         "detections": result.get("detections", []),
                         "annotated_image": result.get("annotated_image"),
-                        "original_image": f"/storage/uploads/{filename}"
+                        "original_image": f"/storage/uploads/{file_path.name}"
                     }
             except httpx.HTTPStatusError:
                 # Detection service doesn't have image endpoint yet
@@ -146,4 +143,85 @@ async def upload_image(
             "message": "Image uploaded. Detection service image analysis endpoint coming soon."
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Image analysis failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Image analysis failed: {str(e)}")
+
+# Resumable uploads: create a session, PUT ranged chunks (Content-Range), and
+# after a dropped connection GET the session for the offset to continue from.
+
+@router.post("/sessions", response_model=UploadSessionResponse)
+async def create_upload_session(request: UploadSessionRequest):
+    """Start a resumable video or model upload."""
+    extensions = {"video": VIDEO_EXTENSIONS, "model": MODEL_EXTENSIONS}.get(request.kind)
+    if extensions is None:
+        raise HTTPException(status_code=400, detail="kind must be 'video' or 'model'")
+    if not request.filename.endswith(extensions):
+        raise HTTPException(status_code=400, detail=f"Invalid {request.kind} format")
+    if request.size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+    if request.kind == "model" and await model_name_taken(Path(request.filename).name):
+        raise HTTPException(status_code=409, detail="A model with this name already exists")
+    session = upload_sessions.create(
+        request.kind, request.filename, request.size, request.sha256, meta={"type": request.type}
+    )
+    return UploadSessionResponse(**session)
+
+
+@router.get("/sessions/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload_session(upload_id: str, response: Response):
+    """Current offset of an upload (where to resume)."""
+    try:
+        session = upload_sessions.get(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    response.headers["Upload-Offset"] = str(session["offset"])
+    return UploadSessionResponse(**session)
+
+
+@router.put("/sessions/{upload_id}", response_model=UploadSessionResponse)
+async def put_upload_chunk(upload_id: str, request: Request):
+    """Append a chunk (raw body, `Content-Range: bytes start-end/size`).
+    
+    The body is streamed straight to disk. The chunk that completes the
+    upload also finishes it: the file is verified, moved into place and
+    processed like a regular upload, and the result is returned.
+    """
+    match = CONTENT_RANGE.fullmatch(request.headers.get("content-range", ""))
+    if not match:
+        raise HTTPException(status_code=400, detail="Content-Range: bytes start-end/size is required")
+    start, end, total = int(match.group(1)), int(match.group(2)), match.group(3)
+    if end < start:
+        raise HTTPException(status_code=400, detail="Content-Range end is before its start")
+    try:
+        if total != "*" and int(total) != upload_sessions.get(upload_id)["size"]:
+            raise UploadError(400, "Content-Range size does not match the upload size")
+        session = await upload_sessions.append(upload_id, start, request.stream(), end)
+        if session["offset"] < session["size"]:
+            return UploadSessionResponse(**session)
+        
+        if session["kind"] == "video":
+            dest = storage_service.get_video_path(f"{uuid.uuid4().hex}_{session['filename']}")
+        else:
+            dest = settings.models_root_path / session["filename"]
+            # Another upload may have taken the name since this session started
+            if await model_name_taken(dest.name):
+                raise UploadError(409, "A model with this name already exists")
+        finished = upload_sessions.finish(upload_id, dest)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    if session["kind"] == "video":
+        dest = storage_manager.adopt(dest, "videos", finished["sha256"])
+        with storage_manager.pinned(dest):
+            result = await analyze_video(dest)
+    else:
+        result = await register_model(dest.name, session["meta"].get("type", "custom"), finished["sha256"])
+    result["sha256"] = finished["sha256"]
+    return UploadSessionResponse(**session, complete=True, result=result)
+
+
+@router.delete("/sessions/{upload_id}")
+async def delete_upload_session(upload_id: str):
+    """Abandon an upload."""
+    if upload_id.isalnum():
+        upload_sessions.discard(upload_id)
+    return {"message": "Upload discarded"}
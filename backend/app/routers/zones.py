@@ -1,11 +1,13 @@
 """Zones router."""
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request
+from typing import List, Optional, Union
+from pydantic import BaseModel, field_validator
 
-from app.deps import get_db
+from app.deps import run_db
 from app.db.repo import ZoneRepo
+from app.services.query_engine import query_engine
+from app.services.config_cache import config_cache, cached_json
+from app.services.schedule import compile_schedule
 
 
 router = APIRouter(prefix="/api/zones", tags=["zones"])
@@ -21,8 +23,15 @@ class ZoneRequest(BaseModel):
     allowed_classes: List[str] = []
     min_size_px: int = 0
     dwell_sec: float = 0.0
-    active_schedule: Optional[dict] = None
+    active_schedule: Optional[Union[dict, str]] = None  # e.g. "weekdays 18:00-07:00"
     style: dict = {"stroke": "#ff0000", "width": 2, "opacity": 0.6}
+    
+    @field_validator("active_schedule")
+    @classmethod
+    def check_schedule(cls, value):
+        """Reject schedules the detection service could not compile (422)."""
+        compile_schedule(value)
+        return value
 
 
 class ZoneResponse(BaseModel):
@@ -35,33 +44,19 @@ class ZoneResponse(BaseModel):
     allowed_classes: List[str]
     min_size_px: int
     dwell_sec: float
-    active_schedule: Optional[dict]
+    active_schedule: Optional[Union[dict, str]]
     style: dict
 
 
 @router.get("", response_model=List[ZoneResponse])
-async def list_zones(db: Session = Depends(get_db)):
-    """List all zones."""
-    zones = ZoneRepo.list(db)
-    return [
-        ZoneResponse(
-            zone_id=z.zone_id,
-            name=z.name,
-            type=z.type,
-            points=z.points,
-            direction=z.direction,
-            allowed_classes=z.allowed_classes or [],
-            min_size_px=z.min_size_px,
-            dwell_sec=z.dwell_sec,
-            active_schedule=z.active_schedule,
-            style=z.style or {"stroke": "#ff0000", "width": 2, "opacity": 0.6}
-        )
-        for z in zones
-    ]
+async def list_zones(request: Request):
+    """List all zones (served from the config cache, with ETag support)."""
+    config = await config_cache.get()
+    return cached_json(config.zones_body, config.zones_etag, request)
 
 
 @router.post("", response_model=ZoneResponse)
-async def create_zone(zone: ZoneRequest, db: Session = Depends(get_db)):
+async def create_zone(zone: ZoneRequest):
     """Create zone."""
     import uuid
     
@@ -69,7 +64,8 @@ async def create_zone(zone: ZoneRequest, db: Session = Depends(get_db)):
     if not zone_data.get("zone_id"):
         zone_data["zone_id"] = f"zone_{uuid.uuid4().hex[:8]}"
     
-    created = ZoneRepo.create(db, zone_data)
+    created = await run_db(ZoneRepo.create, zone_data)
+    query_engine.invalidate_vocab()
     return ZoneResponse(
         zone_id=created.zone_id,
         name=created.name,
@@ -85,10 +81,11 @@ async def create_zone(zone: ZoneRequest, db: Session = Depends(get_db)):
 
 
 @router.put("/{zone_id}", response_model=ZoneResponse)
-async def update_zone(zone_id: str, zone: ZoneRequest, db: Session = Depends(get_db)):
+async def update_zone(zone_id: str, zone: ZoneRequest):
     """Update zone."""
     zone_data = zone.dict(exclude={"zone_id"})
-    updated = ZoneRepo.update(db, zone_id, zone_data)
+    updated = await run_db(ZoneRepo.update, zone_id, zone_data)
+    query_engine.invalidate_vocab()
     
     if not updated:
         raise HTTPException(status_code=404, detail="Zone not found")
@@ -108,9 +105,10 @@ async def update_zone(zone_id: str, zone: ZoneRequest, db: Session = Depends(get
 
 
 @router.delete("/{zone_id}")
-async def delete_zone(zone_id: str, db: Session = Depends(get_db)):
+async def delete_zone(zone_id: str):
     """Delete zone."""
-    success = ZoneRepo.delete(db, zone_id)
+    success = await run_db(ZoneRepo.delete, zone_id)
+    query_engine.invalidate_vocab()
     if not success:
         raise HTTPException(status_code=404, detail="Zone not found")
     return {"message": "Zone deleted"}
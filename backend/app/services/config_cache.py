@@ -0,0 +1,115 @@
+"""Read-through cache of zone and model configuration."""
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, NamedTuple, Optional
+import hashlib
+import threading
+
+from app.deps import run_db
+from app.db.repo import ModelRepo, ZoneRepo, config_version
+from app.services.fastjson import dumps
+
+DEFAULT_ZONE_STYLE = {"stroke": "#ff0000", "width": 2, "opacity": 0.6}
+
+
+class ConfigSnapshot(NamedTuple):
+    """Zones and models as of one config version, with everything derived from them."""
+    version: int
+    zones_body: bytes  # GET /api/zones response
+    zones_etag: str
+    models_body: bytes  # GET /api/models response
+    models_etag: str
+    zone_configs: List[Dict[str, Any]]  # Detection service payloads
+    model_configs: List[Dict[str, Any]]  # Enabled models only
+
+
+def _etag(body: bytes) -> str:
+    """Strong ETag from response content (stable across restarts)."""
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class ConfigCache:
+    """Zone/model responses and detection payloads, rebuilt only after a write.
+
+    Every ZoneRepo/ModelRepo write bumps `config_version`; a snapshot is
+    reused for as long as the version it was built from is current.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot: Optional[ConfigSnapshot] = None
+
+        # Metrics
+        self.hits = 0
+        self.loads = 0
+
+    def load(self, db: Session) -> ConfigSnapshot:
+        """Build a snapshot from the database."""
+        # Read the version first: a write racing the load leaves the snapshot stale, not wrong
+        version = config_version.value
+        zones = [
+            {
+                "zone_id": z.zone_id,
+                "name": z.name,
+                "type": z.type,
+                "points": z.points,
+                "direction": z.direction,
+                "allowed_classes": z.allowed_classes or [],
+                "min_size_px": z.min_size_px,
+                "dwell_sec": z.dwell_sec,
+                "active_schedule": z.active_schedule,
+                "style": z.style or DEFAULT_ZONE_STYLE
+            }
+            for z in ZoneRepo.list(db)
+        ]
+        models = [
+            {
+                "name": m.name,
+                "type": m.type,
+                "enabled": m.enabled,
+                "conf": m.conf,
+                "iou": m.iou,
+                "labels": m.labels or [],
+                "enabled_classes": m.enabled_classes or {}
+            }
+            for m in ModelRepo.list(db)
+        ]
+        zones_body = dumps(zones)
+        models_body = dumps(models)
+        snapshot = ConfigSnapshot(
+            version=version,
+            zones_body=zones_body,
+            zones_etag=_etag(zones_body),
+            models_body=models_body,
+            models_etag=_etag(models_body),
+            zone_configs=[{k: v for k, v in z.items() if k != "style"} for z in zones],
+            model_configs=[
+                {k: m[k] for k in ("name", "enabled", "conf", "iou", "enabled_classes")}
+                for m in models if m["enabled"]
+            ]
+        )
+        with self.lock:
+            self.loads += 1
+            if self.snapshot is None or self.snapshot.version <= version:
+                self.snapshot = snapshot
+        return snapshot
+
+    async def get(self) -> ConfigSnapshot:
+        """Current snapshot, loading it on the DB executor only when stale."""
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version == config_version.value:
+            self.hits += 1
+            return snapshot
+        return await run_db(self.load)
+
+
+def cached_json(body: bytes, etag: str, request: Request) -> Response:
+    """Serve a cached JSON body, or 304 when the client already has it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    tags = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+config_cache = ConfigCache()
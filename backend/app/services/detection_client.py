@@ -66,6 +66,12 @@ class DetectionClient:
         response.raise_for_status()
         return response.json()
     
+    async def jobs(self) -> List[Dict[str, Any]]:
+        """Video analysis jobs still running."""
+        response = await self.client.get("/detector/jobs", timeout=5.0)
+        response.raise_for_status()
+        return response.json()["jobs"]
+    
     async def analyze_file(
         self,
         file_path: str,
@@ -0,0 +1,193 @@
+"""Streaming event export (NDJSON, CSV, Parquet, ZIP with snapshots)."""
+from sqlalchemy import select
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set
+import csv
+import io
+import json
+import tempfile
+import zipfile
+
+from app.config import settings
+from app.deps import SessionLocal
+from app.db.archive import event_archive, arrow_schema, pq, pa
+from app.db.models import Event
+from app.services.fastjson import dumps
+
+EXPORT_COLUMNS = [
+    "event_id", "camera_id", "model", "type", "zone", "cls", "track_id", "conf",
+    "t_start", "t_end", "snapshot_path", "video_ref", "bbox_xyxy"
+]
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "zip": ("application/zip", "zip")
+}
+BATCH_ROWS = 5000
+
+
+def iter_batches(
+    filters: Dict[str, Set],
+    t_start: Optional[float],
+    t_end: Optional[float],
+    columns: Sequence[str]
+) -> Iterator[List[tuple]]:
+    """Yield matching events as batches of column tuples, oldest first.
+
+    Archived days come first, then the database through a streaming cursor
+    (`yield_per`), so only one batch is in memory at a time.
+    """
+    horizon = event_archive.horizon
+    if horizon and (t_start is None or t_start < horizon):
+        batch = []
+        for row in event_archive.scan(filters, t_start, t_end, newest_first=False):
+            batch.append(tuple(row[col] for col in columns))
+            if len(batch) >= BATCH_ROWS:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    query = select(*[getattr(Event, col) for col in columns])
+    for col, values in filters.items():
+        query = query.where(getattr(Event, col).in_(values))
+    if t_start is not None:
+        query = query.where(Event.t_start >= t_start)
+    if t_end is not None:
+        query = query.where(Event.t_start <= t_end)
+    query = query.order_by(Event.t_start, Event.id).execution_options(yield_per=BATCH_ROWS)
+
+    db = SessionLocal()
+    try:
+        for partition in db.execute(query).partitions():
+            yield [tuple(row) for row in partition]
+    finally:
+        db.close()
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are drained as chunks."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        """Return and forget everything written so far."""
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _csv_value(value: Any) -> Any:
+    """Flatten list columns for CSV cells."""
+    return json.dumps(value) if isinstance(value, list) else value
+
+
+def encode_ndjson(batches: Iterator[List[tuple]], columns: Sequence[str]) -> Iterator[bytes]:
+    """One JSON object per line."""
+    for batch in batches:
+        yield b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in batch)
+
+
+def encode_csv(batches: Iterator[List[tuple]], columns: Sequence[str]) -> Iterator[bytes]:
+    """CSV with a header row; list columns are JSON-encoded."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows([_csv_value(v) for v in row] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def encode_parquet(batches: Iterator[List[tuple]], columns: Sequence[str]) -> Iterator[bytes]:
+    """Parquet with one row group per batch (requires pyarrow).
+
+    The schema is fixed up front, so batches whose nullable columns are all
+    empty still match the file.
+    """
+    schema = arrow_schema(tuple(columns))
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for batch in batches:
+        writer.write_table(pa.table([[row[i] for row in batch] for i in range(len(columns))], schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def _snapshot_file(snapshot_path: Optional[str]):
+    """Local file for a /storage/... snapshot URL, if it exists."""
+    if not snapshot_path:
+        return None
+    relative = snapshot_path.lstrip("/")
+    if relative.startswith("storage/"):
+        relative = relative[len("storage/"):]
+    root = settings.storage_root_path
+    path = (root / relative).resolve()
+    if root not in path.parents or not path.is_file():
+        return None
+    return path
+
+
+def encode_zip(batches: Iterator[List[tuple]], columns: Sequence[str]) -> Iterator[bytes]:
+    """ZIP of events.csv plus the snapshot images the events reference.
+
+    Snapshots are streamed into the archive as they are met; the CSV is
+    spooled to a temp file and added last.
+    """
+    sink = _ChunkSink()
+    snapshot_col = columns.index("snapshot_path") if "snapshot_path" in columns else None
+    added = set()
+    with tempfile.TemporaryFile("w+", newline="", encoding="utf-8") as spool:
+        writer = csv.writer(spool)
+        writer.writerow(columns)
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for batch in batches:
+                writer.writerows([_csv_value(v) for v in row] for row in batch)
+                if snapshot_col is not None:
+                    for row in batch:
+                        path = _snapshot_file(row[snapshot_col])
+                        if path is None or path.name in added:
+                            continue
+                        added.add(path.name)
+                        # JPEGs are already compressed
+                        zf.write(path, f"snapshots/{path.name}", compress_type=zipfile.ZIP_STORED)
+                        yield sink.drain()
+
+            spool.seek(0)
+            with zf.open("events.csv", "w", force_zip64=True) as entry:
+                while True:
+                    text = spool.read(1 << 20)
+                    if not text:
+                        break
+                    entry.write(text.encode("utf-8"))
+                    yield sink.drain()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "parquet": encode_parquet,
+    "zip": encode_zip
+}
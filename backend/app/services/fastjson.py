@@ -0,0 +1,43 @@
+"""Fast JSON responses: orjson when installed, optional gzip for large bodies."""
+from fastapi import Response
+from typing import Any, Dict, Tuple
+import gzip
+import json
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # Optional speedup
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def encode_json(obj: Any, accept_encoding: str = "") -> Tuple[bytes, Dict[str, str]]:
+    """Body and headers of a JSON response, gzip'd when large and the client accepts it.
+
+    Encoding and compression are CPU-bound, so call this off the event loop
+    (e.g. inside run_db) for anything that may be large.
+    """
+    body = dumps(obj)
+    headers = {}
+    if (
+        settings.response_gzip_min_bytes
+        and len(body) >= settings.response_gzip_min_bytes
+        and "gzip" in accept_encoding
+    ):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return body, headers
+
+
+def json_response(body: bytes, headers: Dict[str, str], status_code: int = 200) -> Response:
+    """Response for a body from encode_json."""
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,163 @@
+"""Per-camera, per-class detection heatmaps kept as hourly memory-mapped grids."""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote
+import threading
+import time
+import numpy as np
+
+from app.config import settings
+
+HOURS_PER_FILE = 24
+OPEN_FILES = 32
+
+
+class HeatmapStore:
+    """Occupancy grids of event bounding boxes.
+
+    The frame is divided into `cell_px` square cells; every event adds one
+    to the cells its box covers. Grids are kept per camera, class and hour in
+    one .npy file per UTC day (shape 24 x rows x cols) opened as memmaps, so
+    a heatmap for any range is the sum of the hourly slices it covers.
+    """
+
+    def __init__(self, root: Path, cell_px: int, width_px: int, height_px: int):
+        self.root = root
+        self.cell_px = cell_px
+        self.shape = (-(-height_px // cell_px), -(-width_px // cell_px))
+        self.lock = threading.Lock()
+        self.open: "OrderedDict[Path, np.memmap]" = OrderedDict()
+        self.dirty = set()
+        self.last_flush = time.monotonic()
+
+    def _path(self, camera_id: str, cls: str, day: int) -> Path:
+        """Grid file for a camera, class and UTC day number."""
+        day_name = time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+        return self.root / quote(camera_id, safe="") / quote(cls, safe="") / f"{day_name}.npy"
+
+    def _grids(self, path: Path, create: bool) -> Optional[np.memmap]:
+        """Open (or create) a day file; caller holds the lock."""
+        grids = self.open.get(path)
+        if grids is not None:
+            self.open.move_to_end(path)
+            return grids
+        if path.exists():
+            grids = np.load(path, mmap_mode="r+")
+            if grids.shape[1:] != self.shape:
+                print(f"Ignoring heatmap {path}: grid shape {grids.shape[1:]} != {self.shape}")
+                return None
+        elif create:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            grids = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint32, shape=(HOURS_PER_FILE,) + self.shape)
+        else:
+            return None
+        self.open[path] = grids
+        if len(self.open) > OPEN_FILES:
+            old_path, old = self.open.popitem(last=False)
+            if old_path in self.dirty:
+                old.flush()
+                self.dirty.discard(old_path)
+        return grids
+
+    def add(self, events_data: Iterable[Dict[str, Any]]):
+        """Fold events' boxes into their hourly grids."""
+        rows, cols = self.shape
+        with self.lock:
+            for data in events_data:
+                bbox = data.get("bbox_xyxy")
+                if not bbox or len(bbox) < 4:
+                    continue
+                t_start = data.get("t_start") or 0.0
+                hour = int(t_start // 3600)
+                path = self._path(data.get("camera_id") or "default", data.get("cls") or "", hour // HOURS_PER_FILE)
+                grids = self._grids(path, create=True)
+                if grids is None:
+                    continue
+                x1, y1, x2, y2 = bbox[:4]
+                c0 = min(max(int(x1 // self.cell_px), 0), cols - 1)
+                r0 = min(max(int(y1 // self.cell_px), 0), rows - 1)
+                c1 = min(max(int(x2 // self.cell_px), c0), cols - 1)
+                r1 = min(max(int(y2 // self.cell_px), r0), rows - 1)
+                grids[hour % HOURS_PER_FILE, r0:r1 + 1, c0:c1 + 1] += 1
+                self.dirty.add(path)
+            if time.monotonic() - self.last_flush >= settings.heatmap_flush_sec:
+                self._flush()
+
+    def _flush(self):
+        """Write dirty grids back to disk; caller holds the lock."""
+        for path in self.dirty:
+            grids = self.open.get(path)
+            if grids is not None:
+                grids.flush()
+        self.dirty.clear()
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        """Write dirty grids back to disk."""
+        with self.lock:
+            self._flush()
+
+    def is_empty(self) -> bool:
+        """Whether no heatmaps have been stored yet."""
+        return not self.root.exists() or next(self.root.iterdir(), None) is None
+
+    def cameras_and_classes(self) -> List[Tuple[str, str]]:
+        """Every (camera_id, cls) with stored grids."""
+        if not self.root.exists():
+            return []
+        return [
+            (unquote(camera.name), unquote(cls.name))
+            for camera in self.root.iterdir() if camera.is_dir()
+            for cls in camera.iterdir() if cls.is_dir()
+        ]
+
+    def heatmap(
+        self,
+        t_start: float,
+        t_end: float,
+        camera_id: Optional[str] = None,
+        cls: Optional[str] = None
+    ) -> np.ndarray:
+        """Summed grid for the hours overlapping [t_start, t_end] (all cameras/classes when None)."""
+        first_hour, last_hour = int(t_start // 3600), int(t_end // 3600)
+        total = np.zeros(self.shape, dtype=np.uint64)
+        keys = [
+            (cam, c) for cam, c in self.cameras_and_classes()
+            if (camera_id is None or cam == camera_id) and (cls is None or c == cls)
+        ]
+        # Only opening the files needs the lock; summing happens without it so the
+        # event writer's add() isn't held up by a wide query (a count landing
+        # mid-sum may or may not be included)
+        slices = []
+        with self.lock:
+            for cam, c in keys:
+                for day in range(first_hour // HOURS_PER_FILE, last_hour // HOURS_PER_FILE + 1):
+                    grids = self._grids(self._path(cam, c, day), create=False)
+                    if grids is None:
+                        continue
+                    lo = max(first_hour - day * HOURS_PER_FILE, 0)
+                    hi = min(last_hour - day * HOURS_PER_FILE, HOURS_PER_FILE - 1)
+                    slices.append(grids[lo:hi + 1])
+        for hours in slices:
+            total += hours.sum(axis=0, dtype=np.uint64)
+        return total
+
+    def rebuild(self, rows: Iterable[Dict[str, Any]], batch: int = 5000):
+        """Build grids from scratch from an iterable of event rows."""
+        pending = []
+        for row in rows:
+            pending.append(row)
+            if len(pending) >= batch:
+                self.add(pending)
+                pending = []
+        self.add(pending)
+        self.flush()
+
+
+heatmap_store = HeatmapStore(
+    settings.storage_root_path / "heatmaps",
+    settings.heatmap_cell_px,
+    settings.heatmap_width_px,
+    settings.heatmap_height_px
+)
@@ -0,0 +1,450 @@
+"""Chatbot query engine: question -> plan -> indexed SQL, with plan and result caches."""
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, cast, and_, or_, null, Integer
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import re
+import threading
+import time
+
+from app.db.archive import event_archive, merge_newest
+from app.db.models import Event, EventRollup
+from app.db.repo import ZoneRepo
+
+
+# Words that name a detection class
+CLASS_KEYWORDS = {
+    "person": "person", "persons": "person", "human": "person", "humans": "person",
+    "people": "person", "intruder": "person", "intruders": "person",
+    "car": "car", "cars": "car", "vehicle": "car", "vehicles": "car", "automobile": "car",
+    "truck": "truck", "trucks": "truck", "bus": "bus", "buses": "bus",
+    "motorcycle": "motorcycle", "motorcycles": "motorcycle", "bike": "bicycle", "bicycle": "bicycle",
+    "dog": "dog", "dogs": "dog",
+    "cat": "cat", "cats": "cat",
+    "cow": "cow", "cows": "cow", "cattle": "cow",
+    "phone": "cell phone", "phones": "cell phone", "mobile": "cell phone", "smartphone": "cell phone",
+    "laptop": "laptop", "laptops": "laptop", "computer": "laptop",
+    "drone": "drone", "drones": "drone", "uav": "drone",
+    "bag": "handbag", "handbag": "handbag", "suitcase": "suitcase", "luggage": "suitcase",
+    "fire": "fire", "flame": "fire", "flames": "fire", "smoke": "smoke",
+    "face": "face", "faces": "face"
+}
+
+# Words that name an event type
+TYPE_KEYWORDS = {
+    "intrusion": "intrusion", "intrusions": "intrusion", "breach": "intrusion",
+    "tripwire": "tripwire", "tripwires": "tripwire", "crossing": "tripwire", "crossings": "tripwire",
+    "loitering": "loitering", "loiter": "loitering", "loiterer": "loitering"
+}
+
+# "per hour", "by zone", "hourly", ...
+GROUP_KEYWORDS = {
+    "hour": "hour", "hourly": "hour", "day": "day", "daily": "day",
+    "zone": "zone", "zones": "zone", "class": "cls", "classes": "cls", "object": "cls",
+    "camera": "camera_id", "cameras": "camera_id", "type": "type", "types": "type"
+}
+
+UNIT_SECONDS = {
+    "second": 1, "minute": 60, "min": 60, "hour": 3600, "hr": 3600,
+    "day": 86400, "week": 7 * 86400, "month": 30 * 86400
+}
+
+# A number with what may make it a confidence: keyword, comparison, value, percent sign
+CONF_MENTION = re.compile(
+    r"(conf(?:idence)?\s*)?((?:above|over|greater than|more than|at least|of|is|>=?|=)\s*)?"
+    r"(?<![\d.:])(\d+(?:\.\d+)?)(?![\d:])\s*(%|percent)?"
+)
+
+ROLLUP_SIZE = 3600  # Rollup granularity used for pushdown
+PLAN_CACHE_SIZE = 512
+RESULT_CACHE_SIZE = 256
+VOCAB_TTL_SEC = 60
+NOW_QUANTUM_SEC = 5  # Relative ranges ("last hour") share cached results within this window
+
+
+class QueryPlan(NamedTuple):
+    """Parsed form of a question. Time is kept symbolic until execution."""
+    classes: Tuple[str, ...] = ()
+    zones: Tuple[str, ...] = ()
+    cameras: Tuple[str, ...] = ()
+    types: Tuple[str, ...] = ()
+    time_spec: Optional[Tuple] = None  # ("last", sec), ("today",), ("yesterday",), ("clock", start, end, yesterday), ...
+    min_conf: Optional[float] = None
+    aggregate: Optional[str] = None  # "count"
+    group_by: Optional[str] = None  # hour, day, zone, cls, camera_id, type
+    limit: int = 100
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for API responses."""
+        return {
+            "classes": list(self.classes),
+            "zones": list(self.zones),
+            "cameras": list(self.cameras),
+            "types": list(self.types),
+            "time": list(self.time_spec) if self.time_spec else None,
+            "min_conf": self.min_conf,
+            "aggregate": self.aggregate,
+            "group_by": self.group_by,
+            "limit": self.limit
+        }
+
+
+def _parse_clock(value: str) -> Optional[int]:
+    """Parse "10", "10:30", "10pm", "10:30 am" into seconds since midnight."""
+    match = re.fullmatch(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", value.strip())
+    if not match:
+        return None
+    hours, minutes, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem == "pm" and hours < 12:
+        hours += 12
+    elif meridiem == "am" and hours == 12:
+        hours = 0
+    if hours > 24 or minutes > 59:
+        return None
+    return hours * 3600 + minutes * 60
+
+
+def parse_query(text: str, zone_names: Dict[str, str], cameras: Dict[str, str]) -> QueryPlan:
+    """Parse a question into a QueryPlan.
+
+    `zone_names` and `cameras` map lower-cased names to their stored values.
+    """
+    query = " ".join(text.lower().split())
+    words = re.findall(r"[a-z0-9_\-]+", query)
+
+    classes = sorted({CLASS_KEYWORDS[w] for w in words if w in CLASS_KEYWORDS})
+    types = sorted({TYPE_KEYWORDS[w] for w in words if w in TYPE_KEYWORDS})
+
+    # Zones and cameras are matched against what is actually stored; very
+    # short zone names only count after the word "zone" ("zone a", not "a car")
+    zones = sorted({value for name, value in zone_names.items()
+                    if re.search(rf"{'' if len(name) > 2 else 'zone '}(?<![a-z0-9]){re.escape(name)}(?![a-z0-9])", query)})
+    camera_ids = sorted({value for name, value in cameras.items()
+                         if re.search(rf"(?:camera|cam)\s+{re.escape(name)}(?![a-z0-9])", query)})
+
+    # Time range
+    time_spec = None
+    match = re.search(r"(?:last|past|previous)\s+(\d+)?\s*(second|minute|min|hour|hr|day|week|month)s?", query)
+    between = re.search(r"between\s+([\d:]+\s*(?:am|pm)?)\s+and\s+([\d:]+\s*(?:am|pm)?)", query)
+    if match:
+        time_spec = ("last", int(match.group(1) or 1) * UNIT_SECONDS[match.group(2)])
+    elif between:
+        start, end = _parse_clock(between.group(1)), _parse_clock(between.group(2))
+        if start is not None and end is not None:
+            time_spec = ("clock", start, end, "yesterday" in query)
+    elif "yesterday" in query:
+        time_spec = ("yesterday",)
+    elif "today" in query or "tonight" in query:
+        time_spec = ("today",)
+    elif "this week" in query:
+        time_spec = ("this_week",)
+    elif "this month" in query:
+        time_spec = ("this_month",)
+
+    # Confidence: "above 80%", "conf > 0.8", "confidence over 0.5", "above 0.9". A bare
+    # whole number is a count, not a confidence ("at least 1 person")
+    min_conf = None
+    for match in CONF_MENTION.finditer(query):
+        keyword, comparison, number, percent = match.groups()
+        value = float(number)
+        if percent or (keyword and value > 1):
+            value /= 100
+        elif not keyword and not (comparison and "." in number and 0 < value < 1):
+            continue
+        if 0 <= value <= 1:
+            min_conf = value
+            break
+
+    # Aggregate vs list
+    aggregate = None
+    if re.search(r"\bhow many\b|\bcount\b|\bnumber of\b|\btotal\b", query):
+        aggregate = "count"
+    group_by = None
+    match = re.search(r"(?:per|by|each|every)\s+(hour|day|zone|class|object|camera|type)\b", query)
+    if match:
+        group_by = GROUP_KEYWORDS[match.group(1)]
+    elif re.search(r"\b(hourly|daily)\b", query):
+        group_by = GROUP_KEYWORDS[re.search(r"\b(hourly|daily)\b", query).group(1)]
+    if group_by and not aggregate:
+        aggregate = "count"
+
+    return QueryPlan(
+        classes=tuple(classes),
+        zones=tuple(zones),
+        cameras=tuple(camera_ids),
+        types=tuple(types),
+        time_spec=time_spec,
+        min_conf=min_conf,
+        aggregate=aggregate,
+        group_by=group_by
+    )
+
+
+def resolve_range(time_spec: Optional[Tuple], now: float) -> Tuple[Optional[float], Optional[float]]:
+    """Turn a symbolic time spec into (t_start, t_end) epoch seconds (local calendar)."""
+    if not time_spec:
+        return None, None
+    kind = time_spec[0]
+    today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind == "last":
+        return now - time_spec[1], now
+    if kind == "today":
+        return today.timestamp(), now
+    if kind == "yesterday":
+        start = today - timedelta(days=1)
+        return start.timestamp(), today.timestamp()
+    if kind == "this_week":
+        return (today - timedelta(days=today.weekday())).timestamp(), now
+    if kind == "this_month":
+        return today.replace(day=1).timestamp(), now
+    if kind == "clock":
+        _, start, end, yesterday = time_spec
+        day = today - timedelta(days=1) if yesterday else today
+        t_start = day.timestamp() + start
+        t_end = day.timestamp() + end
+        if t_end <= t_start:
+            t_end += 86400  # Overnight range
+        return t_start, t_end
+    return None, None
+
+
+class QueryEngine:
+    """Compiles plans to SQL and caches plans and results.
+
+    Counts are pushed down as COUNT/GROUP BY. Whole hours inside the range
+    are read from the hour rollups and only the ragged edges touch raw
+    events. Cached results are keyed on the events table's max id, so
+    they are invalidated as soon as new events are stored.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.plans: "OrderedDict[Tuple, QueryPlan]" = OrderedDict()
+        self.results: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self.zone_names: Dict[str, str] = {}
+        self.cameras: Dict[str, str] = {}
+        self.vocab_loaded = 0.0
+        self.generation = 0  # Bumped by invalidate() for changes max(id) can't see
+
+    def invalidate(self):
+        """Drop cached results (e.g. after events were removed or moved)."""
+        with self.lock:
+            self.generation += 1
+            self.results.clear()
+
+    def invalidate_vocab(self):
+        """Reload zone/camera names on next use (e.g. after a zone change)."""
+        with self.lock:
+            self.vocab_loaded = 0.0
+            self.plans.clear()
+
+    def _load_vocab(self, db: Session):
+        """Refresh known zone names and camera ids."""
+        if time.time() - self.vocab_loaded < VOCAB_TTL_SEC:
+            return
+        zone_names = {z.name.lower(): z.name for z in ZoneRepo.list(db) if z.name}
+        cameras = {
+            row[0].lower(): row[0]
+            for row in db.execute(select(EventRollup.camera_id).distinct())
+            if row[0]
+        }
+        with self.lock:
+            if zone_names != self.zone_names or cameras != self.cameras:
+                self.plans.clear()
+            self.zone_names, self.cameras = zone_names, cameras
+            self.vocab_loaded = time.time()
+
+    def plan(self, db: Session, text: str) -> QueryPlan:
+        """Parse a question, using the plan cache."""
+        self._load_vocab(db)
+        key = " ".join(text.lower().split())
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is not None:
+                self.plans.move_to_end(key)
+                return plan
+        plan = parse_query(text, self.zone_names, self.cameras)
+        with self.lock:
+            self.plans[key] = plan
+            if len(self.plans) > PLAN_CACHE_SIZE:
+                self.plans.popitem(last=False)
+        return plan
+
+    def execute(
+        self,
+        db: Session,
+        plan: QueryPlan,
+        t_start: Optional[float] = None,
+        t_end: Optional[float] = None,
+        cursor: Optional[Tuple[float, int]] = None
+    ) -> Any:
+        """Run a plan. Explicit t_start/t_end override the plan's time range.
+
+        Returns a list of Events for list plans, or
+        {"count": n, "groups": [{"key", "count"}]} for aggregate plans.
+        """
+        now = (int(time.time()) // NOW_QUANTUM_SEC + 1) * NOW_QUANTUM_SEC
+        plan_start, plan_end = resolve_range(plan.time_spec, now)
+        t_start = t_start if t_start is not None else plan_start
+        t_end = t_end if t_end is not None else plan_end
+
+        version = db.execute(select(func.max(Event.id))).scalar()
+        key = (plan, t_start, t_end, cursor, version, self.generation)
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                return self.results[key]
+
+        if plan.aggregate:
+            result = self._count(db, plan, t_start, t_end)
+        else:
+            result = self._list(db, plan, t_start, t_end, cursor)
+            # Detach rows so cached results don't hold on to the session
+            db.expunge_all()
+
+        with self.lock:
+            self.results[key] = result
+            if len(self.results) > RESULT_CACHE_SIZE:
+                self.results.popitem(last=False)
+        return result
+
+    def _filters(self, table, plan: QueryPlan) -> List:
+        """Equality filters shared by raw and rollup queries."""
+        filters = []
+        for column, values in (("cls", plan.classes), ("zone", plan.zones),
+                               ("camera_id", plan.cameras), ("type", plan.types)):
+            if values:
+                col = getattr(table, column)
+                filters.append(col == values[0] if len(values) == 1 else col.in_(values))
+        return filters
+
+    def _list(self, db: Session, plan: QueryPlan, t_start, t_end, cursor) -> List[Event]:
+        """Newest matching events (keyset-paginated)."""
+        query = select(Event).where(*self._filters(Event, plan))
+        if t_start is not None:
+            query = query.where(Event.t_start >= t_start)
+        if t_end is not None:
+            query = query.where(Event.t_start <= t_end)
+        if plan.min_conf is not None:
+            query = query.where(Event.conf >= plan.min_conf)
+        if cursor:
+            last_t, last_id = cursor
+            query = query.where(or_(Event.t_start < last_t, and_(Event.t_start == last_t, Event.id < last_id)))
+        query = query.order_by(Event.t_start.desc(), Event.id.desc()).limit(plan.limit)
+        events = list(db.execute(query).scalars())
+
+        # Fill the page from archived days once it runs past the retention horizon
+        horizon = event_archive.horizon
+        reaches_archive = horizon and (t_start is None or t_start < horizon)
+        if reaches_archive and (len(events) < plan.limit or events[-1].t_start < horizon):
+            archived = event_archive.query(
+                self._archive_filters(plan), t_start, t_end, plan.min_conf, cursor, plan.limit
+            )
+            events = merge_newest(events, archived, plan.limit)
+        return events
+
+    def _count(self, db: Session, plan: QueryPlan, t_start, t_end) -> Dict[str, Any]:
+        """COUNT/GROUP BY, using hour rollups for whole hours when the plan allows."""
+        groups: Dict[Any, int] = {}
+
+        # Rollups have no per-event confidence, so a confidence filter reads raw rows
+        use_rollups = plan.min_conf is None
+        if use_rollups:
+            first_hour = None if t_start is None else -(-int(t_start) // ROLLUP_SIZE) * ROLLUP_SIZE
+            last_hour = None if t_end is None else int(t_end) // ROLLUP_SIZE * ROLLUP_SIZE
+            if first_hour is not None and last_hour is not None and first_hour >= last_hour:
+                use_rollups = False
+
+        if use_rollups:
+            self._merge(groups, db.execute(self._rollup_query(plan, first_hour, last_hour)))
+            # Ragged edges from raw events: [t_start, first_hour) and [last_hour, t_end]
+            if t_start is not None and t_start < first_hour:
+                self._count_raw(db, groups, plan, t_start, first_hour, end_inclusive=False)
+            if t_end is not None:
+                self._count_raw(db, groups, plan, last_hour, t_end)
+        else:
+            self._count_raw(db, groups, plan, t_start, t_end)
+
+        total = sum(groups.values())
+        rows = [{"key": key, "count": count} for key, count in groups.items()] if plan.group_by else []
+        rows.sort(key=lambda row: (row["key"] is None, row["key"]) if plan.group_by in ("hour", "day") else -row["count"])
+        return {"count": total, "groups": rows}
+
+    def _count_raw(self, db: Session, groups: Dict[Any, int], plan: QueryPlan, t_start, t_end, end_inclusive: bool = True):
+        """Count raw events in a range, including archived days it overlaps."""
+        self._merge(groups, db.execute(self._raw_query(plan, t_start, t_end, end_inclusive)))
+        horizon = event_archive.horizon
+        if not horizon or (t_start is not None and t_start >= horizon):
+            return
+        counts: Dict[Any, int] = {}
+        for row in event_archive.scan(
+            self._archive_filters(plan), t_start, t_end, plan.min_conf, end_inclusive=end_inclusive
+        ):
+            if plan.group_by in ("hour", "day"):
+                size = 3600 if plan.group_by == "hour" else 86400
+                key = int(row["t_start"] // size) * size
+            else:
+                key = row[plan.group_by] if plan.group_by else None
+            counts[key] = counts.get(key, 0) + 1
+        self._merge(groups, counts.items())
+
+    @staticmethod
+    def _archive_filters(plan: QueryPlan) -> Dict[str, set]:
+        """Plan equality filters in the archive's {column: values} form."""
+        return {
+            column: set(values)
+            for column, values in (("cls", plan.classes), ("zone", plan.zones),
+                                   ("camera_id", plan.cameras), ("type", plan.types))
+            if values
+        }
+
+    @staticmethod
+    def _merge(groups: Dict[Any, int], rows):
+        """Add (key, count) rows into a totals dict."""
+        for key, count in rows:
+            if count:
+                key = key or None
+                groups[key] = groups.get(key, 0) + count
+
+    def _group_key(self, plan: QueryPlan, table, time_column):
+        """Grouping expression for a plan (None when ungrouped)."""
+        if plan.group_by == "hour":
+            return cast(time_column / 3600, Integer) * 3600
+        if plan.group_by == "day":
+            return cast(time_column / 86400, Integer) * 86400
+        if plan.group_by:
+            return getattr(table, plan.group_by)
+        return None
+
+    def _raw_query(self, plan: QueryPlan, t_start, t_end, end_inclusive: bool = True):
+        """COUNT over raw events in the time range."""
+        key = self._group_key(plan, Event, Event.t_start)
+        query = select(key if key is not None else null(), func.count()).where(*self._filters(Event, plan))
+        if t_start is not None:
+            query = query.where(Event.t_start >= t_start)
+        if t_end is not None:
+            query = query.where(Event.t_start <= t_end if end_inclusive else Event.t_start < t_end)
+        if plan.min_conf is not None:
+            query = query.where(Event.conf >= plan.min_conf)
+        if key is not None:
+            query = query.group_by(key)
+        return query
+
+    def _rollup_query(self, plan: QueryPlan, first_hour, last_hour):
+        """SUM(count) over hour rollups in [first_hour, last_hour)."""
+        key = self._group_key(plan, EventRollup, EventRollup.bucket_start)
+        query = select(
+            key if key is not None else null(),
+            func.sum(EventRollup.count)
+        ).where(EventRollup.bucket_size == ROLLUP_SIZE, *self._filters(EventRollup, plan))
+        if first_hour is not None:
+            query = query.where(EventRollup.bucket_start >= first_hour)
+        if last_hour is not None:
+            query = query.where(EventRollup.bucket_start < last_hour)
+        if key is not None:
+            query = query.group_by(key)
+        return query
+
+
+query_engine = QueryEngine()
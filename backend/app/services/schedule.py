@@ -0,0 +1,149 @@
+"""Zone activity schedules compiled into weekly time-interval indexes.
+
+``detection-service/detectsvc/pipeline/schedule.py`` compiles schedules and
+``backend/app/services/schedule.py`` validates them before a zone is saved.
+They are built into separate images and must stay identical.
+"""
+from typing import List, Dict, Optional, Tuple, Union
+import bisect
+import re
+import time
+
+WEEK_SEC = 7 * 86400
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+# One window in text form: "[days] HH:MM-HH:MM" (any dash), e.g. "weekdays 18:00–07:00"
+WINDOW_TEXT = re.compile(r"^\s*(?:(?P<days>.*?)\s+)?(?P<start>\d{1,2}:\d{2})\s*[-\u2013\u2014]\s*(?P<end>\d{1,2}:\d{2})\s*$")
+DAY_GROUPS = {
+    "daily": list(range(7)),
+    "all": list(range(7)),
+    "weekdays": [0, 1, 2, 3, 4],
+    "weekends": [5, 6],
+}
+
+
+def _parse_days(days: Union[str, List, None]) -> List[int]:
+    """Parse a day spec ("weekdays", "mon-fri", ["mon", "fri"], [0, 4]) into weekday numbers (Mon=0)."""
+    if days is None:
+        return list(range(7))
+    if isinstance(days, str):
+        days = days.lower()
+        if days in DAY_GROUPS:
+            return DAY_GROUPS[days]
+        days = [d.strip() for d in days.split(",")]
+
+    result = []
+    for day in days:
+        if isinstance(day, int) and 0 <= day <= 6:
+            result.append(day)
+        elif isinstance(day, str) and day.count("-") == 1:
+            # Day range, wrapping past Sunday ("fri-mon")
+            first, last = (_parse_days([part.strip()])[0] for part in day.split("-"))
+            result.extend((first + i) % 7 for i in range((last - first) % 7 + 1))
+        elif isinstance(day, str) and day.lower() in DAY_GROUPS:
+            result.extend(DAY_GROUPS[day.lower()])
+        elif isinstance(day, str) and day.lower()[:3] in DAY_NAMES:
+            result.append(DAY_NAMES.index(day.lower()[:3]))
+        else:
+            raise ValueError(f"Invalid day: {day}")
+    return sorted(set(result))
+
+
+def _parse_clock(value: str) -> int:
+    """Parse "HH:MM" into seconds since midnight ("24:00" allowed)."""
+    if not isinstance(value, str) or value.count(":") != 1:
+        raise ValueError(f"Invalid time: {value}")
+    hours, minutes = value.split(":")
+    seconds = int(hours) * 3600 + int(minutes) * 60
+    if not 0 <= seconds <= 86400:
+        raise ValueError(f"Invalid time: {value}")
+    return seconds
+
+
+class Schedule:
+    """Weekly activity schedule as sorted, merged [start, end) intervals in week-seconds.
+
+    Week-seconds count from Monday 00:00 local time.
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int]]):
+        merged: List[List[int]] = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = [s for s, _ in merged]
+        self.ends = [e for _, e in merged]
+
+    def is_active(self, week_sec: float) -> bool:
+        """Check if the schedule is active at a week offset."""
+        i = bisect.bisect_right(self.starts, week_sec) - 1
+        return i >= 0 and week_sec < self.ends[i]
+
+    def next_boundary(self, week_sec: float) -> float:
+        """Seconds from `week_sec` until the schedule next switches on or off."""
+        if not self.starts:
+            return float("inf")
+        i = bisect.bisect_right(self.starts, week_sec) - 1
+        if i >= 0 and week_sec < self.ends[i]:
+            return self.ends[i] - week_sec
+        if i + 1 < len(self.starts):
+            return self.starts[i + 1] - week_sec
+        return self.starts[0] + WEEK_SEC - week_sec
+
+
+def _parse_window(window: Union[Dict, str]) -> Dict:
+    """A window as a dict, parsing the text form ("weekdays 18:00-07:00")."""
+    if isinstance(window, dict):
+        return window
+    match = WINDOW_TEXT.match(window) if isinstance(window, str) else None
+    if match is None:
+        raise ValueError(f"Invalid schedule window: {window!r}")
+    return match.groupdict()
+
+
+def compile_schedule(spec: Union[Dict, str, None]) -> Optional[Schedule]:
+    """Compile an `active_schedule` spec into a Schedule.
+
+    Accepts a single window or {"windows": [...]}, where a window is
+    {"days": "weekdays", "start": "18:00", "end": "07:00"} or the same as
+    text, "weekdays 18:00-07:00" (several separated by ";"). A window whose
+    end is not after its start runs overnight into the following day.
+    Returns None for "always active" (no spec); raises ValueError for
+    anything it can't parse.
+    """
+    if not spec:
+        return None
+    if isinstance(spec, str):
+        windows = [part for part in spec.split(";") if part.strip()]
+    elif isinstance(spec, dict):
+        windows = spec.get("windows", [spec])
+    else:
+        raise ValueError(f"Invalid schedule: {spec!r}")
+    if not isinstance(windows, list):
+        raise ValueError(f"Invalid schedule windows: {windows!r}")
+
+    intervals = []
+    for window in map(_parse_window, windows):
+        start = _parse_clock(window.get("start", "00:00"))
+        end = _parse_clock(window.get("end", "24:00"))
+        length = end - start if end > start else end + 86400 - start
+        for day in _parse_days(window.get("days")):
+            begin = day * 86400 + start
+            if begin + length <= WEEK_SEC:
+                intervals.append((begin, begin + length))
+            else:
+                # Sunday overnight wraps around to Monday morning
+                intervals.append((begin, WEEK_SEC))
+                intervals.append((0, begin + length - WEEK_SEC))
+    return Schedule(intervals)
+
+
+def week_seconds(timestamp: float) -> float:
+    """Convert an epoch timestamp to local week-seconds (Monday 00:00 = 0)."""
+    lt = time.localtime(timestamp)
+    return (
+        lt.tm_wday * 86400 + lt.tm_hour * 3600 + lt.tm_min * 60 + lt.tm_sec
+        + (timestamp - int(timestamp))
+    )
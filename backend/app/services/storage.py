@@ -1,7 +1,10 @@
 """File storage management."""
+from fastapi import UploadFile
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional, Tuple
 import aiofiles
+import hashlib
+import os
 import shutil
 from app.config import settings
 
@@ -39,6 +42,32 @@ class StorageService:
             await f.write(file_content)
         return file_path
     
+    async def save_stream(self, chunks: AsyncIterator[bytes], dest: Path) -> Tuple[Path, str, int]:
+        """Stream chunks to `dest` with constant memory.
+        
+        Data goes to a temp file next to `dest`, hashed as it is written, and
+        is renamed into place only once complete. Returns (path, sha256, size).
+        """
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + ".part")
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp, 'wb') as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+            os.replace(tmp, dest)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return dest, sha256.hexdigest(), size
+    
+    async def save_upload_file(self, file: UploadFile, dest: Path) -> Tuple[Path, str, int]:
+        """Stream a multipart upload to `dest` (see save_stream)."""
+        return await self.save_stream(iter_upload(file), dest)
+    
     def delete_file(self, file_path: Path) -> bool:
         """Delete file."""
         try:
@@ -50,5 +79,15 @@ class StorageService:
             return False
 
 
+async def iter_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    """Read an UploadFile in fixed-size chunks."""
+    chunk_size = settings.upload_chunk_kb * 1024
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
 storage_service = StorageService()
 
@@ -0,0 +1,252 @@
+"""Disk budgets for stored artifacts: a file index, LRU eviction and content-addressed uploads."""
+from contextlib import contextmanager
+from fastapi.staticfiles import StaticFiles
+from pathlib import Path
+from sqlalchemy import and_, exists, or_, select
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Set
+import os
+import re
+import shutil
+import threading
+import time
+
+from app.config import settings
+from app.db.models import Event
+from app.db.repo import FileRepo
+from app.db.archive import event_archive
+
+CATEGORIES = ("videos", "snaps", "clips", "uploads")
+# Files still being written by the backend or the detection service
+SKIP_SUFFIXES = (".part", ".tmp")
+# Files accessed this recently are never evicted (e.g. a snapshot whose event is still queued)
+EVICT_GRACE_SEC = 600
+SHA256_NAME = re.compile(r"[0-9a-f]{64}")
+
+
+class StorageManager:
+    """Keeps each storage category within its byte budget.
+
+    Every file directly under storage/<category> is indexed with its size and
+    last access time (files served through /storage count as accesses). When
+    a category is over budget, or the disk's free space drops below
+    storage_min_free_mb, the least recently used files are deleted, except
+    files that an event in the database points at, files pinned while a
+    request uses them, and the inputs of running video analyses. Uploads are
+    stored under their SHA-256, so identical uploads share one file.
+
+    Events past retention live in the archive and do not protect their
+    files: archived data may be evicted like any other, and the archived
+    events' snapshot_path/video_ref are then nulled out so they never
+    point at a missing file.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.lock = threading.Lock()
+        self.accessed: Dict[str, float] = {}  # Touches not yet written to the index
+        self.pins: Dict[str, int] = {}  # Path -> requests using it
+
+        # Metrics
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.deduplicated = 0
+
+    def budgets(self) -> Dict[str, int]:
+        """Byte budget per category (0 = unlimited)."""
+        return {
+            "videos": settings.storage_budget_videos_mb * 1024 * 1024,
+            "snaps": settings.storage_budget_snaps_mb * 1024 * 1024,
+            "clips": settings.storage_budget_clips_mb * 1024 * 1024,
+            "uploads": settings.storage_budget_uploads_mb * 1024 * 1024
+        }
+
+    def touch(self, path: str):
+        """Record an access to a stored file (path relative to the storage root)."""
+        if path.split("/", 1)[0] in CATEGORIES:
+            with self.lock:
+                self.accessed[path] = time.time()
+
+    def relative(self, path) -> Optional[str]:
+        """Index path (relative to the storage root) of a file, or None if it is elsewhere."""
+        try:
+            return Path(path).resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return None
+
+    @contextmanager
+    def pinned(self, path: Path):
+        """Keep a file from being evicted for the duration of the block."""
+        key = self.relative(path)
+        with self.lock:
+            self.pins[key] = self.pins.get(key, 0) + 1
+        try:
+            yield path
+        finally:
+            with self.lock:
+                self.pins[key] -= 1
+                if not self.pins[key]:
+                    del self.pins[key]
+
+    def adopt(self, path: Path, category: str, sha256: str) -> Path:
+        """Move a finished file to <category>/<sha256><ext>; returns where it ended up.
+
+        If identical content is already stored, `path` is deleted and the
+        existing file is reused.
+        """
+        dest = self.root / category / f"{sha256}{path.suffix.lower()}"
+        if dest.exists():
+            path.unlink(missing_ok=True)
+            self.deduplicated += 1
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, dest)
+        self.touch(f"{category}/{dest.name}")
+        return dest
+
+    def maintain(self, db: Session, job_files: Optional[Iterable[str]] = None) -> int:
+        """Sync the index with the disk and evict until within budget; returns files evicted.
+
+        `job_files` are the inputs of running video analyses; None means they
+        are unknown (detection service unreachable), so no videos are evicted.
+        """
+        for category in CATEGORIES:
+            self._reconcile(db, category)
+        with self.lock:
+            accessed, self.accessed = self.accessed, {}
+        FileRepo.touch(db, accessed)
+
+        usage = FileRepo.usage(db)
+        over = {
+            category: usage.get(category, (0, 0))[1] - budget
+            for category, budget in self.budgets().items()
+            if budget and usage.get(category, (0, 0))[1] > budget
+        }
+        short = settings.storage_min_free_mb * 1024 * 1024 - self.disk()["free"]
+        if not over and short <= 0:
+            return 0
+
+        protected = set(filter(None, map(self.relative, job_files or ())))
+        skip = set() if job_files is not None else {"videos"}
+        evicted = 0
+        for category, excess in over.items():
+            if category in skip:
+                continue
+            freed, count = self._evict(db, category, excess, protected, skip)
+            short -= freed
+            evicted += count
+            if freed < excess:
+                print(f"Storage category {category} is {excess - freed} bytes over budget; the rest is in use")
+        if short > 0:
+            evicted += self._evict(db, None, short, protected, skip)[1]
+        return evicted
+
+    def _reconcile(self, db: Session, category: str):
+        """Index new or changed files in a category and forget deleted ones."""
+        directory = self.root / category
+        indexed = FileRepo.sizes(db, category)
+        changed = []
+        seen = set()
+        if directory.exists():
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file() or entry.name.endswith(SKIP_SUFFIXES):
+                        continue
+                    path = f"{category}/{entry.name}"
+                    seen.add(path)
+                    stat = entry.stat()
+                    if indexed.get(path) != stat.st_size:
+                        stem = entry.name.split(".", 1)[0]
+                        changed.append({
+                            "path": path,
+                            "category": category,
+                            "size": stat.st_size,
+                            "sha256": stem if SHA256_NAME.fullmatch(stem) else None,
+                            "last_access": stat.st_mtime
+                        })
+        FileRepo.upsert(db, changed)
+        FileRepo.delete(db, [path for path in indexed if path not in seen])
+
+    @staticmethod
+    def _referenced(db: Session, path: str) -> bool:
+        """Whether an event in the database points at a stored file (one indexed lookup)."""
+        url = f"/storage/{path}"
+        return db.execute(select(exists().where(or_(
+            Event.snapshot_path == url,
+            Event.video_ref == url,
+            # File-analysis refs carry a #t= fragment; a range keeps this on the index
+            and_(Event.video_ref > url + "#", Event.video_ref < url + "$")
+        )))).scalar()
+
+    def _evict(self, db: Session, category: Optional[str], amount: int, protected: Set[str], skip: Set[str]):
+        """Delete least recently used, unprotected files until `amount` bytes are freed.
+
+        Returns (bytes freed, files deleted).
+        """
+        grace = time.time() - EVICT_GRACE_SEC
+        freed = 0
+        deleted: List[str] = []
+        offset = 0
+        done = False
+        while not done:
+            files = FileRepo.least_recent(db, category, offset=offset)
+            offset += len(files)
+            done = not files
+            for stored in files:
+                if freed >= amount or stored.last_access > grace:
+                    done = True
+                    break
+                with self.lock:
+                    in_use = stored.path in self.accessed or stored.path in self.pins
+                if in_use or stored.path in protected or stored.category in skip:
+                    continue
+                if self._referenced(db, stored.path):
+                    continue
+                try:
+                    (self.root / stored.path).unlink(missing_ok=True)
+                except OSError as e:
+                    print(f"Failed to evict {stored.path}: {e}")
+                    continue
+                deleted.append(stored.path)
+                freed += stored.size
+        FileRepo.delete(db, deleted)
+        event_archive.drop_references({f"/storage/{path}" for path in deleted})
+        self.evicted_files += len(deleted)
+        self.evicted_bytes += freed
+        return freed, len(deleted)
+
+    def disk(self) -> Dict[str, int]:
+        """Total and free bytes of the filesystem holding the storage root."""
+        usage = shutil.disk_usage(self.root if self.root.exists() else self.root.parent)
+        return {"total": usage.total, "free": usage.free}
+
+    def usage(self, db: Session) -> Dict:
+        """Per-category file counts and bytes against budgets, plus disk space."""
+        counts = FileRepo.usage(db)
+        return {
+            "categories": {
+                category: {
+                    "files": counts.get(category, (0, 0))[0],
+                    "bytes": counts.get(category, (0, 0))[1],
+                    "budget_bytes": budget
+                }
+                for category, budget in self.budgets().items()
+            },
+            "disk": self.disk(),
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+            "deduplicated": self.deduplicated
+        }
+
+
+class TrackedStaticFiles(StaticFiles):
+    """StaticFiles that reports each served file to the storage manager."""
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 206, 304):
+            storage_manager.touch(path.replace(os.sep, "/"))
+        return response
+
+
+storage_manager = StorageManager(settings.storage_root_path)
@@ -0,0 +1,178 @@
+"""Resumable uploads: files sent in ranged chunks that survive dropped connections."""
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+import aiofiles
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from app.config import settings
+
+
+class UploadError(Exception):
+    """Upload request that can't be applied (carries the HTTP status to return)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class UploadSessions:
+    """Partial uploads kept as <id>.part plus an <id>.json manifest.
+
+    The part file's size is the committed offset, so a client that lost its
+    connection asks for the offset and continues from there, even across a
+    backend restart. The SHA-256 is computed incrementally as chunks arrive.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.hashers: Dict[str, Any] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+
+    def _manifest(self, upload_id: str) -> Path:
+        return self.root / f"{upload_id}.json"
+
+    def _part(self, upload_id: str) -> Path:
+        return self.root / f"{upload_id}.part"
+
+    def create(
+        self,
+        kind: str,
+        filename: str,
+        size: int,
+        sha256: Optional[str] = None,
+        meta: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Start an upload of `size` bytes; `meta` is kept for whoever finishes it."""
+        self.purge_expired()
+        self.root.mkdir(parents=True, exist_ok=True)
+        session = {
+            "upload_id": uuid.uuid4().hex,
+            "kind": kind,
+            "filename": Path(filename).name,
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "meta": meta or {},
+            "created": time.time()
+        }
+        self._part(session["upload_id"]).touch()
+        self._manifest(session["upload_id"]).write_text(json.dumps(session))
+        self.hashers[session["upload_id"]] = hashlib.sha256()
+        return dict(session, offset=0)
+
+    def get(self, upload_id: str) -> Dict[str, Any]:
+        """Upload state including the current offset."""
+        if not upload_id.isalnum():
+            raise UploadError(404, "Upload not found")
+        try:
+            session = json.loads(self._manifest(upload_id).read_text())
+            offset = self._part(upload_id).stat().st_size
+        except (OSError, ValueError):
+            raise UploadError(404, "Upload not found")
+        return dict(session, offset=offset)
+
+    def _hasher(self, upload_id: str, offset: int):
+        """Hash state at `offset`, re-reading the part file if it was lost (e.g. restart)."""
+        hasher = self.hashers.get(upload_id)
+        if hasher is None:
+            hasher = hashlib.sha256()
+            chunk_size = settings.upload_chunk_kb * 1024
+            with open(self._part(upload_id), "rb") as f:
+                remaining = offset
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    remaining -= len(chunk)
+            self.hashers[upload_id] = hasher
+        return hasher
+
+    async def append(
+        self,
+        upload_id: str,
+        start: int,
+        chunks: AsyncIterator[bytes],
+        end: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Write a chunk that begins at byte `start` (must equal the current offset).
+
+        With `end` (inclusive, as in Content-Range) the chunk must be exactly
+        end - start + 1 bytes; one that isn't is removed again.
+        """
+        lock = self.locks.setdefault(upload_id, asyncio.Lock())
+        if lock.locked():
+            raise UploadError(409, "Another chunk of this upload is in progress")
+        async with lock:
+            session = self.get(upload_id)
+            if start != session["offset"]:
+                raise UploadError(409, f"Expected offset {session['offset']}")
+            loop = asyncio.get_running_loop()
+            hasher = await loop.run_in_executor(None, self._hasher, upload_id, start)
+
+            offset = start
+            limit = session["size"] if end is None else end + 1
+            try:
+                async with aiofiles.open(self._part(upload_id), "ab") as f:
+                    async for chunk in chunks:
+                        if offset + len(chunk) > session["size"]:
+                            raise UploadError(400, "Chunk goes past the declared upload size")
+                        if offset + len(chunk) > limit:
+                            raise UploadError(400, "Chunk is longer than its Content-Range")
+                        await f.write(chunk)
+                        hasher.update(chunk)
+                        offset += len(chunk)
+                if offset != limit and end is not None:
+                    raise UploadError(400, "Chunk is shorter than its Content-Range")
+            except UploadError:
+                # A rejected chunk is not kept
+                os.truncate(self._part(upload_id), start)
+                self.hashers.pop(upload_id, None)
+                raise
+            except BaseException:
+                # Whatever reached the file is kept; the hash is rebuilt from it next time
+                self.hashers.pop(upload_id, None)
+                raise
+            return dict(session, offset=offset)
+
+    def finish(self, upload_id: str, dest: Path) -> Dict[str, Any]:
+        """Verify a fully received upload and move it to `dest` atomically."""
+        session = self.get(upload_id)
+        if session["offset"] != session["size"]:
+            raise UploadError(409, f"Upload incomplete ({session['offset']} of {session['size']} bytes)")
+        digest = self._hasher(upload_id, session["offset"]).hexdigest()
+        if session["sha256"] and digest != session["sha256"]:
+            self.discard(upload_id)
+            raise UploadError(422, "SHA-256 mismatch; upload discarded")
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self._part(upload_id), dest)
+        self.discard(upload_id)
+        return dict(session, sha256=digest, path=str(dest))
+
+    def discard(self, upload_id: str):
+        """Forget an upload and delete its partial data."""
+        self._part(upload_id).unlink(missing_ok=True)
+        self._manifest(upload_id).unlink(missing_ok=True)
+        self.hashers.pop(upload_id, None)
+        self.locks.pop(upload_id, None)
+
+    def purge_expired(self):
+        """Drop uploads older than upload_session_ttl_hours."""
+        if not self.root.exists():
+            return
+        cutoff = time.time() - settings.upload_session_ttl_hours * 3600
+        for manifest in self.root.glob("*.json"):
+            try:
+                expired = json.loads(manifest.read_text())["created"] < cutoff
+            except (OSError, ValueError, KeyError):
+                expired = True
+            if expired:
+                self.discard(manifest.stem)
+
+
+upload_sessions = UploadSessions(settings.storage_root_path / "uploads" / "partial")
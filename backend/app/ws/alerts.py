@@ -1,20 +1,112 @@
 """Alerts WebSocket endpoint."""
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Set
+from collections import deque
+from typing import Dict, Optional
 import asyncio
-from app.ws.live import ConnectionManager
+import websockets
+from app.config import settings
+from app.ws.live import ClientChannel
 
 
-alert_manager = ConnectionManager()
+class AlertManager:
+    """Relays alerts from the detection service to alert subscribers.
+
+    One upstream connection is kept open for the life of the app (started at
+    startup, reconnecting on failure) and each alert is forwarded unchanged,
+    without touching the database; events are persisted separately.
+    """
+
+    def __init__(self):
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        self.recent: deque = deque(maxlen=settings.alert_replay_size)
+        self.relay_task: Optional[asyncio.Task] = None
+        self.connected = False
+
+    def start(self):
+        """Start the persistent upstream relay."""
+        if self.relay_task is None or self.relay_task.done():
+            self.relay_task = asyncio.create_task(self._relay_alerts())
+
+    async def stop(self):
+        """Stop the upstream relay."""
+        if self.relay_task:
+            self.relay_task.cancel()
+            try:
+                await self.relay_task
+            except asyncio.CancelledError:
+                pass
+            self.relay_task = None
+
+    async def connect(self, websocket: WebSocket) -> ClientChannel:
+        """Connect client and replay the most recent alerts."""
+        await websocket.accept()
+        channel = ClientChannel(websocket, binary=False, maxlen=settings.alert_client_queue_size)
+        channel.task = asyncio.create_task(channel.run())
+        self.channels[websocket] = channel
+        for message in self.recent:
+            channel.offer(message)
+        return channel
+
+    def disconnect(self, websocket: WebSocket):
+        """Disconnect client."""
+        channel = self.channels.pop(websocket, None)
+        if channel and channel.task:
+            channel.task.cancel()
+
+    async def _relay_alerts(self):
+        """Keep one connection to the detection service alert stream."""
+        detect_url = settings.detection_service_url.replace("http://", "ws://").replace("https://", "wss://")
+        url = f"{detect_url}/ws/alerts"
+
+        while True:
+            try:
+                async with websockets.connect(url, ping_interval=20, ping_timeout=10) as ws:
+                    self.connected = True
+                    async for message in ws:
+                        self._fan_out(message)
+            except asyncio.CancelledError:
+                raise
+            except websockets.exceptions.ConnectionClosed:
+                await asyncio.sleep(2)
+            except Exception as e:
+                print(f"Alert relay error: {e}, retrying in 2 seconds...")
+                await asyncio.sleep(2)
+            finally:
+                self.connected = False
+
+    def _fan_out(self, message):
+        """Forward an alert unchanged to every subscriber."""
+        self.recent.append(message)
+        closed = []
+        for websocket, channel in self.channels.items():
+            if channel.closed:
+                closed.append(websocket)
+            else:
+                channel.offer(message)
+        for websocket in closed:
+            self.disconnect(websocket)
+
+
+alert_manager = AlertManager()
 
 
 async def websocket_alerts(websocket: WebSocket):
     """Alerts WebSocket."""
-    await alert_manager.connect(websocket)
     try:
-        while True:
-            # Placeholder: relay alerts from detection service
-            await asyncio.sleep(1)
+        channel = await alert_manager.connect(websocket)
+        # Alerts are sent by the client's channel task; wait for disconnect and ping periodically
+        ping_interval = 30
+        while not channel.closed:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=ping_interval)
+            except asyncio.TimeoutError:
+                channel.offer_control({"type": "ping", "ts": asyncio.get_event_loop().time()})
+                continue
+            if message["type"] == "websocket.disconnect":
+                break
     except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
         alert_manager.disconnect(websocket)
-
@@ -0,0 +1,234 @@
+"""Compact binary encoding for detection frames (opt-in WebSocket protocol).
+
+Clients opt in with ``?proto=bin`` on the WebSocket URL. Data frames are then
+sent as binary messages; control messages (pings) stay JSON text.
+
+All integers are little-endian. Each message is::
+
+    header   <2sBBIIdf   magic b"VD", version, flags, frame_idx, base_idx, ts, fps
+    [dims]   <HH         width, height                (keyframes only)
+    strings  <H          count, then per entry <HB id, len + UTF-8 bytes
+    [removed]<H          count, then <I track ids      (deltas only)
+    boxes    <H          count, then per box <IHHHHHhhhh:
+                         id, cls, model, zone, event (string ids, 0xFFFF = none),
+                         conf * 65535, x1, y1, x2, y2 (whole pixels)
+
+A keyframe (flags bit 0) carries every box and the full string table, which
+replaces the client's table. A delta
+carries only the boxes that are new or changed since the keyframe
+``base_idx``, the ids of keyframe boxes that are gone, and strings added since
+that keyframe, so a client needs just the last keyframe and any one delta to
+rebuild a frame (dropped deltas are harmless). When the string table reaches
+MAX_STRINGS entries the encoder clears it and starts again with a keyframe.
+
+``backend/app/ws/codec.py`` and ``detection-service/detectsvc/wire.py`` are
+built into separate images and must stay identical; any change to the format
+bumps VERSION in both, and decoders reject other versions.
+"""
+from typing import Dict, List, Optional, Tuple
+import struct
+
+MAGIC = b"VD"
+VERSION = 2
+FLAG_KEYFRAME = 0x01
+NO_STRING = 0xFFFF
+MAX_STRINGS = NO_STRING  # Ids stay below the "none" sentinel
+
+_HEADER = struct.Struct("<2sBBIIdf")
+_DIMS = struct.Struct("<HH")
+_COUNT = struct.Struct("<H")
+_STRING = struct.Struct("<HB")
+_ID = struct.Struct("<I")
+_BOX = struct.Struct("<IHHHHHhhhh")
+
+
+def _clamp16(value: float) -> int:
+    """Round a coordinate to a whole pixel within int16 range."""
+    return max(-32768, min(32767, int(round(value))))
+
+
+class _TableFull(Exception):
+    """The string table has no free ids left."""
+
+
+def is_keyframe(message: bytes) -> bool:
+    """Check the keyframe flag of an encoded message without decoding it."""
+    return len(message) > 3 and bool(message[3] & FLAG_KEYFRAME)
+
+
+class FrameEncoder:
+    """Stateful encoder for one outgoing stream (keyframes + deltas)."""
+
+    def __init__(self, keyframe_interval: int = 30):
+        self.keyframe_interval = keyframe_interval
+        self.strings: Dict[str, int] = {}
+        self._new_strings: List[str] = []  # Added since the last keyframe
+        self._key_boxes: Dict[int, Tuple] = {}
+        self._key_idx = 0
+        self._since_key = 0
+        self._force_key = True
+
+    def request_keyframe(self):
+        """Make the next encoded frame a keyframe (e.g. a client just joined)."""
+        self._force_key = True
+
+    def _string_id(self, value: Optional[str]) -> int:
+        """Get (or assign) the string table id for a value."""
+        if value is None:
+            return NO_STRING
+        sid = self.strings.get(value)
+        if sid is None:
+            if len(self.strings) >= MAX_STRINGS:
+                raise _TableFull()
+            sid = len(self.strings)
+            self.strings[value] = sid
+            self._new_strings.append(value)
+        return sid
+
+    def encode(self, frame: Dict) -> bytes:
+        """Encode a detection frame dict (the JSON stream's shape)."""
+        try:
+            entries = [(box.get("id") or 0, self._record(box)) for box in frame.get("boxes", [])]
+        except _TableFull:
+            # Start a fresh table; the keyframe below tells clients to drop theirs
+            self.strings = {}
+            self._new_strings = []
+            self._key_boxes = {}
+            self._force_key = True
+            entries = [(box.get("id") or 0, self._record(box)) for box in frame.get("boxes", [])]
+        records = dict(entries)
+        # Untracked boxes (id 0) or duplicate ids cannot be diffed
+        diffable = len(records) == len(entries) and 0 not in records
+
+        changed = {tid: rec for tid, rec in records.items() if self._key_boxes.get(tid) != rec}
+        keyframe = (
+            self._force_key
+            or not diffable
+            or self._since_key >= self.keyframe_interval
+            or len(changed) * 2 > len(records)
+        )
+
+        frame_idx = int(frame.get("frame_idx", 0)) & 0xFFFFFFFF
+        parts = []
+        if keyframe:
+            self._force_key = False
+            self._since_key = 0
+            self._key_idx = frame_idx
+            self._key_boxes = records if diffable else {}
+            self._new_strings = []
+            parts.append(_HEADER.pack(MAGIC, VERSION, FLAG_KEYFRAME, frame_idx, frame_idx,
+                                      float(frame.get("ts", 0.0)), float(frame.get("fps", 0.0))))
+            parts.append(_DIMS.pack(int(frame.get("width") or 0), int(frame.get("height") or 0)))
+            parts.append(self._pack_strings(list(self.strings)))
+            boxes = entries
+        else:
+            self._since_key += 1
+            parts.append(_HEADER.pack(MAGIC, VERSION, 0, frame_idx, self._key_idx,
+                                      float(frame.get("ts", 0.0)), float(frame.get("fps", 0.0))))
+            parts.append(self._pack_strings(self._new_strings))
+            removed = [tid for tid in self._key_boxes if tid not in records]
+            parts.append(_COUNT.pack(len(removed)))
+            parts.extend(_ID.pack(tid) for tid in removed)
+            boxes = list(changed.items())
+
+        parts.append(_COUNT.pack(len(boxes)))
+        parts.extend(_BOX.pack(tid & 0xFFFFFFFF, *rec) for tid, rec in boxes)
+        return b"".join(parts)
+
+    def _record(self, box: Dict) -> Tuple:
+        """Quantize a box into its packed field tuple (without the id)."""
+        x1, y1, x2, y2 = box["xyxy"]
+        return (
+            self._string_id(box.get("cls")),
+            self._string_id(box.get("model")),
+            self._string_id(box.get("zone")),
+            self._string_id(box.get("event")),
+            max(0, min(65535, int(round(box.get("conf", 0.0) * 65535)))),
+            _clamp16(x1), _clamp16(y1), _clamp16(x2), _clamp16(y2)
+        )
+
+    def _pack_strings(self, values: List[str]) -> bytes:
+        """Pack string table entries."""
+        parts = [_COUNT.pack(len(values))]
+        for value in values:
+            data = value.encode("utf-8")[:255]
+            parts.append(_STRING.pack(self.strings[value], len(data)))
+            parts.append(data)
+        return b"".join(parts)
+
+
+class FrameDecoder:
+    """Reference decoder: rebuilds JSON-shaped frames from keyframes + deltas."""
+
+    def __init__(self):
+        self.strings: Dict[int, str] = {}
+        self._key_boxes: Dict[int, Dict] = {}
+        self._key_idx: Optional[int] = None
+        self._width = 0
+        self._height = 0
+
+    def decode(self, message: bytes) -> Optional[Dict]:
+        """Decode a message. Returns None for a delta whose keyframe was never seen."""
+        magic, version, flags, frame_idx, base_idx, ts, fps = _HEADER.unpack_from(message, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a detection frame")
+        if version != VERSION:
+            raise ValueError(f"Unsupported detection frame version {version} (expected {VERSION})")
+        offset = _HEADER.size
+        keyframe = bool(flags & FLAG_KEYFRAME)
+
+        if keyframe:
+            self.strings = {}
+            self._width, self._height = _DIMS.unpack_from(message, offset)
+            offset += _DIMS.size
+
+        (count,) = _COUNT.unpack_from(message, offset)
+        offset += _COUNT.size
+        for _ in range(count):
+            sid, length = _STRING.unpack_from(message, offset)
+            offset += _STRING.size
+            self.strings[sid] = message[offset:offset + length].decode("utf-8", errors="ignore")
+            offset += length
+
+        removed = set()
+        if not keyframe:
+            (count,) = _COUNT.unpack_from(message, offset)
+            offset += _COUNT.size
+            for _ in range(count):
+                removed.add(_ID.unpack_from(message, offset)[0])
+                offset += _ID.size
+
+        (count,) = _COUNT.unpack_from(message, offset)
+        offset += _COUNT.size
+        boxes = []
+        for _ in range(count):
+            tid, cls, model, zone, event, conf, x1, y1, x2, y2 = _BOX.unpack_from(message, offset)
+            offset += _BOX.size
+            boxes.append({
+                "id": tid,
+                "cls": self.strings.get(cls),
+                "conf": conf / 65535,
+                "xyxy": [x1, y1, x2, y2],
+                "model": self.strings.get(model) if model != NO_STRING else None,
+                "zone": self.strings.get(zone) if zone != NO_STRING else None,
+                "event": self.strings.get(event) if event != NO_STRING else None
+            })
+
+        if keyframe:
+            self._key_idx = frame_idx
+            self._key_boxes = {box["id"]: box for box in boxes}
+        else:
+            if base_idx != self._key_idx:
+                return None
+            merged = {tid: box for tid, box in self._key_boxes.items() if tid not in removed}
+            merged.update({box["id"]: box for box in boxes})
+            boxes = list(merged.values())
+
+        return {
+            "ts": ts,
+            "frame_idx": frame_idx,
+            "boxes": boxes,
+            "fps": fps,
+            "width": self._width,
+            "height": self._height
+        }
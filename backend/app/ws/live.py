@@ -1,61 +1,317 @@
 """Live WebSocket endpoint."""
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Set
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple, Union
 import json
 import asyncio
 import websockets
 from app.config import settings
+from app.ws.codec import FrameEncoder, is_keyframe
+
+
+Message = Union[str, bytes]
+
+
+class Subscription:
+    """Server-side filter requested by a client.
+
+    Sent as {"type": "subscribe", "classes": [...], "models": [...],
+    "zones": [...], "min_conf": 0.5, "max_fps": 5}; every field is optional.
+    """
+
+    def __init__(
+        self,
+        classes: Optional[List[str]] = None,
+        models: Optional[List[str]] = None,
+        zones: Optional[List[str]] = None,
+        min_conf: float = 0.0,
+        max_fps: Optional[float] = None
+    ):
+        self.classes = frozenset(classes) if classes else None
+        self.models = frozenset(models) if models else None
+        self.zones = frozenset(zones) if zones else None
+        self.min_conf = float(min_conf or 0.0)
+        self.max_fps = float(max_fps) if max_fps else None
+        if self.max_fps is not None and self.max_fps <= 0:
+            raise ValueError("max_fps must be positive")
+
+    @classmethod
+    def from_message(cls, message: dict) -> "Subscription":
+        """Build a subscription from a client message."""
+        def names(field):
+            value = message.get(field)
+            if value is None:
+                return None
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise ValueError(f"{field} must be a list of strings")
+            return value
+
+        return cls(
+            classes=names("classes"),
+            models=names("models"),
+            zones=names("zones"),
+            min_conf=message.get("min_conf", 0.0),
+            max_fps=message.get("max_fps")
+        )
+
+    @property
+    def key(self) -> Tuple:
+        """Canonical key; equal subscriptions share one filter/encode pass."""
+        def canon(values):
+            return tuple(sorted(values)) if values is not None else None
+        return (canon(self.classes), canon(self.models), canon(self.zones), self.min_conf, self.max_fps)
+
+    @property
+    def is_passthrough(self) -> bool:
+        """Whether the subscription filters nothing (raw relay)."""
+        return self.key == (None, None, None, 0.0, None)
+
+    def to_dict(self) -> dict:
+        """Serialize for the subscription acknowledgement."""
+        classes, models, zones, min_conf, max_fps = self.key
+        return {
+            "classes": list(classes) if classes else None,
+            "models": list(models) if models else None,
+            "zones": list(zones) if zones else None,
+            "min_conf": min_conf,
+            "max_fps": max_fps
+        }
+
+    def apply(self, frame: dict) -> dict:
+        """Return a copy of a frame with only the matching boxes."""
+        boxes = [
+            box for box in frame.get("boxes", [])
+            if (self.classes is None or box.get("cls") in self.classes)
+            and (self.models is None or box.get("model") in self.models)
+            and (self.zones is None or box.get("zone") in self.zones)
+            and box.get("conf", 0.0) >= self.min_conf
+        ]
+        return {**frame, "boxes": boxes}
+
+
+class ClientChannel:
+    """Per-client outbox with its own sender task.
+
+    Holds at most `maxlen` pending messages and drops the oldest, so a slow
+    client only ever receives the newest frames. For binary clients the
+    latest keyframe is kept apart from the queue so deltas stay decodable.
+    """
+
+    def __init__(self, websocket: WebSocket, binary: bool, maxlen: int = 1):
+        self.websocket = websocket
+        self.binary = binary
+        self.queue: deque = deque(maxlen=maxlen)
+        self.keyframe: Optional[bytes] = None
+        self.control: deque = deque()  # Pings and other small JSON messages, never dropped
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.group: Optional["SubscriptionGroup"] = None  # None = unfiltered passthrough
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, message: Message, keyframe: bool = False):
+        """Queue a message without blocking."""
+        if keyframe:
+            self.dropped += len(self.queue) + (1 if self.keyframe else 0)
+            self.queue.clear()
+            self.keyframe = message
+        else:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(message)
+        self.wakeup.set()
+
+    def offer_control(self, message: dict):
+        """Queue a control message (sent as JSON text)."""
+        self.control.append(json.dumps(message))
+        self.wakeup.set()
+
+    async def run(self):
+        """Send queued messages until the socket fails."""
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.control or self.keyframe or self.queue:
+                    if self.control:
+                        message = self.control.popleft()
+                    elif self.keyframe:
+                        message, self.keyframe = self.keyframe, None
+                    else:
+                        message = self.queue.popleft()
+                    if isinstance(message, bytes):
+                        await self.websocket.send_bytes(message)
+                    else:
+                        await self.websocket.send_text(message)
+                    self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.closed = True
+
+
+class SubscriptionGroup:
+    """Clients sharing one subscription and protocol; frames are filtered and encoded once."""
+
+    def __init__(self, subscription: Subscription, binary: bool):
+        self.subscription = subscription
+        self.binary = binary
+        self.channels: Set[ClientChannel] = set()
+        self.encoder = FrameEncoder() if binary else None
+        self.min_interval = 1.0 / subscription.max_fps if subscription.max_fps else 0.0
+        self.last_emit = 0.0
+
+    def add(self, channel: ClientChannel):
+        """Add a client to the group."""
+        self.channels.add(channel)
+        channel.group = self
+        if self.encoder:
+            # New binary clients need a keyframe to decode deltas
+            self.encoder.request_keyframe()
+
+    def discard(self, channel: ClientChannel):
+        """Remove a client from the group."""
+        self.channels.discard(channel)
+        if channel.group is self:
+            channel.group = None
+
+    def publish(self, frame: dict, now: float):
+        """Filter and encode a parsed frame once, then queue it for every member."""
+        if self.min_interval and now - self.last_emit < self.min_interval:
+            return
+        self.last_emit = now
+        filtered = self.subscription.apply(frame)
+        if self.encoder:
+            message = self.encoder.encode(filtered)
+            keyframe = is_keyframe(message)
+        else:
+            message = json.dumps(filtered, separators=(",", ":"))
+            keyframe = False
+        for channel in self.channels:
+            channel.offer(message, keyframe)
 
 
 class ConnectionManager:
-    """WebSocket connection manager."""
-    
+    """WebSocket connection manager.
+
+    Detection frames are relayed as raw text/binary messages: the manager
+    keeps one upstream connection to the detection service per protocol in
+    use and forwards each message unchanged to that protocol's clients.
+    Clients that subscribe with filters are grouped by subscription; the JSON
+    stream is parsed once per message and each group filters and encodes once.
+    """
+
     def __init__(self):
         self.active_connections: Set[WebSocket] = set()
-        self.detection_ws = None
-        self.relay_task = None
-    
-    async def connect(self, websocket: WebSocket):
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        self.upstreams: Dict[str, object] = {}  # proto -> detection service websocket
+        self.relay_tasks: Dict[str, asyncio.Task] = {}
+        self.groups: Dict[Tuple, SubscriptionGroup] = {}
+        self.last_keyframe: Optional[bytes] = None
+
+    async def connect(self, websocket: WebSocket, binary: bool = False) -> ClientChannel:
         """Connect client."""
         await websocket.accept()
         self.active_connections.add(websocket)
-        
-        # Start relay task if this is the first connection
-        if len(self.active_connections) == 1 and not self.relay_task:
-            self.relay_task = asyncio.create_task(self._relay_detections())
-    
+        channel = ClientChannel(websocket, binary, settings.live_client_queue_size)
+        channel.task = asyncio.create_task(channel.run())
+        self.channels[websocket] = channel
+
+        if binary and self.last_keyframe is not None:
+            # Let the client start decoding without waiting for the next keyframe
+            channel.offer(self.last_keyframe, keyframe=True)
+
+        self._update_relays()
+        return channel
+
     def disconnect(self, websocket: WebSocket):
         """Disconnect client."""
         self.active_connections.discard(websocket)
-        
-        # Stop relay if no connections
-        if len(self.active_connections) == 0 and self.relay_task:
-            self.relay_task.cancel()
-            self.relay_task = None
-            if self.detection_ws:
-                asyncio.create_task(self.detection_ws.close())
-                self.detection_ws = None
-    
-    async def _relay_detections(self):
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            self._leave_group(channel)
+            if channel.task:
+                channel.task.cancel()
+        self._update_relays()
+
+    def subscribe(self, websocket: WebSocket, subscription: Subscription):
+        """Apply a client's subscription (a passthrough subscription removes filtering)."""
+        channel = self.channels.get(websocket)
+        if channel is None:
+            return
+        self._leave_group(channel)
+        if not subscription.is_passthrough:
+            key = (subscription.key, channel.binary)
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = SubscriptionGroup(subscription, channel.binary)
+            group.add(channel)
+        elif channel.binary and self.last_keyframe is not None:
+            channel.offer(self.last_keyframe, keyframe=True)
+        self._update_relays()
+
+    def _leave_group(self, channel: ClientChannel):
+        """Remove a client from its subscription group, dropping empty groups."""
+        group = channel.group
+        if group is None:
+            return
+        group.discard(channel)
+        if not group.channels:
+            self.groups.pop((group.subscription.key, group.binary), None)
+
+    def _needed_protos(self) -> Set[str]:
+        """Upstream protocols required by the current clients.
+
+        Filtered clients of either protocol are served from the JSON stream.
+        """
+        protos = set()
+        if self.groups:
+            protos.add("json")
+        for channel in self.channels.values():
+            if channel.group is None:
+                protos.add("bin" if channel.binary else "json")
+        return protos
+
+    def _has_clients(self, proto: str) -> bool:
+        """Check if any client needs a protocol's upstream."""
+        return proto in self._needed_protos()
+
+    def _update_relays(self):
+        """Start relays for protocols that gained clients and stop unused ones."""
+        needed = self._needed_protos()
+        for proto in needed:
+            if proto not in self.relay_tasks:
+                self.relay_tasks[proto] = asyncio.create_task(self._relay_detections(proto))
+        for proto in list(self.relay_tasks):
+            if proto not in needed:
+                self.relay_tasks.pop(proto).cancel()
+                upstream = self.upstreams.pop(proto, None)
+                if upstream:
+                    asyncio.create_task(upstream.close())
+                if proto == "bin":
+                    self.last_keyframe = None
+
+    async def _relay_detections(self, proto: str):
         """Relay detections from detection service to clients."""
         detect_url = settings.detection_service_url.replace("http://", "ws://").replace("https://", "wss://")
-        
-        while len(self.active_connections) > 0:
+        url = f"{detect_url}/ws/detections" + ("?proto=bin" if proto == "bin" else "")
+
+        while self._has_clients(proto):
             try:
                 async with websockets.connect(
-                    f"{detect_url}/ws/detections",
+                    url,
                     ping_interval=20,
-                    ping_timeout=10
+                    ping_timeout=10,
+                    max_size=None
                 ) as ws:
-                    self.detection_ws = ws
+                    self.upstreams[proto] = ws
                     async for message in ws:
-                        try:
-                            data = json.loads(message)
-                            await self.broadcast(data)
-                        except json.JSONDecodeError:
-                            continue
-                        except Exception as e:
-                            print(f"Error broadcasting message: {e}")
+                        self._fan_out(message)
+            except asyncio.CancelledError:
+                raise
             except websockets.exceptions.ConnectionClosed:
                 # Connection closed, wait and retry
                 await asyncio.sleep(2)
@@ -63,53 +319,94 @@ class ConnectionManager:
                 print(f"WebSocket relay error: {e}, retrying in 2 seconds...")
                 await asyncio.sleep(2)
             finally:
-                self.detection_ws = None
-    
-    async def broadcast(self, message: dict):
-        """Broadcast to all connections."""
-        disconnected = set()
-        for connection in self.active_connections:
+                self.upstreams.pop(proto, None)
+
+    def _fan_out(self, message: Message):
+        """Forward an upstream message unchanged to every unfiltered client of its protocol.
+
+        JSON messages are parsed (once) only when filtered groups exist.
+        """
+        binary = isinstance(message, bytes)
+        keyframe = binary and is_keyframe(message)
+        if keyframe:
+            self.last_keyframe = message
+
+        closed = []
+        for websocket, channel in self.channels.items():
+            if channel.closed:
+                closed.append(websocket)
+            elif channel.group is None and channel.binary == binary:
+                channel.offer(message, keyframe)
+
+        if self.groups and not binary:
             try:
-                await connection.send_json(message)
-            except Exception:
-                disconnected.add(connection)
-        
-        for conn in disconnected:
-            self.disconnect(conn)
+                frame = json.loads(message)
+            except ValueError:
+                frame = None
+            if isinstance(frame, dict) and "boxes" in frame:
+                now = asyncio.get_event_loop().time()
+                for group in list(self.groups.values()):
+                    group.publish(frame, now)
+
+        for websocket in closed:
+            self.disconnect(websocket)
+
+    async def broadcast(self, message: dict):
+        """Broadcast a JSON message to all connections (serialized once)."""
+        text = json.dumps(message)
+        closed = []
+        for websocket, channel in self.channels.items():
+            if channel.closed:
+                closed.append(websocket)
+            else:
+                channel.offer(text)
+        for websocket in closed:
+            self.disconnect(websocket)
 
 
 manager = ConnectionManager()
 
 
+def handle_client_message(websocket: WebSocket, channel: ClientChannel, text: str):
+    """Handle a control message from a live client."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(data, dict) or data.get("type") != "subscribe":
+        return
+    try:
+        subscription = Subscription.from_message(data)
+    except (TypeError, ValueError) as e:
+        channel.offer_control({"type": "error", "detail": f"Invalid subscription: {e}"})
+        return
+    manager.subscribe(websocket, subscription)
+    channel.offer_control({"type": "subscribed", **subscription.to_dict()})
+
+
 async def websocket_live(websocket: WebSocket):
-    """Live detection stream WebSocket."""
+    """Live detection stream WebSocket (JSON by default, compact binary with ?proto=bin).
+
+    Clients may send {"type": "subscribe", ...} at any time to filter the stream.
+    """
     try:
-        await manager.connect(websocket)
-        # Keep connection alive - wait for disconnect
-        # The relay task will send messages to this connection
-        # We don't need to receive anything from the client
-        try:
-            ping_interval = 30  # Send ping every 30 seconds
-            last_ping = asyncio.get_event_loop().time()
-            
-            while True:
-                await asyncio.sleep(1)
-                
-                # Send ping periodically to keep connection alive
-                current_time = asyncio.get_event_loop().time()
-                if current_time - last_ping >= ping_interval:
-                    try:
-                        await websocket.send_json({"type": "ping", "ts": current_time})
-                        last_ping = current_time
-                    except Exception:
-                        # Connection closed
-                        break
-        except Exception:
-            pass
+        channel = await manager.connect(websocket, binary=websocket.query_params.get("proto") == "bin")
+        # Frames are sent by the client's channel task; here we only wait for
+        # disconnect and send a ping periodically to keep the connection alive
+        ping_interval = 30
+        while not channel.closed:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=ping_interval)
+            except asyncio.TimeoutError:
+                channel.offer_control({"type": "ping", "ts": asyncio.get_event_loop().time()})
+                continue
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text"):
+                handle_client_message(websocket, channel, message["text"])
     except WebSocketDisconnect:
         pass
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
         manager.disconnect(websocket)
-
@@ -0,0 +1,80 @@
+"""Round trips through the compact binary detection protocol."""
+import struct
+
+import pytest
+
+from app.ws import codec as wire
+from app.ws.codec import FrameDecoder, FrameEncoder, is_keyframe
+
+
+def _box(tid, cls="person", xyxy=(10, 20, 30, 40), conf=0.5, model="yolo", zone=None, event=None):
+    return {"id": tid, "cls": cls, "conf": conf, "xyxy": list(xyxy), "model": model, "zone": zone, "event": event}
+
+
+def _frame(idx, boxes):
+    return {"ts": 1000.0 + idx, "frame_idx": idx, "boxes": boxes, "fps": 25.0, "width": 640, "height": 480}
+
+
+def _by_id(frame):
+    return {box["id"]: box for box in frame["boxes"]}
+
+
+def test_keyframe_round_trip():
+    encoder, decoder = FrameEncoder(), FrameDecoder()
+    message = encoder.encode(_frame(1, [_box(1, zone="Gate", event="intrusion"), _box(2, cls="car", model=None)]))
+    assert is_keyframe(message)
+
+    frame = decoder.decode(message)
+    assert (frame["frame_idx"], frame["ts"], frame["width"], frame["height"]) == (1, 1001.0, 640, 480)
+    boxes = _by_id(frame)
+    assert boxes[1]["cls"] == "person" and boxes[1]["zone"] == "Gate" and boxes[1]["event"] == "intrusion"
+    assert boxes[1]["xyxy"] == [10, 20, 30, 40]
+    assert boxes[1]["conf"] == pytest.approx(0.5, abs=1 / 65535)
+    assert boxes[2]["cls"] == "car" and boxes[2]["model"] is None
+
+
+def test_delta_carries_changes_and_removals():
+    encoder, decoder = FrameEncoder(keyframe_interval=30), FrameDecoder()
+    decoder.decode(encoder.encode(_frame(1, [_box(i) for i in range(1, 5)])))
+
+    # One box moves and gains a new string, one disappears: a delta is enough
+    boxes = [_box(1, xyxy=(12, 20, 32, 40), zone="Yard"), _box(2), _box(3)]
+    message = encoder.encode(_frame(2, boxes))
+    assert not is_keyframe(message)
+
+    frame = _by_id(decoder.decode(message))
+    assert sorted(frame) == [1, 2, 3]
+    assert frame[1]["xyxy"] == [12, 20, 32, 40] and frame[1]["zone"] == "Yard"
+
+
+def test_delta_without_its_keyframe_is_skipped():
+    encoder = FrameEncoder()
+    encoder.encode(_frame(1, [_box(1), _box(2), _box(3)]))
+    delta = encoder.encode(_frame(2, [_box(1, xyxy=(11, 20, 31, 40)), _box(2), _box(3)]))
+    assert not is_keyframe(delta)
+    assert FrameDecoder().decode(delta) is None
+
+
+def test_untracked_boxes_force_keyframes():
+    encoder = FrameEncoder()
+    encoder.encode(_frame(1, [_box(0)]))
+    assert is_keyframe(encoder.encode(_frame(2, [_box(0)])))
+
+
+def test_full_string_table_restarts_with_a_keyframe(monkeypatch):
+    monkeypatch.setattr(wire, "MAX_STRINGS", 4)
+    encoder, decoder = FrameEncoder(), FrameDecoder()
+    decoder.decode(encoder.encode(_frame(1, [_box(1, cls="a", model="m"), _box(2, cls="b", model="m"), _box(3, cls="c", model="m")])))
+
+    # Two more strings don't fit: the table is cleared and the frame is a keyframe
+    message = encoder.encode(_frame(2, [_box(1, cls="d", model="m"), _box(2, cls="e", model="m"), _box(3, cls="c", model="m")]))
+    assert is_keyframe(message)
+    assert len(encoder.strings) <= 4
+    assert {box["cls"] for box in decoder.decode(message)["boxes"]} == {"d", "e", "c"}
+
+
+def test_other_versions_are_rejected():
+    message = bytearray(FrameEncoder().encode(_frame(1, [_box(1)])))
+    struct.pack_into("<B", message, 2, wire.VERSION + 1)
+    with pytest.raises(ValueError, match="Unsupported detection frame version"):
+        FrameDecoder().decode(bytes(message))
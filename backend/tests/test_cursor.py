@@ -0,0 +1,22 @@
+"""Keyset pagination cursors."""
+import pytest
+
+from app.db.repo import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("position", [(0.0, 1), (1718000000.123456, 42), (1e-3, 2**40)])
+def test_round_trip(position):
+    cursor = encode_cursor(*position)
+    assert decode_cursor(cursor) == position
+
+
+def test_cursor_is_url_safe_and_unpadded():
+    cursor = encode_cursor(1718000000.5, 123456789)
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "bnVsbA", encode_cursor(1.0, 2)[:-3] + "!!!"])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
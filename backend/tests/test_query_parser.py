@@ -0,0 +1,80 @@
+"""Chatbot question parsing."""
+from datetime import datetime
+
+import pytest
+
+from app.services.query_engine import parse_query, resolve_range
+
+ZONES = {"gate": "Gate", "parking lot": "Parking Lot", "a": "A"}
+CAMERAS = {"2": "cam2", "front": "front"}
+
+
+def plan(text):
+    return parse_query(text, ZONES, CAMERAS)
+
+
+def test_classes_zones_and_cameras():
+    result = plan("Show people and cars at the parking lot on camera front")
+    assert result.classes == ("car", "person")
+    assert result.zones == ("Parking Lot",)
+    assert result.cameras == ("front",)
+    assert result.aggregate is None
+
+
+def test_short_zone_names_need_the_word_zone():
+    assert plan("a car near the gate").zones == ("Gate",)
+    assert plan("cars in zone a").zones == ("A",)
+
+
+@pytest.mark.parametrize("text, time_spec", [
+    ("intrusions in the last 2 hours", ("last", 7200)),
+    ("past day", ("last", 86400)),
+    ("anything yesterday", ("yesterday",)),
+    ("events today", ("today",)),
+    ("between 10pm and 2am", ("clock", 22 * 3600, 2 * 3600, False)),
+    ("people at the gate", None)
+])
+def test_time_ranges(text, time_spec):
+    assert plan(text).time_spec == time_spec
+
+
+@pytest.mark.parametrize("text, min_conf", [
+    ("people above 80%", 0.8),
+    ("cars with conf > 0.8", 0.8),
+    ("confidence over 0.5", 0.5),
+    ("person above 0.9", 0.9),
+    ("confidence above 75", 0.75),
+    ("at least 1 person", None),
+    ("last 2 hours at least 3 cars", None),
+    ("cars over 5 between 10:30 and 11", None)
+])
+def test_confidence_needs_a_percent_keyword_or_fraction(text, min_conf):
+    result = plan(text).min_conf
+    if min_conf is None:
+        assert result is None
+    else:
+        assert result == pytest.approx(min_conf)
+
+
+@pytest.mark.parametrize("text, aggregate, group_by", [
+    ("how many intrusions today", "count", None),
+    ("number of cars per hour", "count", "hour"),
+    ("people by zone", "count", "zone"),
+    ("daily fire events", "count", "day"),
+    ("show tripwire crossings", None, None)
+])
+def test_aggregates(text, aggregate, group_by):
+    result = plan(text)
+    assert (result.aggregate, result.group_by) == (aggregate, group_by)
+
+
+def test_resolve_overnight_clock_range():
+    now = datetime(2024, 6, 12, 15, 0).timestamp()
+    t_start, t_end = resolve_range(("clock", 22 * 3600, 2 * 3600, True), now)
+    assert datetime.fromtimestamp(t_start) == datetime(2024, 6, 11, 22, 0)
+    assert datetime.fromtimestamp(t_end) == datetime(2024, 6, 12, 2, 0)
+
+
+def test_resolve_relative_range():
+    assert resolve_range(("last", 3600), 10000.0) == (6400.0, 10000.0)
+    assert resolve_range(None, 10000.0) == (None, None)
@@ -0,0 +1,31 @@
+"""Bucket size selection for /api/events/stats."""
+import pytest
+
+from app.db.repo import STATS_BUCKETS, RollupRepo
+
+
+@pytest.mark.parametrize("span, expected", [
+    (0, 60),  # Empty ranges still get the smallest bucket
+    (3600, 60),
+    (300 * 60, 60),
+    (300 * 60 + 1, 300),
+    (86400, 300),
+    (7 * 86400, 3600),
+    (30 * 86400, 3 * 3600),
+    (200 * 86400, 86400),
+    (365 * 86400, 7 * 86400)
+])
+def test_pick_bucket(span, expected):
+    assert RollupRepo.pick_bucket(1000.0, 1000.0 + span) == expected
+
+
+def test_pick_bucket_caps_at_the_largest_size():
+    assert RollupRepo.pick_bucket(0.0, 1e12) == STATS_BUCKETS[-1]
+
+
+def test_pick_bucket_respects_max_buckets():
+    for max_buckets in (10, 50, 300):
+        size = RollupRepo.pick_bucket(0.0, 30 * 86400, max_buckets)
+        assert 30 * 86400 / size <= max_buckets
+        smaller = [s for s in STATS_BUCKETS if s < size]
+        assert not smaller or 30 * 86400 / smaller[-1] > max_buckets
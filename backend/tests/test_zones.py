@@ -0,0 +1,24 @@
+"""Zone request validation."""
+import pytest
+from pydantic import ValidationError
+
+from app.routers.zones import ZoneRequest
+
+SQUARE = [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+
+@pytest.mark.parametrize("schedule", [
+    None,
+    "weekdays 18:00–07:00",
+    {"days": "weekdays", "start": "18:00", "end": "07:00"},
+    {"windows": ["sat,sun 00:00-24:00"]}
+])
+def test_valid_schedules_are_kept(schedule):
+    zone = ZoneRequest(name="yard", type="polygon", points=SQUARE, active_schedule=schedule)
+    assert zone.active_schedule == schedule
+
+
+@pytest.mark.parametrize("schedule", ["weekdays", "evenings", {"start": "7pm"}])
+def test_invalid_schedules_are_rejected(schedule):
+    with pytest.raises(ValidationError):
+        ZoneRequest(name="yard", type="polygon", points=SQUARE, active_schedule=schedule)
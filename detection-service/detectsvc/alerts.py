@@ -0,0 +1,172 @@
+"""Alert decisions with per (track, zone, type) cooldown and WebSocket fan-out."""
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+import uuid
+from fastapi import WebSocket
+from detectsvc.broadcast import ClientChannel
+from detectsvc.registry import FIRE_CLASSES
+
+# Zone result types that raise an alert
+ALERT_TYPES = {"intrusion", "tripwire", "loitering"}
+_FIRE_CLASSES = frozenset(FIRE_CLASSES)
+
+
+class AlertBus:
+    """Turns zone results into alerts and pushes them to subscribers right away.
+
+    An alert is suppressed while another one with the same dedup key
+    (track_id, zone_id, type) fired less than `cooldown_sec` ago, so an
+    intruder standing in a zone raises one alert rather than one per frame.
+    """
+
+    def __init__(self, cooldown_sec: float = 10.0, queue_size: int = 100):
+        self.cooldown_sec = cooldown_sec
+        self.queue_size = queue_size
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        self._last_fired: Dict[Tuple, float] = {}
+        self._last_prune = 0.0
+
+        # Metrics
+        self.emitted = 0
+        self.suppressed = 0
+
+    def add(self, websocket: WebSocket) -> ClientChannel:
+        """Register a subscriber and start its sender task."""
+        channel = ClientChannel(websocket, binary=False, maxlen=self.queue_size)
+        channel.task = asyncio.create_task(channel.run())
+        self.channels[websocket] = channel
+        return channel
+
+    def remove(self, websocket: WebSocket):
+        """Unregister a subscriber and stop its sender task."""
+        channel = self.channels.pop(websocket, None)
+        if channel and channel.task:
+            channel.task.cancel()
+
+    def reset(self):
+        """Forget cooldowns (e.g. a new stream started and track ids restart)."""
+        self._last_fired.clear()
+
+    def evaluate(
+        self,
+        detections: List,
+        zone_infos: List[Optional[Dict]],
+        timestamp: float,
+        camera_id: str = "default",
+        frame_idx: int = 0
+    ) -> List[Dict]:
+        """Decide alerts for one frame's detections and their zone results."""
+        alerts = []
+        for det, zone_info in zip(detections, zone_infos):
+            track_id = getattr(det, "track_id", None) or None
+            if zone_info and zone_info.get("type") in ALERT_TYPES:
+                alert = self._decide(det, track_id, zone_info, zone_info["type"], timestamp, camera_id, frame_idx)
+                if alert:
+                    alerts.append(alert)
+            if det.cls in _FIRE_CLASSES:
+                alert = self._decide(det, track_id, zone_info, "fire", timestamp, camera_id, frame_idx)
+                if alert:
+                    alerts.append(alert)
+
+        if timestamp - self._last_prune > self.cooldown_sec:
+            self._prune(timestamp)
+        return alerts
+
+    def _decide(
+        self,
+        det,
+        track_id: Optional[int],
+        zone_info: Optional[Dict],
+        alert_type: str,
+        timestamp: float,
+        camera_id: str,
+        frame_idx: int
+    ) -> Optional[Dict]:
+        """Build an alert unless its dedup key is cooling down."""
+        zone_id = zone_info.get("zone_id") if zone_info else None
+        key = (track_id, zone_id, alert_type)
+        last = self._last_fired.get(key)
+        if last is not None and timestamp - last < self.cooldown_sec:
+            self.suppressed += 1
+            return None
+        self._last_fired[key] = timestamp
+
+        alert = {
+            "type": "alert",
+            "alert_id": uuid.uuid4().hex,
+            "event_type": alert_type,
+            "camera_id": camera_id,
+            "zone_id": zone_id,
+            "zone": zone_info.get("zone_name") if zone_info else None,
+            "cls": det.cls,
+            "conf": det.conf,
+            "track_id": track_id,
+            "model": getattr(det, "model_name", None),
+            "bbox_xyxy": list(det.bbox),
+            "ts": timestamp,
+            "frame_idx": frame_idx,
+            "dedup_key": f"{track_id}:{zone_id}:{alert_type}"
+        }
+        if zone_info:
+            for field in ("direction", "dwell_sec"):
+                if field in zone_info:
+                    alert[field] = zone_info[field]
+        return alert
+
+    def _prune(self, now: float):
+        """Drop cooldown entries that have expired."""
+        self._last_prune = now
+        expired = [key for key, ts in self._last_fired.items() if now - ts >= self.cooldown_sec]
+        for key in expired:
+            del self._last_fired[key]
+
+    def publish(self, alert: Dict):
+        """Serialize an alert once and queue it for every subscriber (non-blocking)."""
+        self.emitted += 1
+        if not self.channels:
+            return
+        for websocket in [ws for ws, ch in self.channels.items() if ch.closed]:
+            self.remove(websocket)
+        text = json.dumps(alert, separators=(",", ":"))
+        for channel in self.channels.values():
+            channel.offer((alert["frame_idx"], alert["ts"], text))
+
+    def publish_snapshot(self, alert: Dict):
+        """Tell subscribers that an already published alert's snapshot is written."""
+        if not self.channels:
+            return
+        text = json.dumps(
+            {"type": "alert_snapshot", "alert_id": alert["alert_id"], "snapshot_path": alert["snapshot_path"]},
+            separators=(",", ":")
+        )
+        for channel in self.channels.values():
+            if not channel.closed:
+                channel.offer((alert["frame_idx"], alert["ts"], text))
+
+    def metrics(self) -> Dict:
+        """Alert counters and subscriber backlog."""
+        return {
+            "emitted": self.emitted,
+            "suppressed": self.suppressed,
+            "subscribers": len(self.channels),
+            "dropped": sum(ch.dropped for ch in self.channels.values())
+        }
+
+
+def alert_to_event(alert: Dict) -> Dict:
+    """Convert an alert into an event record for the backend."""
+    return {
+        "event_id": alert["alert_id"],
+        "camera_id": alert["camera_id"],
+        "model": alert.get("model") or "unknown",
+        "type": alert["event_type"],
+        "zone": alert.get("zone"),
+        "cls": alert["cls"],
+        "track_id": alert.get("track_id"),
+        "conf": alert["conf"],
+        "t_start": alert["ts"],
+        "snapshot_path": alert.get("snapshot_path"),
+        "video_ref": alert.get("video_ref"),
+        "bbox_xyxy": alert["bbox_xyxy"]
+    }
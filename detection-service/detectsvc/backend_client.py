@@ -0,0 +1,139 @@
+"""Backend HTTP client with batched event ingestion."""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+import httpx
+from detectsvc.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EventBatcher:
+    """Long-lived pooled client that ships events to the backend in batches.
+
+    Events are queued by the pipeline and flushed to ``/api/events/bulk`` by a
+    single background task whenever ``event_batch_size`` events are waiting or
+    ``event_flush_interval`` seconds have passed since the first queued event.
+    """
+
+    def __init__(self):
+        self.base_url = settings.backend_url
+        self.batch_size = settings.event_batch_size
+        self.flush_interval = settings.event_flush_interval
+        self.client: Optional[httpx.AsyncClient] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    async def start(self):
+        """Start the sender task (idempotent)."""
+        if self.task and not self.task.done():
+            return
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=4)
+            )
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=settings.event_queue_max)
+        self.task = asyncio.create_task(self._run())
+
+    def submit(self, event: Dict) -> bool:
+        """Queue an event without waiting. Returns False if it had to be dropped."""
+        if self.queue is None:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def put(self, event: Dict):
+        """Queue an event, waiting for room (backpressure for batch jobs)."""
+        await self.start()
+        await self.queue.put(event)
+
+    async def flush(self):
+        """Wait until every queued event has been sent (or given up on)."""
+        if self.queue is not None and self.task and not self.task.done():
+            await self.queue.join()
+
+    async def close(self):
+        """Flush pending events and close the connection pool."""
+        try:
+            await asyncio.wait_for(self.flush(), timeout=10.0)
+        except asyncio.TimeoutError:
+            logger.warning("Event batcher: timed out flushing pending events")
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    def stats(self) -> Dict[str, int]:
+        """Get sender counters."""
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped
+        }
+
+    async def _run(self):
+        """Collect events into batches and send them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                # Drain whatever is already waiting before sleeping
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._send(batch)
+            except Exception:
+                # A batch that can't be serialized won't succeed on retry: drop it, keep sending
+                logger.exception(f"Dropping {len(batch)} events that could not be sent to backend")
+                self.failed += len(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _send(self, batch: List[Dict]):
+        """POST a batch with a few retries."""
+        for attempt in range(3):
+            try:
+                response = await self.client.post("/api/events/bulk", json={"events": batch})
+                response.raise_for_status()
+                self.sent += len(batch)
+                return
+            except httpx.HTTPError as e:
+                if attempt == 2:
+                    logger.error(f"Failed to send {len(batch)} events to backend: {e}")
+                else:
+                    await asyncio.sleep(0.5 * (attempt + 1))
+        self.failed += len(batch)
+
+
+# Singleton instance
+event_batcher = EventBatcher()
@@ -0,0 +1,138 @@
+"""Serialize-once WebSocket fan-out with per-client bounded queues."""
+from collections import deque
+from typing import Dict, List, Optional
+import asyncio
+import json
+import time
+from fastapi import WebSocket
+from detectsvc.wire import FrameEncoder, is_keyframe
+
+
+class ClientChannel:
+    """One subscriber: a bounded queue of encoded frames and its own sender task.
+
+    When the queue is full the oldest frame is dropped (with ``maxlen=1`` the
+    client simply gets the latest frame). For binary clients the most recent
+    keyframe is held separately so deltas can always be decoded.
+    """
+
+    def __init__(self, websocket: WebSocket, binary: bool, maxlen: int):
+        self.websocket = websocket
+        self.binary = binary
+        self.queue: deque = deque(maxlen=maxlen)
+        self.keyframe: Optional[tuple] = None  # Pending keyframe (binary only)
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+
+        # Metrics
+        self.sent = 0
+        self.dropped = 0
+        self.last_sent_idx = 0
+        self.last_sent_ts = 0.0
+
+    def offer(self, item: tuple, keyframe: bool = False):
+        """Queue an encoded frame (frame_idx, ts, data) without blocking."""
+        if self.binary and keyframe:
+            # A new keyframe makes everything queued before it obsolete
+            self.dropped += len(self.queue) + (1 if self.keyframe else 0)
+            self.queue.clear()
+            self.keyframe = item
+        else:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(item)
+        self.wakeup.set()
+
+    async def run(self):
+        """Send queued frames until the socket fails."""
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.keyframe or self.queue:
+                    if self.keyframe:
+                        item, self.keyframe = self.keyframe, None
+                    else:
+                        item = self.queue.popleft()
+                    frame_idx, ts, data = item
+                    if self.binary:
+                        await self.websocket.send_bytes(data)
+                    else:
+                        await self.websocket.send_text(data)
+                    self.sent += 1
+                    self.last_sent_idx = frame_idx
+                    self.last_sent_ts = ts
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.closed = True
+
+
+class DetectionBroadcaster:
+    """Encodes each frame once per protocol and fans it out to client channels."""
+
+    def __init__(self, queue_size: int = 2, keyframe_interval: int = 30):
+        self.queue_size = queue_size
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        self.encoder = FrameEncoder(keyframe_interval)
+        self.latest_idx = 0
+        self.latest_ts = 0.0
+
+    @property
+    def has_clients(self) -> bool:
+        """Whether anyone is subscribed."""
+        return bool(self.channels)
+
+    def add(self, websocket: WebSocket, binary: bool = False) -> ClientChannel:
+        """Register a client and start its sender task."""
+        channel = ClientChannel(websocket, binary, self.queue_size)
+        channel.task = asyncio.create_task(channel.run())
+        self.channels[websocket] = channel
+        if binary:
+            # New binary clients need a keyframe to decode deltas
+            self.encoder.request_keyframe()
+        return channel
+
+    def remove(self, websocket: WebSocket):
+        """Unregister a client and stop its sender task."""
+        channel = self.channels.pop(websocket, None)
+        if channel and channel.task:
+            channel.task.cancel()
+
+    def publish(self, frame: Dict):
+        """Encode a frame once per protocol and queue it for every client."""
+        if not self.channels:
+            return
+        for websocket in [ws for ws, ch in self.channels.items() if ch.closed]:
+            self.remove(websocket)
+
+        self.latest_idx = frame.get("frame_idx", 0)
+        self.latest_ts = frame.get("ts", time.time())
+        text = payload = None
+        keyframe = False
+        for channel in self.channels.values():
+            if channel.binary:
+                if payload is None:
+                    payload = self.encoder.encode(frame)
+                    keyframe = is_keyframe(payload)
+                channel.offer((self.latest_idx, self.latest_ts, payload), keyframe)
+            else:
+                if text is None:
+                    text = json.dumps(frame, separators=(",", ":"))
+                channel.offer((self.latest_idx, self.latest_ts, text))
+
+    def metrics(self) -> List[Dict]:
+        """Per-client lag and drop counters."""
+        return [
+            {
+                "client": f"{ws.client.host}:{ws.client.port}" if ws.client else None,
+                "proto": "bin" if ch.binary else "json",
+                "queued": len(ch.queue) + (1 if ch.keyframe else 0),
+                "sent": ch.sent,
+                "dropped": ch.dropped,
+                "lag_frames": max(0, self.latest_idx - ch.last_sent_idx) if ch.sent else None,
+                "lag_sec": round(max(0.0, self.latest_ts - ch.last_sent_ts), 3) if ch.sent else None
+            }
+            for ws, ch in self.channels.items()
+        ]
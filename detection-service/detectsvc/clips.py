@@ -0,0 +1,279 @@
+"""Event clips: a pre-roll ring of encoded frames written out as MJPEG AVI when an event opens."""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+import asyncio
+import os
+import struct
+import threading
+import time
+import uuid
+import cv2
+import numpy as np
+
+# AVI header: RIFF + LIST hdrl (avih, LIST strl (strh, strf)) + LIST movi header
+_AVIH = struct.Struct("<IIIIIIIIII16x")
+_STRH = struct.Struct("<4s4sIHHIIIIIIiI4h")
+_STRF = struct.Struct("<IiiHH4sIiiII")
+_HEADER_SIZE = 12 + 12 + (8 + _AVIH.size) + 12 + (8 + _STRH.size) + (8 + _STRF.size) + 12
+_MOVI_OFFSET = _HEADER_SIZE - 4  # idx1 offsets are relative to the "movi" fourcc
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+
+
+class _AviWriter:
+    """Motion-JPEG AVI built from already-encoded JPEGs (frames are never re-encoded).
+
+    The header is reserved up front and filled in on close, once the frame
+    count, size and actual frame rate are known.
+    """
+
+    def __init__(self, path: Path):
+        self.file = open(path, "wb")
+        self.file.write(b"\0" * _HEADER_SIZE)
+        self.index: List[Tuple[int, int]] = []  # (offset from movi, size) per frame
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+        self.width = 0
+        self.height = 0
+
+    def write(self, jpeg: bytes, timestamp: float):
+        """Append one JPEG as a video chunk."""
+        if not self.index:
+            size = _jpeg_size(jpeg)
+            if size is None:
+                h, w = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape[:2]
+                size = (w, h)
+            self.width, self.height = size
+            self.first_ts = timestamp
+        self.last_ts = timestamp
+        self.index.append((self.file.tell() - _MOVI_OFFSET, len(jpeg)))
+        self.file.write(struct.pack("<4sI", b"00dc", len(jpeg)))
+        self.file.write(jpeg)
+        if len(jpeg) & 1:
+            self.file.write(b"\0")  # Chunks are word-aligned
+
+    def close(self, default_fps: float):
+        """Write the index and the real header."""
+        movi_end = self.file.tell()
+        index = b"".join(struct.pack("<4sIII", b"00dc", AVIIF_KEYFRAME, offset, size) for offset, size in self.index)
+        self.file.write(struct.pack("<4sI", b"idx1", len(index)))
+        self.file.write(index)
+        file_end = self.file.tell()
+
+        frames = len(self.index)
+        span = (self.last_ts or 0.0) - (self.first_ts or 0.0)
+        fps = (frames - 1) / span if frames > 1 and span > 0 else default_fps
+        rate = max(1, int(round(fps * 1000)))
+        largest = max((size for _, size in self.index), default=0)
+        w, h = self.width, self.height
+        avih = _AVIH.pack(int(1e6 * 1000 / rate), int(largest * fps), 0, AVIF_HASINDEX, frames, 0, 1, largest, w, h)
+        strh = _STRH.pack(b"vids", b"MJPG", 0, 0, 0, 0, 1000, rate, 0, frames, largest, -1, 0, 0, 0, w, h)
+        strf = _STRF.pack(_STRF.size, w, h, 1, 24, b"MJPG", w * h * 3, 0, 0, 0, 0)
+        strl = b"strl" + b"strh" + struct.pack("<I", len(strh)) + strh + b"strf" + struct.pack("<I", len(strf)) + strf
+        hdrl = b"hdrl" + b"avih" + struct.pack("<I", len(avih)) + avih + b"LIST" + struct.pack("<I", len(strl)) + strl
+        header = (
+            b"RIFF" + struct.pack("<I", file_end - 8) + b"AVI "
+            + b"LIST" + struct.pack("<I", len(hdrl)) + hdrl
+            + b"LIST" + struct.pack("<I", movi_end - _MOVI_OFFSET) + b"movi"
+        )
+        self.file.seek(0)
+        self.file.write(header)
+        self.file.close()
+
+
+def _jpeg_size(jpeg: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from a JPEG's start-of-frame marker."""
+    i = 2
+    while i + 9 < len(jpeg):
+        if jpeg[i] != 0xFF:
+            return None
+        marker = jpeg[i + 1]
+        length = struct.unpack_from(">H", jpeg, i + 2)[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack_from(">HH", jpeg, i + 5)
+            return width, height
+        i += 2 + length
+    return None
+
+
+class ClipRecorder:
+    """Keeps the last `preroll_sec` of frames as JPEGs and records clips around events.
+
+    Frames are sampled at `fps`, downscaled to `width` and JPEG-encoded once
+    on a worker thread; the ring is capped at `buffer_bytes`. When an event
+    opens, the pre-roll frames plus everything up to `postroll_sec` later are
+    written by a background writer into a Motion-JPEG AVI, reusing the encoded
+    JPEGs as-is. Events arriving while a clip is open extend it (up to
+    `max_sec`) and share its file.
+
+    MJPEG AVI plays in desktop players (VLC, mpv, Windows) and is served as
+    video/x-msvideo; browsers don't play it inline and download it instead.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        preroll_sec: float = 5.0,
+        postroll_sec: float = 10.0,
+        max_sec: float = 60.0,
+        fps: float = 5.0,
+        width: int = 640,
+        quality: int = 70,
+        buffer_bytes: int = 32 * 1024 * 1024
+    ):
+        self.root = root
+        self.preroll_sec = preroll_sec
+        self.postroll_sec = postroll_sec
+        self.max_sec = max_sec
+        self.min_interval = 1.0 / fps if fps > 0 else 0.0
+        self.width = width
+        self.quality = quality
+        self.buffer_bytes = buffer_bytes
+
+        self.ring: Deque[Tuple[float, bytes]] = deque()
+        self.ring_bytes = 0
+        self.encoding = False
+        self.last_sample = 0.0
+        self.active: Optional[Dict] = None  # Clip being recorded
+
+        # Encoding and file IO each get one thread; writes stay in order
+        self.encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-encode")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-write")
+        self.files: Dict[Path, _AviWriter] = {}  # Touched only on the writer thread
+        self.lock = threading.Lock()
+        self.pending_bytes = 0
+
+        # Metrics
+        self.clips = 0
+        self.frames_written = 0
+        self.dropped = 0
+
+    def url(self, clip_id: str) -> str:
+        """Public path of a clip (served by the backend's /storage mount)."""
+        return f"/storage/clips/{clip_id}.avi"
+
+    # Pipeline side (event loop)
+
+    def submit(self, frame: np.ndarray, timestamp: Optional[float] = None):
+        """Sample a decoded frame into the ring (non-blocking, rate-limited)."""
+        timestamp = timestamp or time.time()
+        if self.active and timestamp > self.active["end"]:
+            self._finish()
+        if self.encoding or timestamp - self.last_sample < self.min_interval:
+            return
+        self.encoding = True
+        self.last_sample = timestamp
+        future = asyncio.get_event_loop().run_in_executor(self.encoder, self._encode, frame)
+        future.add_done_callback(lambda f: self._encoded(f, timestamp))
+
+    def _encode(self, frame: np.ndarray) -> bytes:
+        """Resize and JPEG-encode a frame (runs on the encoder thread)."""
+        h, w = frame.shape[:2]
+        if self.width and w > self.width:
+            frame = cv2.resize(frame, (self.width, int(h * self.width / w)), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise RuntimeError("JPEG encode failed")
+        return buf.tobytes()
+
+    def _encoded(self, future: asyncio.Future, timestamp: float):
+        """Add a finished encode to the ring and the open clip."""
+        self.encoding = False
+        if future.cancelled() or future.exception() is not None:
+            if not future.cancelled():
+                print(f"Clip encode error: {future.exception()}")
+            return
+        jpeg = future.result()
+        self.ring.append((timestamp, jpeg))
+        self.ring_bytes += len(jpeg)
+        while self.ring and (
+            self.ring_bytes > self.buffer_bytes or self.ring[0][0] < timestamp - self.preroll_sec
+        ):
+            self.ring_bytes -= len(self.ring.popleft()[1])
+        if self.active and timestamp <= self.active["end"]:
+            self._append(jpeg, timestamp)
+
+    def trigger(self, timestamp: float, camera_id: str = "default") -> str:
+        """Open (or extend) a clip for an event at `timestamp`; returns its URL."""
+        if self.active and timestamp <= self.active["end"]:
+            self.active["end"] = min(timestamp + self.postroll_sec, self.active["start"] + self.max_sec)
+            return self.active["url"]
+        if self.active:
+            self._finish()
+
+        clip_id = f"{camera_id}_{int(timestamp)}_{uuid.uuid4().hex[:8]}"
+        path = self.root / f"{clip_id}.avi"
+        start = timestamp - self.preroll_sec
+        self.active = {
+            "url": self.url(clip_id),
+            "path": path,
+            "start": start,
+            "end": timestamp + self.postroll_sec
+        }
+        self.clips += 1
+        for ts, jpeg in self.ring:
+            if ts >= start:
+                self._append(jpeg, ts)
+        return self.active["url"]
+
+    def close(self):
+        """Finish the open clip (e.g. the stream stopped) and clear the pre-roll."""
+        if self.active:
+            self._finish()
+        self.ring.clear()
+        self.ring_bytes = 0
+
+    def _append(self, jpeg: bytes, timestamp: float):
+        """Queue a frame for the open clip, dropping it if the writer is far behind."""
+        with self.lock:
+            if self.pending_bytes > self.buffer_bytes:
+                self.dropped += 1
+                return
+            self.pending_bytes += len(jpeg)
+        self.writer.submit(self._write_frame, self.active["path"], jpeg, timestamp)
+
+    def _finish(self):
+        """Queue the open clip's finalization."""
+        self.writer.submit(self._finalize, self.active["path"])
+        self.active = None
+
+    # Writer thread
+
+    def _write_frame(self, path: Path, jpeg: bytes, timestamp: float):
+        """Append one JPEG to a clip's temp file."""
+        try:
+            avi = self.files.get(path)
+            if avi is None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                avi = self.files[path] = _AviWriter(path.with_name(path.name + ".part"))
+            avi.write(jpeg, timestamp)
+            self.frames_written += 1
+        except Exception as e:
+            print(f"Clip write error: {e}")
+        finally:
+            with self.lock:
+                self.pending_bytes -= len(jpeg)
+
+    def _finalize(self, path: Path):
+        """Close a clip's temp file and move it into place."""
+        avi = self.files.pop(path, None)
+        if avi is None:
+            return
+        try:
+            avi.close(1.0 / self.min_interval if self.min_interval else 5.0)
+            os.replace(path.with_name(path.name + ".part"), path)
+        except Exception as e:
+            print(f"Clip finalize error: {e}")
+
+    def metrics(self) -> Dict:
+        """Clip counters and pre-roll memory use."""
+        return {
+            "clips": self.clips,
+            "recording": self.active is not None,
+            "preroll_frames": len(self.ring),
+            "preroll_bytes": self.ring_bytes,
+            "frames_written": self.frames_written,
+            "dropped": self.dropped
+        }
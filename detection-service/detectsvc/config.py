@@ -33,9 +33,42 @@ class Settings(BaseSettings):
     raw_inference_mode: bool = True  # Skip tracking, zones, WebSocket for max speed
     cache_enabled_models: bool = True  # Cache model list to avoid registry lookups
     
+    # WebSocket streaming
+    ws_keyframe_interval: int = 30  # Binary protocol: full frame every N frames, deltas in between
+    ws_client_queue_size: int = 2  # Frames buffered per client before the oldest is dropped
+    
+    # Video preview (MJPEG)
+    preview_tiers: str = "low:320:50,medium:640:70,high:0:85"  # name:width:quality (width 0 = source)
+    preview_max_fps: float = 10.0  # Per-tier encode rate cap
+    preview_workers: int = 1  # JPEG encoder threads
+    
+    # Alerts
+    alert_cooldown_sec: float = 10.0  # Same (track, zone, type) alert is suppressed for this long
+    alert_queue_size: int = 100  # Alerts buffered per subscriber before the oldest is dropped
+    
     # Storage
     storage_root: str = "storage"  # Relative to project root, override in .env
-    snap_max_per_event: int = 10
+    snap_max_per_event: int = 10  # Snapshots written per tracked object and zone (live) or tracked object (file analysis)
+    snap_interval_frames: int = 30  # File analysis: frames between snapshots of the same tracked object
+    snap_workers: int = 1  # JPEG encoder threads
+    snap_queue_max: int = 4  # Pending encodes before new requests are dropped
+    snap_jpeg_quality: int = 90
+    
+    # Event clips (pre-roll ring of JPEGs, written as MJPEG .avi under storage/clips)
+    clip_enabled: bool = True
+    clip_preroll_sec: float = 5.0
+    clip_postroll_sec: float = 10.0
+    clip_max_sec: float = 60.0  # Overlapping events extend a clip up to this length
+    clip_fps: float = 5.0
+    clip_width: int = 640
+    clip_quality: int = 70
+    clip_buffer_mb: float = 32.0  # Pre-roll memory cap per camera
+    
+    # Backend event ingestion
+    backend_url: str = "http://localhost:8000"
+    event_batch_size: int = 200  # Flush when this many events are queued
+    event_flush_interval: float = 0.5  # ...or after this many seconds
+    event_queue_max: int = 10000  # Bounded queue between pipeline and sender
     
     @property
     def models_root_path(self) -> Path:
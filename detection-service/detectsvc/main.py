@@ -1,8 +1,10 @@
 """Detection service main FastAPI app."""
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Deque, Set, Tuple, Union
+from collections import deque
 import asyncio
 import time
 import json
@@ -15,6 +17,12 @@ from detectsvc.pipeline.capture import VideoCapture
 from detectsvc.pipeline.infer_onnx import InferencePipeline
 from detectsvc.pipeline.tracker import SimpleTracker
 from detectsvc.pipeline.zones import ZoneChecker
+from detectsvc.backend_client import event_batcher
+from detectsvc.broadcast import DetectionBroadcaster
+from detectsvc.alerts import AlertBus, alert_to_event
+from detectsvc.preview import PreviewHub, parse_tiers, MJPEG_BOUNDARY
+from detectsvc.snapshots import SnapshotWriter
+from detectsvc.clips import ClipRecorder
 
 
 app = FastAPI(
@@ -38,10 +46,41 @@ capture = None
 is_running = False
 frame_count = 0
 start_time = None
+camera_id = "default"
+
+# Video analysis jobs still running (job_id -> input file)
+analysis_jobs: Dict[str, str] = {}
+
+# Snapshot cap keys issued per live track (forgotten once the track ends)
+alert_snap_keys: Dict[int, Set[str]] = {}
 
 # WebSocket connections
-ws_connections: List[WebSocket] = []
-alert_connections: List[WebSocket] = []
+broadcaster = DetectionBroadcaster(settings.ws_client_queue_size, settings.ws_keyframe_interval)
+alert_bus = AlertBus(settings.alert_cooldown_sec, settings.alert_queue_size)
+
+# Video preview (reuses the frames the pipeline already decoded)
+preview_hub = PreviewHub(parse_tiers(settings.preview_tiers), settings.preview_max_fps, settings.preview_workers)
+
+# Event snapshots (encoded off the loop, capped per event)
+snapshot_writer = SnapshotWriter(
+    settings.storage_root_path / "snaps",
+    settings.snap_workers,
+    settings.snap_queue_max,
+    settings.snap_max_per_event,
+    settings.snap_jpeg_quality
+)
+
+# Event clips from a pre-roll ring of encoded frames
+clip_recorder = ClipRecorder(
+    settings.storage_root_path / "clips",
+    settings.clip_preroll_sec,
+    settings.clip_postroll_sec,
+    settings.clip_max_sec,
+    settings.clip_fps,
+    settings.clip_width,
+    settings.clip_quality,
+    int(settings.clip_buffer_mb * 1024 * 1024)
+)
 
 
 # Auto-register models on startup
@@ -63,6 +102,16 @@ async def startup():
     # Don't load models on startup - they'll be loaded when detection starts
     # This prevents loading all models when only some are enabled
     print("Models registered. They will be loaded when detection starts.")
+    
+    # Long-lived batching client for event ingestion
+    await event_batcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Flush pending events and finish any open clip on shutdown."""
+    await event_batcher.close()
+    clip_recorder.close()
 
 
 class StartRequest(BaseModel):
@@ -79,15 +128,17 @@ class ZoneConfig(BaseModel):
     name: str
     type: str
     points: List[List[float]]
+    direction: Optional[str] = None  # AtoB, BtoA (tripwires only)
     allowed_classes: List[str] = []
     min_size_px: int = 0
     dwell_sec: float = 0.0
+    active_schedule: Optional[Union[Dict, str]] = None  # e.g. "weekdays 18:00-07:00" or {"days": "weekdays", "start": "18:00", "end": "07:00"}
 
 
 @app.post("/detector/start")
 async def start_detection(request: StartRequest):
     """Start detection stream."""
-    global capture, is_running, zone_checker, frame_count, start_time
+    global capture, is_running, zone_checker, frame_count, start_time, camera_id
     
     try:
         if is_running:
@@ -161,6 +212,12 @@ async def start_detection(request: StartRequest):
         
         # Initialize zone checker with zones from request
         zone_checker = ZoneChecker(request.zones)
+        camera_id = request.source.get("camera_id", "default")
+        alert_bus.reset()
+        for keys in alert_snap_keys.values():
+            snapshot_writer.forget(keys)
+        alert_snap_keys.clear()
+        clip_recorder.close()
         
         is_running = True
         frame_count = 0
@@ -188,6 +245,7 @@ async def stop_detection():
     if capture:
         capture.release()
         capture = None
+    clip_recorder.close()
     
     return {"status": "stopped"}
 
@@ -214,7 +272,12 @@ async def get_status():
         "running": is_running,
         "fps": fps,
         "models": [m["name"] for m in registry.get_enabled_models()],
-        "temp_c": temp_c
+        "temp_c": temp_c,
+        "ws_clients": broadcaster.metrics(),
+        "alerts": alert_bus.metrics(),
+        "preview": preview_hub.metrics(),
+        "snapshots": snapshot_writer.metrics(),
+        "clips": clip_recorder.metrics()
     }
 
 
@@ -255,13 +318,24 @@ async def detection_loop():
             if settings.frame_skip > 1 and frame_count % settings.frame_skip != 0:
                 continue
             
+            # Preview encodes run on a worker thread, only for watched tiers
+            if preview_hub.has_viewers:
+                preview_hub.submit(frame, frame_count)
+            
+            # Pre-roll for event clips (sampled and encoded off the loop)
+            if settings.clip_enabled:
+                clip_recorder.submit(frame)
+            
             # PURE INFERENCE MODE - Skip all non-essential processing for max speed
             if settings.raw_inference_mode:
                 # Only run inference - skip tracking, zones, but keep lightweight WebSocket
                 detections = inference_pipeline.infer_frame_fast(frame, cached_enabled_models)
                 
+                # Fire/smoke alerts still apply without tracking or zones
+                emit_alerts(alert_bus.evaluate(detections, [None] * len(detections), time.time(), camera_id, frame_count), frame)
+                
                 # Lightweight WebSocket broadcast (minimal overhead)
-                if ws_connections:  # Only if there are connections
+                if broadcaster.has_clients:  # Only if there are connections
                     frame_h, frame_w = frame.shape[:2]
                     frame_data = {
                         "ts": time.time(),
@@ -277,8 +351,8 @@ async def detection_loop():
                         "width": frame_w,
                         "height": frame_h
                     }
-                    # Fire-and-forget broadcast (non-blocking)
-                    asyncio.create_task(broadcast_detections(frame_data))
+                    # Encode once and queue per client (non-blocking)
+                    broadcaster.publish(frame_data)
                 
                 # Performance logging (very minimal)
                 if loop_count % 500 == 0:  # Every 500 frames
@@ -296,6 +370,7 @@ async def detection_loop():
                 
                 # Track objects
                 tracked = tracker.update(detections, timestamp)
+                _forget_ended_tracks()
                 
                 # Check zones
                 frame_h, frame_w = frame.shape[:2]
@@ -308,9 +383,12 @@ async def detection_loop():
                     "height": frame_h
                 }
                 
-                for det in tracked:
-                    zone_info = zone_checker.check_detection(det) if zone_checker else None
-                    
+                zone_infos = zone_checker.check_detections(tracked, tracker.tracks, timestamp) if zone_checker else [None] * len(tracked)
+                
+                # Alerts go out before the frame broadcast, as soon as they are decided
+                emit_alerts(alert_bus.evaluate(tracked, zone_infos, timestamp, camera_id, frame_count), frame)
+                
+                for det, zone_info in zip(tracked, zone_infos):
                     box_data = {
                         "id": getattr(det, 'track_id', 0),
                         "cls": det.cls,
@@ -327,8 +405,8 @@ async def detection_loop():
                     elapsed = timestamp - start_time
                     frame_data["fps"] = frame_count / elapsed if elapsed > 0 else 0.0
                 
-                # Broadcast to WebSocket (fire-and-forget)
-                asyncio.create_task(broadcast_detections(frame_data))
+                # Broadcast to WebSocket (encode once, queue per client)
+                broadcaster.publish(frame_data)
                 
                 # Minimal sleep
                 await asyncio.sleep(settings.min_sleep_time)
@@ -340,41 +418,101 @@ async def detection_loop():
             continue
 
 
-async def broadcast_detections(data: dict):
-    """Broadcast to WebSocket connections."""
-    disconnected = []
-    for ws in ws_connections:
-        try:
-            await ws.send_json(data)
-        except Exception:
-            disconnected.append(ws)
+@app.get("/detector/preview.mjpg")
+async def preview_stream(tier: str = "medium"):
+    """MJPEG preview of the live stream at a size/quality tier."""
+    if tier not in preview_hub.tiers:
+        raise HTTPException(status_code=404, detail=f"Unknown preview tier: {tier}")
+    return StreamingResponse(
+        preview_hub.stream(tier),
+        media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+def emit_alerts(alerts: List[Dict], frame=None):
+    """Push alerts to subscribers and queue them as events (all non-blocking).
     
-    for ws in disconnected:
-        ws_connections.remove(ws)
+    Alerts from the same frame share one snapshot and one clip. Alerts are
+    published right away without a snapshot_path; once the snapshot is
+    written an "alert_snapshot" update follows and the events are queued,
+    so snapshot_path only ever names a file that exists.
+    """
+    if not alerts:
+        return
+    snapshot = None
+    if frame is not None:
+        snapshot = snapshot_writer.request(
+            frame, f"{alerts[0]['alert_id']}.jpg", [_snap_key(alert) for alert in alerts]
+        )
+        video_ref = clip_recorder.trigger(alerts[0]["ts"], camera_id) if settings.clip_enabled else None
+        for alert in alerts:
+            alert["video_ref"] = video_ref
+    for alert in alerts:
+        alert["snapshot_path"] = None
+        alert_bus.publish(alert)
+    if snapshot is None:
+        _queue_alert_events(alerts, None)
+    else:
+        snapshot.add_done_callback(lambda task: _queue_alert_events(alerts, None if task.cancelled() else task.result()))
+
+
+def _snap_key(alert: Dict) -> str:
+    """Snapshot cap key of an alert: its camera, track and zone (the alert itself when untracked)."""
+    track_id = alert.get("track_id")
+    if track_id is None:
+        return alert["alert_id"]
+    key = f"{alert['camera_id']}:{track_id}:{alert.get('zone_id')}"
+    alert_snap_keys.setdefault(track_id, set()).add(key)
+    return key
+
+
+def _forget_ended_tracks():
+    """Drop snapshot cap keys of live tracks the tracker no longer follows."""
+    for track_id in [tid for tid in alert_snap_keys if tid not in tracker.tracks]:
+        snapshot_writer.forget(alert_snap_keys.pop(track_id))
+
+
+def _queue_alert_events(alerts: List[Dict], snapshot_path: Optional[str]):
+    """Announce the alerts' snapshot (if any) and queue their events."""
+    for alert in alerts:
+        alert["snapshot_path"] = snapshot_path
+        if snapshot_path:
+            alert_bus.publish_snapshot(alert)
+        event_batcher.submit(alert_to_event(alert))
 
 
 @app.websocket("/ws/detections")
 async def websocket_detections(websocket: WebSocket):
-    """Detection stream WebSocket."""
+    """Detection stream WebSocket (JSON by default, compact binary with ?proto=bin)."""
     await websocket.accept()
-    ws_connections.append(websocket)
+    broadcaster.add(websocket, binary=websocket.query_params.get("proto") == "bin")
     try:
+        # Frames are sent by the client's channel task; just wait for disconnect
         while True:
-            await asyncio.sleep(1)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
     except WebSocketDisconnect:
-        ws_connections.remove(websocket)
+        pass
+    finally:
+        broadcaster.remove(websocket)
 
 
 @app.websocket("/ws/alerts")
 async def websocket_alerts(websocket: WebSocket):
-    """Alerts WebSocket."""
+    """Alerts WebSocket (one JSON message per alert)."""
     await websocket.accept()
-    alert_connections.append(websocket)
+    alert_bus.add(websocket)
     try:
         while True:
-            await asyncio.sleep(1)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
     except WebSocketDisconnect:
-        alert_connections.remove(websocket)
+        pass
+    finally:
+        alert_bus.remove(websocket)
 
 
 class AnalyzeFileRequest(BaseModel):
@@ -424,11 +562,28 @@ async def analyze_file(request: AnalyzeFileRequest):
     
     # Process video file
     job_id = str(uuid.uuid4())
-    asyncio.create_task(process_video_file(file_path, enabled_models, zones, job_id))
+    analysis_jobs[job_id] = file_path
+    task = asyncio.create_task(process_video_file(file_path, enabled_models, zones, job_id))
+    task.add_done_callback(lambda _: analysis_jobs.pop(job_id, None))
     
     return {"job_id": job_id, "status": "processing", "message": "Video analysis started"}
 
 
+@app.get("/detector/jobs")
+async def list_jobs():
+    """Video analysis jobs still running (the backend keeps their input files)."""
+    return {"jobs": [{"job_id": job_id, "file_path": path} for job_id, path in analysis_jobs.items()]}
+
+
+def _storage_url(file_path: str) -> Optional[str]:
+    """/storage URL of a file under the storage root (None if it is elsewhere)."""
+    try:
+        relative = Path(file_path).resolve().relative_to(settings.storage_root_path)
+    except ValueError:
+        return None
+    return "/storage/" + relative.as_posix()
+
+
 async def process_video_file(
     file_path: str,
     enabled_models: List[Dict],
@@ -436,14 +591,34 @@ async def process_video_file(
     job_id: str
 ):
     """Process video file asynchronously."""
-    import httpx
-    
     capture = VideoCapture(file_path)
     capture.open()
+    source_url = _storage_url(file_path)
+    video_fps = capture.get_fps() or 30.0
     
     frame_count = 0
     events = []
-    backend_url = "http://localhost:8000"
+    # Frames' events in order, each waiting on its snapshot (or None when none was taken)
+    pending: Deque[Tuple[Optional[asyncio.Future], List[Dict]]] = deque()
+    last_snap: Dict[str, int] = {}  # Track key -> frame of its last snapshot request
+    latest_snap: Dict[str, str] = {}  # Track key -> URL of its last written snapshot
+    
+    async def deliver(wait: bool):
+        """Send events whose snapshots are written (all of them when `wait`)."""
+        while pending and (wait or pending[0][0] is None or pending[0][0].done()):
+            snapshot, frame_events = pending.popleft()
+            snapshot_path = await snapshot if snapshot is not None else None
+            for event_data in frame_events:
+                key = event_data["snap_key"]
+                if snapshot_path:
+                    latest_snap[key] = snapshot_path
+                # Between snapshots an object's events point at its latest one
+                event_data["snapshot_path"] = snapshot_path or latest_snap.get(key)
+                del event_data["snap_key"]
+                events.append(event_data)
+                
+                # Queue event for batched delivery to backend (waits if the queue is full)
+                await event_batcher.put(event_data)
     
     try:
         while True:
@@ -461,9 +636,11 @@ async def process_video_file(
             tracked = tracker.update(detections, timestamp)
             
             # Check zones and generate events (create events for all detections, not just zone intrusions)
-            for det in tracked:
-                zone_info = zone_checker.check_detection(det) if zone_checker else None
-                
+            # Dwell timers run on video time so loitering matches the recording, not processing speed
+            video_ts = frame_count / video_fps
+            zone_infos = zone_checker.check_detections(tracked, tracker.tracks, video_ts) if zone_checker else [None] * len(tracked)
+            frame_events = []
+            for det, zone_info in zip(tracked, zone_infos):
                 event_data = {
                     "event_id": f"{job_id}_{frame_count}_{det.track_id if hasattr(det, 'track_id') else frame_count}",
                     "camera_id": "file",
@@ -476,33 +653,35 @@ async def process_video_file(
                     "t_start": timestamp,
                     "bbox_xyxy": list(det.bbox)
                 }
-                events.append(event_data)
-                
-                # Send event to backend
-                try:
-                    async with httpx.AsyncClient() as client:
-                        await client.post(
-                            f"{backend_url}/api/events/create",
-                            json=event_data,
-                            timeout=5.0
-                        )
-                except Exception as e:
-                    print(f"Failed to send event to backend: {e}")
+                if source_url:
+                    # The recording itself is the evidence; point at the moment in it
+                    event_data["video_ref"] = f"{source_url}#t={video_ts:.2f}"
+                frame_events.append(event_data)
             
-            # Save snapshot periodically
-            if events and frame_count % 30 == 0:
-                try:
-                    import cv2
-                    snap_dir = settings.storage_root_path / "snaps"
-                    snap_dir.mkdir(parents=True, exist_ok=True)
-                    snap_path = snap_dir / f"{job_id}_frame_{frame_count}.jpg"
-                    cv2.imwrite(str(snap_path), frame)
-                except Exception as e:
-                    print(f"Failed to save snapshot: {e}")
-    
+            # A snapshot when some object hasn't had one for snap_interval_frames
+            # (and is under snap_max_per_event); the frame's events wait for it
+            snapshot = None
+            if frame_events:
+                for event_data in frame_events:
+                    event_data["snap_key"] = (
+                        f"{job_id}:{event_data['track_id']}" if event_data["track_id"] is not None else event_data["event_id"]
+                    )
+                due = [
+                    e["snap_key"] for e in frame_events
+                    if frame_count - last_snap.get(e["snap_key"], -settings.snap_interval_frames) >= settings.snap_interval_frames
+                ]
+                if due:
+                    snapshot = snapshot_writer.request(frame, f"{job_id}_frame_{frame_count}.jpg", due)
+                    if snapshot is not None:
+                        last_snap.update((key, frame_count) for key in due)
+                pending.append((snapshot, frame_events))
+            await deliver(wait=False)
+        
+        await deliver(wait=True)
     finally:
         capture.release()
     
+    await event_batcher.flush()
     print(f"Video processing complete: {len(events)} events found")
     return {"job_id": job_id, "events": len(events)}
 
@@ -518,18 +697,11 @@ async def take_snapshot():
     if frame is None:
         return {"error": "Failed to capture frame"}
     
-    # Save snapshot
-    import cv2
-    from pathlib import Path
-    snap_dir = settings.storage_root_path / "snaps"
-    snap_dir.mkdir(parents=True, exist_ok=True)
-    
+    # Encoded and written on the snapshot pool
     filename = f"snap_{int(time.time())}.jpg"
-    file_path = snap_dir / filename
-    
-    cv2.imwrite(str(file_path), frame)
+    file_path = await snapshot_writer.save(frame, filename)
     
-    return {"path": str(file_path)}
+    return {"path": str(file_path), "url": snapshot_writer.url(filename)}
 
 
 @app.get("/detector/models")
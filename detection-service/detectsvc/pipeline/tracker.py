@@ -1,9 +1,35 @@
 """Object tracking (simplified ByteTrack)."""
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from detectsvc.accel.base import Detection
+import numpy as np
 import time
 
 
+class Trajectory:
+    """Fixed-size ring buffer of recent track positions (bbox centers)."""
+    __slots__ = ("points", "times", "head", "count")
+    
+    def __init__(self, capacity: int = 16):
+        self.points = np.zeros((capacity, 2), dtype=np.float32)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.head = 0  # Next write slot
+        self.count = 0
+    
+    def append(self, bbox: Tuple[float, float, float, float], timestamp: float):
+        """Record the center of a bbox."""
+        x1, y1, x2, y2 = bbox
+        self.points[self.head] = ((x1 + x2) / 2, (y1 + y2) / 2)
+        self.times[self.head] = timestamp
+        self.head = (self.head + 1) % len(self.points)
+        self.count = min(self.count + 1, len(self.points))
+    
+    def last(self, back: int = 0) -> Optional[np.ndarray]:
+        """Get the position `back` steps before the most recent one."""
+        if back >= self.count:
+            return None
+        return self.points[(self.head - 1 - back) % len(self.points)]
+
+
 class Track:
     """Track object."""
     def __init__(self, track_id: int, detection: Detection, timestamp: float):
@@ -13,6 +39,9 @@ class Track:
         self.last_seen = timestamp
         self.hits = 1
         self.age = 0
+        self.misses = 0  # Consecutive frames without a match
+        self.trajectory = Trajectory()
+        self.trajectory.append(detection.bbox, timestamp)
     
     def update(self, detection: Detection, timestamp: float):
         """Update track."""
@@ -20,6 +49,8 @@ class Track:
         self.last_seen = timestamp
         self.hits += 1
         self.age += 1
+        self.misses = 0
+        self.trajectory.append(detection.bbox, timestamp)
 
 
 class SimpleTracker:
@@ -40,6 +71,7 @@ class SimpleTracker:
         # In production, use ByteTrack or OCSort
         
         updated_detections = []
+        matched = set()
         
         for det in detections:
             # Find best matching track
@@ -55,6 +87,7 @@ class SimpleTracker:
             if best_track:
                 best_track.update(det, timestamp)
                 det.track_id = best_track.track_id
+                matched.add(best_track.track_id)
             else:
                 # New track
                 track_id = self.next_id
@@ -62,6 +95,7 @@ class SimpleTracker:
                 track = Track(track_id, det, timestamp)
                 self.tracks[track_id] = track
                 det.track_id = track_id
+                matched.add(track_id)
             
             updated_detections.append(det)
         
@@ -69,8 +103,9 @@ class SimpleTracker:
         to_remove = []
         for track_id, track in self.tracks.items():
             # Remove tracks that haven't been seen for max_age frames
-            # Simple check: if track age is too high
-            if track.age > self.max_age * 2:  # Give tracks more time
+            if track_id not in matched:
+                track.misses += 1
+            if track.misses > self.max_age * 2:  # Give tracks more time
                 to_remove.append(track_id)
         
         for track_id in to_remove:
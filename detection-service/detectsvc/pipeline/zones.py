@@ -1,7 +1,10 @@
 """Zone detection (point-in-polygon, tripwire)."""
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Set, Tuple
 from detectsvc.accel.base import Detection
 import numpy as np
+import heapq
+import time
+from detectsvc.pipeline.schedule import Schedule, compile_schedule, week_seconds
 
 
 def point_in_polygon(point: Tuple[float, float], polygon: List[List[float]]) -> bool:
@@ -31,87 +34,363 @@ def bbox_center(bbox: Tuple[float, float, float, float]) -> Tuple[float, float]:
     return ((x1 + x2) / 2, (y1 + y2) / 2)
 
 
+# Tripwire side convention: side A is where cross(p2 - p1, point - p1) > 0,
+# i.e. the left-hand side when looking from the first point to the second
+# in image coordinates. "AtoB" fires when a track moves from side A to side B.
+TRIPWIRE_DIRECTIONS = {"AtoB": 1, "BtoA": 2}
+
+# A track must move this far from the line before the same tripwire can fire again
+TRIPWIRE_REARM_PX = 8.0
+
+# A track may vanish from a loitering zone this long (detection dropout) without resetting its dwell timer
+DWELL_GRACE_SEC = 2.0
+
+# Re-evaluate schedules at least this often (covers DST changes)
+SCHEDULE_MAX_REFRESH_SEC = 3600.0
+
+
 class ZoneChecker:
-    """Zone intrusion checker."""
+    """Zone intrusion checker.
+    
+    Zones are compiled once into NumPy arrays (bounding boxes, polygon edges,
+    tripwire segments) so all detections of a frame can be tested against all
+    zones in a single vectorized call.
+    
+    Tripwires are stateful: they fire once when a track's movement between
+    two consecutive positions intersects the wire, in the configured
+    direction, and re-arm only after the track has left the line.
+    
+    Polygons with `dwell_sec > 0` are loitering zones: each (track, zone)
+    pair gets an entry time and a deadline on a min-heap, and a single
+    "loitering" result is emitted when the deadline passes while the track
+    is still inside. Detections smaller than a zone's `min_size_px` (longest
+    bbox side) are ignored for that zone before any geometry is tested.
+    
+    Zones with an `active_schedule` are only compiled into the engine while
+    their schedule is on. The active set is rebuilt at the next schedule
+    boundary (wall clock), never per frame.
+    """
     
     def __init__(self, zones: List[Dict]):
         self.zones = zones
+        self._schedules = []
+        for zone in zones:
+            try:
+                self._schedules.append(compile_schedule(zone.get("active_schedule")))
+            except ValueError as e:
+                # The backend rejects these on save; never arm a zone outside its intended hours
+                print(f"Invalid active_schedule for zone {zone.get('zone_id')}, zone disabled: {e}")
+                self._schedules.append(Schedule([]))
+        self._active: Optional[Set[int]] = None
+        self._next_refresh = 0.0
+        self._refresh_active(time.time())
+        # (track_id, zone index) tripwire pairs that fired and have not re-armed yet
+        self._disarmed: Set[Tuple[int, int]] = set()
+        # Dwell timers: (track_id, zone index) -> [entered_ts, last_seen_ts, fired]
+        self._dwell: Dict[Tuple[int, int], List] = {}
+        self._dwell_heap: List[Tuple[float, int, int, float]] = []
+        self._dwell_sweep_ts = 0.0
     
-    def check_detection(self, detection: Detection) -> Optional[Dict]:
-        """Check if detection is in any zone."""
-        center = bbox_center(detection.bbox)
+    def _refresh_active(self, now: float):
+        """Recompile the engine with the zones whose schedule is on at `now`."""
+        week_sec = week_seconds(now)
+        active = set()
+        next_change = SCHEDULE_MAX_REFRESH_SEC
+        for i, schedule in enumerate(self._schedules):
+            if schedule is None:
+                active.add(i)
+                continue
+            if schedule.is_active(week_sec):
+                active.add(i)
+            next_change = min(next_change, schedule.next_boundary(week_sec))
+        self._next_refresh = now + max(next_change, 1.0)
+        
+        if active != self._active:
+            self._active = active
+            self._compile()
+    
+    def _compile(self):
+        """Compile active zone definitions into flat geometry arrays."""
+        self._compiled: List[Dict] = []
+        self._col_zone: List[int] = []  # Engine column -> index into self.zones
+        allowed, min_sizes, dwell_secs = [], [], []
+        poly_cols, poly_bboxes, edge_starts = [], [], []
+        edges = []
+        wire_cols, wire_segments, wire_dirs = [], [], []
         
-        for zone in self.zones:
+        for zone_idx, zone in enumerate(self.zones):
             zone_type = zone.get("type", "polygon")
             points = zone.get("points", [])
-            allowed_classes = zone.get("allowed_classes", [])
-            
-            if not points:
+            if not points or zone_idx not in self._active:
                 continue
             
-            # Check class filter
-            if allowed_classes and detection.cls not in allowed_classes:
+            col = len(self._compiled)
+            if zone_type == "polygon" and len(points) >= 3:
+                pts = np.asarray(points, dtype=np.float64)[:, :2]
+                edge_starts.append(len(edges))
+                edges.extend(np.hstack([pts, np.roll(pts, -1, axis=0)]).tolist())
+                poly_bboxes.append([pts[:, 0].min(), pts[:, 1].min(), pts[:, 0].max(), pts[:, 1].max()])
+                poly_cols.append(col)
+                event_type = "loitering" if zone.get("dwell_sec") else "intrusion"
+            elif zone_type == "tripwire" and len(points) >= 2:
+                wire_segments.append([points[0][0], points[0][1], points[1][0], points[1][1]])
+                wire_cols.append(col)
+                wire_dirs.append(TRIPWIRE_DIRECTIONS.get(zone.get("direction"), 0))
+                event_type = "tripwire"
+            else:
                 continue
             
-            # Check zone type
-            if zone_type == "polygon":
-                if point_in_polygon(center, points):
-                    return {
-                        "zone_id": zone.get("zone_id"),
-                        "zone_name": zone.get("name"),
-                        "type": "intrusion"
-                    }
-            elif zone_type == "tripwire":
-                # Check if bbox crosses tripwire (simplified)
-                if len(points) >= 2:
-                    # Check if detection crosses line between first two points
-                    if self._crosses_line(detection.bbox, points[0], points[1]):
-                        return {
-                            "zone_id": zone.get("zone_id"),
-                            "zone_name": zone.get("name"),
-                            "type": "tripwire"
-                        }
-        
-        return None
+            self._compiled.append({
+                "zone_id": zone.get("zone_id"),
+                "zone_name": zone.get("name"),
+                "type": event_type
+            })
+            self._col_zone.append(zone_idx)
+            allowed.append(frozenset(zone.get("allowed_classes") or []))
+            min_sizes.append(float(zone.get("min_size_px") or 0))
+            dwell_secs.append(float(zone.get("dwell_sec") or 0) if zone_type == "polygon" else 0.0)
+        
+        self._allowed = allowed
+        self._min_size = np.asarray(min_sizes, dtype=np.float64)
+        self._dwell_sec = np.asarray(dwell_secs, dtype=np.float64)
+        self._dwell_cols = np.flatnonzero(self._dwell_sec > 0)
+        self._one_shot = np.asarray([info["type"] != "intrusion" for info in self._compiled], dtype=bool)
+        
+        # Polygon edges: (E,) arrays, grouped per zone by edge_starts
+        self._poly_cols = np.asarray(poly_cols, dtype=np.intp)
+        self._poly_bboxes = np.asarray(poly_bboxes, dtype=np.float64).reshape(-1, 4)
+        self._edge_starts = np.asarray(edge_starts, dtype=np.intp)
+        e = np.asarray(edges, dtype=np.float64).reshape(-1, 4)
+        self._ex1, self._ey1, self._ex2, self._ey2 = e[:, 0], e[:, 1], e[:, 2], e[:, 3]
+        dy = self._ey2 - self._ey1
+        self._eslope = np.divide(self._ex2 - self._ex1, dy, out=np.zeros_like(dy), where=dy != 0)
+        
+        # Tripwire segments: (T,) arrays
+        self._wire_cols = np.asarray(wire_cols, dtype=np.intp)
+        self._zone_col = {zone_idx: col for col, zone_idx in enumerate(self._col_zone)}
+        self._zone_wire = {self._col_zone[col]: w for w, col in enumerate(wire_cols)}
+        w = np.asarray(wire_segments, dtype=np.float64).reshape(-1, 4)
+        self._wx1, self._wy1 = w[:, 0], w[:, 1]
+        self._wdx, self._wdy = w[:, 2] - w[:, 0], w[:, 3] - w[:, 1]
+        self._wlen = np.hypot(self._wdx, self._wdy)
+        self._wdir = np.asarray(wire_dirs, dtype=np.int8)
+        
+        # Per-class allowed-zone masks, built lazily
+        self._class_masks: Dict[str, np.ndarray] = {}
+    
+    def _class_mask(self, cls: str) -> np.ndarray:
+        """Get boolean mask of zones that apply to a class."""
+        mask = self._class_masks.get(cls)
+        if mask is None:
+            mask = np.array(
+                [not classes or cls in classes for classes in self._allowed],
+                dtype=bool
+            )
+            self._class_masks[cls] = mask
+        return mask
+    
+    def check_detection(
+        self,
+        detection: Detection,
+        tracks: Optional[Dict] = None,
+        timestamp: Optional[float] = None
+    ) -> Optional[Dict]:
+        """Check if detection is in any zone."""
+        return self.check_detections([detection], tracks, timestamp)[0]
     
-    def _crosses_line(
+    def check_detections(
         self,
-        bbox: Tuple[float, float, float, float],
-        p1: List[float],
-        p2: List[float]
-    ) -> bool:
-        """Check if bbox crosses line segment."""
-        # Simplified: check if bbox center is near line
-        center = bbox_center(bbox)
-        x, y = center
+        detections: List[Detection],
+        tracks: Optional[Dict] = None,
+        timestamp: Optional[float] = None
+    ) -> List[Optional[Dict]]:
+        """Check all detections of a frame against all zones at once.
         
-        x1, y1 = p1
-        x2, y2 = p2
+        `tracks` maps track_id -> Track (from the tracker) and is needed for
+        tripwire crossings. Returns one entry per detection: the first
+        one-shot result (tripwire crossing, loitering timer firing) in zone
+        order, else the first zone it is inside, else None. One-shot results
+        go first because they are not repeated on the next frame, while
+        presence in a zone is.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        now = time.time()
+        if now >= self._next_refresh:
+            self._refresh_active(now)
+        n = len(detections)
+        if n == 0 or not self._compiled:
+            return [None] * n
         
-        # Distance from point to line segment
-        A = x - x1
-        B = y - y1
-        C = x2 - x1
-        D = y2 - y1
+        boxes = np.asarray([det.bbox for det in detections], dtype=np.float64).reshape(n, 4)
+        px = ((boxes[:, 0] + boxes[:, 2]) / 2)[:, None]
+        py = ((boxes[:, 1] + boxes[:, 3]) / 2)[:, None]
         
-        dot = A * C + B * D
-        len_sq = C * C + D * D
+        # Class and minimum-size prefilter, applied before any geometry
+        size = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])[:, None]
+        eligible = np.stack([self._class_mask(det.cls) for det in detections]) & (size >= self._min_size)
         
-        if len_sq == 0:
-            return False
+        hits = np.zeros((n, len(self._compiled)), dtype=bool)
+        crossing_dirs = None
+        dwell_times = {}
         
-        param = dot / len_sq
+        if len(self._poly_cols):
+            hits[:, self._poly_cols] = self._points_in_polygons(px, py, eligible[:, self._poly_cols])
+        if len(self._dwell_cols):
+            dwell_times = self._update_dwell(hits, detections, timestamp)
+        if len(self._wire_cols) and tracks:
+            crossing_dirs = self._tripwire_crossings(detections, tracks)
+            hits[:, self._wire_cols] = (crossing_dirs > 0) & eligible[:, self._wire_cols]
         
-        if param < 0 or param > 1:
-            return False
+        matched = hits.any(axis=1)
+        one_shot = hits & self._one_shot
+        first = np.where(one_shot.any(axis=1), one_shot.argmax(axis=1), hits.argmax(axis=1))
+        results: List[Optional[Dict]] = [None] * n
+        for i in np.flatnonzero(matched):
+            col = first[i]
+            info = dict(self._compiled[col])
+            if info["type"] == "tripwire":
+                wire = int(np.searchsorted(self._wire_cols, col))
+                info["direction"] = "AtoB" if crossing_dirs[i, wire] == 1 else "BtoA"
+            elif info["type"] == "loitering":
+                info["dwell_sec"] = dwell_times[(i, col)]
+            results[i] = info
+        return results
+    
+    def _points_in_polygons(self, px: np.ndarray, py: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+        """Even-odd ray cast of (N, 1) points against all polygons -> (N, P)."""
+        bx = self._poly_bboxes
+        inside = eligible & (px >= bx[:, 0]) & (px <= bx[:, 2]) & (py >= bx[:, 1]) & (py <= bx[:, 3])
+        rows = np.flatnonzero(inside.any(axis=1))
+        if len(rows) == 0:
+            return inside
+        
+        rx, ry = px[rows], py[rows]
+        straddles = (self._ey1 > ry) != (self._ey2 > ry)
+        crosses = straddles & (rx < self._ex1 + (ry - self._ey1) * self._eslope)
+        parity = np.add.reduceat(crosses.astype(np.uint8), self._edge_starts, axis=1) & 1
+        inside[rows] &= parity.astype(bool)
+        return inside
+    
+    def _update_dwell(self, hits: np.ndarray, detections: List[Detection], timestamp: float) -> Dict:
+        """Run dwell timers for loitering zones, rewriting their `hits` columns.
         
-        xx = x1 + param * C
-        yy = y1 + param * D
+        On return a loitering column is True only on the frame its timer
+        fires. Returns {(row, col): seconds dwelled} for fired entries.
+        """
+        present = {}
+        for i, col in zip(*np.nonzero(hits[:, self._dwell_cols])):
+            col = int(self._dwell_cols[col])
+            track_id = getattr(detections[i], "track_id", None)
+            if track_id is None:
+                continue
+            zone_idx = self._col_zone[col]
+            key = (track_id, zone_idx)
+            present[key] = i
+            entry = self._dwell.get(key)
+            if entry is None:
+                self._dwell[key] = [timestamp, timestamp, False]
+                heapq.heappush(self._dwell_heap, (timestamp + self._dwell_sec[col], track_id, zone_idx, timestamp))
+            else:
+                entry[1] = timestamp
         
-        dx = x - xx
-        dy = y - yy
-        dist = np.sqrt(dx * dx + dy * dy)
+        hits[:, self._dwell_cols] = False
+        fired = {}
+        retry = []
+        while self._dwell_heap and self._dwell_heap[0][0] <= timestamp:
+            _, track_id, zone_idx, entered = heapq.heappop(self._dwell_heap)
+            key = (track_id, zone_idx)
+            entry = self._dwell.get(key)
+            if entry is None or entry[2] or entry[0] != entered:
+                # Stale timer from an earlier visit
+                continue
+            col = self._zone_col.get(zone_idx)
+            if col is None:
+                # Zone was switched off by its schedule
+                del self._dwell[key]
+                continue
+            row = present.get(key)
+            if row is not None:
+                entry[2] = True
+                hits[row, col] = True
+                fired[(row, col)] = timestamp - entry[0]
+            elif timestamp - entry[1] <= DWELL_GRACE_SEC:
+                # Briefly lost - check again on the next frame
+                retry.append((timestamp, track_id, zone_idx, entered))
+            else:
+                del self._dwell[key]
+        for item in retry:
+            heapq.heappush(self._dwell_heap, item)
         
-        # Threshold: within 50 pixels
-        return dist < 50
-
+        # Forget pairs whose track left the zone (fired entries have no heap item)
+        if timestamp - self._dwell_sweep_ts > DWELL_GRACE_SEC:
+            self._dwell_sweep_ts = timestamp
+            self._dwell = {
+                key: entry for key, entry in self._dwell.items()
+                if timestamp - entry[1] <= DWELL_GRACE_SEC
+            }
+        return fired
+    
+    def _tripwire_crossings(self, detections: List[Detection], tracks: Dict) -> np.ndarray:
+        """Test each track's last movement against all tripwires -> (N, T).
+        
+        Entries are 0 (no event), 1 (crossed A->B) or 2 (crossed B->A).
+        """
+        n, t = len(detections), len(self._wire_cols)
+        prev = np.zeros((n, 2))
+        cur = np.zeros((n, 2))
+        valid = np.zeros(n, dtype=bool)
+        track_ids = [getattr(det, "track_id", None) for det in detections]
+        for i, track_id in enumerate(track_ids):
+            track = tracks.get(track_id) if track_id is not None else None
+            if track is None or track.trajectory.count < 2:
+                continue
+            cur[i] = track.trajectory.last(0)
+            prev[i] = track.trajectory.last(1)
+            valid[i] = True
+        
+        result = np.zeros((n, t), dtype=np.int8)
+        if not valid.any():
+            return result
+        
+        # Side of each position relative to each wire: cross(d, p - p1)
+        def side(p):
+            return self._wdx * (p[:, 1:2] - self._wy1) - self._wdy * (p[:, 0:1] - self._wx1)
+        
+        s_prev, s_cur = side(prev), side(cur)
+        
+        # Movement segment endpoints must straddle the wire's line...
+        straddle = ((s_prev > 0) & (s_cur <= 0)) | ((s_prev <= 0) & (s_cur > 0))
+        # ...and the wire's endpoints must straddle the movement's line
+        mx = (cur[:, 0] - prev[:, 0])[:, None]
+        my = (cur[:, 1] - prev[:, 1])[:, None]
+        a1 = mx * (self._wy1 - prev[:, 1:2]) - my * (self._wx1 - prev[:, 0:1])
+        a2 = mx * (self._wy1 + self._wdy - prev[:, 1:2]) - my * (self._wx1 + self._wdx - prev[:, 0:1])
+        crossed = straddle & (a1 * a2 <= 0) & valid[:, None]
+        
+        direction = np.where(s_prev > 0, 1, 2).astype(np.int8)
+        wanted = (self._wdir == 0) | (self._wdir == direction)
+        
+        # Re-arm wires once the track is clear of the line
+        if self._disarmed:
+            rows = {track_id: i for i, track_id in enumerate(track_ids) if valid[i]}
+            far = np.abs(s_cur) >= TRIPWIRE_REARM_PX * self._wlen
+            for key in list(self._disarmed):
+                i = rows.get(key[0])
+                w = self._zone_wire.get(key[1])
+                if w is None:
+                    self._disarmed.discard(key)
+                elif i is not None and far[i, w]:
+                    self._disarmed.discard(key)
+                elif i is None and key[0] not in tracks:
+                    self._disarmed.discard(key)
+        
+        for i, w in zip(*np.nonzero(crossed)):
+            key = (track_ids[i], self._col_zone[self._wire_cols[w]])
+            if key in self._disarmed:
+                continue
+            # Any crossing disarms the wire so jitter back over the line is ignored
+            self._disarmed.add(key)
+            if wanted[i, w]:
+                result[i, w] = direction[i, w]
+        return result
@@ -0,0 +1,141 @@
+"""Encode-once JPEG preview tiers served as MJPEG."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import time
+import cv2
+import numpy as np
+
+MJPEG_BOUNDARY = "frame"
+
+
+def parse_tiers(spec: str) -> List[Dict]:
+    """Parse "name:width:quality,..." (width 0 = source width) into tier dicts."""
+    tiers = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, width, quality = entry.split(":")
+        tiers.append({"name": name, "width": int(width), "quality": int(quality)})
+    return tiers
+
+
+class PreviewTier:
+    """One size/quality tier: the latest encoded JPEG shared by all its viewers."""
+
+    def __init__(self, name: str, width: int, quality: int):
+        self.name = name
+        self.width = width
+        self.quality = quality
+        self.jpeg: Optional[bytes] = None
+        self.frame_idx = 0
+        self.viewers = 0
+        self.encoding = False  # An encode is in flight on the worker pool
+        self.last_encode = 0.0
+        self.updated: Optional[asyncio.Event] = None  # Created on the running loop by the first viewer
+
+        # Metrics
+        self.encoded = 0
+        self.skipped = 0
+
+    def encode(self, frame: np.ndarray) -> bytes:
+        """Resize and JPEG-encode a frame (runs on a worker thread)."""
+        h, w = frame.shape[:2]
+        if self.width and w > self.width:
+            frame = cv2.resize(frame, (self.width, int(h * self.width / w)), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise RuntimeError("JPEG encode failed")
+        return buf.tobytes()
+
+    def publish(self, jpeg: bytes, frame_idx: int):
+        """Store a new JPEG and wake every viewer."""
+        self.jpeg = jpeg
+        self.frame_idx = frame_idx
+        self.encoded += 1
+        updated, self.updated = self.updated, asyncio.Event()
+        if updated:
+            updated.set()
+
+
+class PreviewHub:
+    """Shares the pipeline's decoded frames as JPEG previews.
+
+    Each tier is encoded on a worker thread at most once per frame, and only
+    while it has viewers. If the previous encode for a tier is still running
+    the frame is skipped for that tier rather than queued.
+    """
+
+    def __init__(self, tiers: List[Dict], max_fps: float = 10.0, workers: int = 1):
+        self.tiers: Dict[str, PreviewTier] = {
+            t["name"]: PreviewTier(t["name"], t["width"], t["quality"]) for t in tiers
+        }
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview")
+
+    @property
+    def has_viewers(self) -> bool:
+        """Whether any tier is being watched."""
+        return any(tier.viewers for tier in self.tiers.values())
+
+    def submit(self, frame: np.ndarray, frame_idx: int):
+        """Schedule encodes of a decoded frame for the watched tiers (non-blocking)."""
+        now = time.time()
+        loop = asyncio.get_event_loop()
+        for tier in self.tiers.values():
+            if not tier.viewers:
+                continue
+            if tier.encoding or now - tier.last_encode < self.min_interval:
+                tier.skipped += 1
+                continue
+            tier.encoding = True
+            tier.last_encode = now
+            future = loop.run_in_executor(self.executor, tier.encode, frame)
+            future.add_done_callback(lambda f, tier=tier: self._encoded(tier, f, frame_idx))
+
+    def _encoded(self, tier: PreviewTier, future: asyncio.Future, frame_idx: int):
+        """Publish a finished encode (runs on the event loop)."""
+        tier.encoding = False
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print(f"Preview encode error ({tier.name}): {future.exception()}")
+            return
+        tier.publish(future.result(), frame_idx)
+
+    async def stream(self, name: str) -> AsyncIterator[bytes]:
+        """Yield multipart MJPEG parts for a tier until the viewer disconnects."""
+        tier = self.tiers[name]
+        tier.viewers += 1
+        if tier.updated is None:
+            tier.updated = asyncio.Event()
+        try:
+            last_idx = None
+            while True:
+                if tier.jpeg is None or tier.frame_idx == last_idx:
+                    await tier.updated.wait()
+                    continue
+                jpeg, last_idx = tier.jpeg, tier.frame_idx
+                yield (
+                    f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n"
+                ).encode() + jpeg + b"\r\n"
+        finally:
+            tier.viewers -= 1
+            if not tier.viewers:
+                # Don't show a stale frame to the next viewer
+                tier.jpeg = None
+
+    def metrics(self) -> Dict:
+        """Per-tier viewer and encode counters."""
+        return {
+            name: {
+                "width": tier.width,
+                "quality": tier.quality,
+                "viewers": tier.viewers,
+                "encoded": tier.encoded,
+                "skipped": tier.skipped
+            }
+            for name, tier in self.tiers.items()
+        }
@@ -0,0 +1,123 @@
+"""Event snapshots: JPEG encoding on a bounded worker pool with a per-event cap."""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+import asyncio
+import os
+import threading
+import cv2
+import numpy as np
+
+# Events whose snapshot counts are remembered (oldest forgotten first)
+TRACKED_EVENTS = 10000
+
+
+class SnapshotWriter:
+    """Writes event snapshots without blocking the pipeline.
+
+    A request is refused (and counted) when every event it is for already
+    has `max_per_event` snapshots, or when `max_pending` encodes are queued.
+    The JPEG is encoded and written atomically on a worker thread; accepted
+    requests return a future for its /storage URL, so callers only hand the
+    URL out once the file exists.
+    """
+
+    def __init__(self, root: Path, workers: int = 1, max_pending: int = 4, max_per_event: int = 10, quality: int = 90):
+        self.root = root
+        self.max_pending = max_pending
+        self.max_per_event = max_per_event
+        self.quality = quality
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snapshot")
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.counts: "OrderedDict[str, int]" = OrderedDict()
+
+        # Metrics
+        self.written = 0
+        self.capped = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def url(self, name: str) -> str:
+        """Public path of a snapshot (served by the backend's /storage mount)."""
+        return f"/storage/snaps/{name}"
+
+    def request(self, frame: np.ndarray, name: str, event_keys: Iterable[str]) -> Optional[asyncio.Future]:
+        """Queue a snapshot of `frame` for the given events (call from the event loop).
+
+        Returns a future resolving to the URL once the file is written (None
+        if the write failed), or None right away if every event is at its cap
+        or the pool is saturated. The frame must not be modified afterwards.
+        """
+        with self.lock:
+            keys = [key for key in event_keys if self.counts.get(key, 0) < self.max_per_event]
+            if not keys:
+                self.capped += 1
+                return None
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return None
+            self.pending += 1
+            for key in keys:
+                self.counts[key] = self.counts.get(key, 0) + 1
+                self.counts.move_to_end(key)
+            while len(self.counts) > TRACKED_EVENTS:
+                self.counts.popitem(last=False)
+
+        future = self.executor.submit(self._write, frame, self.root / name)
+        future.add_done_callback(self._done)
+        return asyncio.ensure_future(self._written(asyncio.wrap_future(future), self.url(name)))
+
+    @staticmethod
+    async def _written(write: asyncio.Future, url: str) -> Optional[str]:
+        """The URL once `write` succeeds; None if it failed (already logged by _done)."""
+        try:
+            await write
+        except Exception:
+            return None
+        return url
+
+    def forget(self, event_keys: Iterable[str]):
+        """Drop the snapshot counts of events that are over (e.g. their track ended)."""
+        with self.lock:
+            for key in event_keys:
+                self.counts.pop(key, None)
+
+    async def save(self, frame: np.ndarray, name: str) -> Path:
+        """Write a snapshot now (no cap) and wait for it without blocking the loop."""
+        path = self.root / name
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._write, frame, path)
+        return path
+
+    def _write(self, frame: np.ndarray, path: Path):
+        """Encode and write atomically (runs on a worker thread)."""
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise RuntimeError("JPEG encode failed")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(buf.tobytes())
+        os.replace(tmp, path)
+
+    def _done(self, future):
+        """Book-keeping once a queued write finishes."""
+        with self.lock:
+            self.pending -= 1
+            if future.exception() is None:
+                self.written += 1
+            else:
+                self.failed += 1
+        if future.exception() is not None:
+            print(f"Snapshot write failed: {future.exception()}")
+
+    def metrics(self) -> Dict:
+        """Snapshot counters."""
+        return {
+            "written": self.written,
+            "pending": self.pending,
+            "capped": self.capped,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
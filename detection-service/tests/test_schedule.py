@@ -0,0 +1,69 @@
+"""Weekly schedule interval index."""
+import pytest
+
+from detectsvc.pipeline.schedule import WEEK_SEC, compile_schedule
+
+DAY = 86400
+HOUR = 3600
+MON, TUE, FRI, SAT, SUN = 0, 1, 4, 5, 6
+
+
+def at(day, hour, minute=0):
+    """Week-seconds for a weekday and local time."""
+    return day * DAY + hour * HOUR + minute * 60
+
+
+def test_no_schedule_is_always_active():
+    assert compile_schedule(None) is None
+    assert compile_schedule({}) is None
+    assert compile_schedule("") is None
+
+
+def test_overnight_weekday_window():
+    schedule = compile_schedule("weekdays 18:00–07:00")
+    assert schedule.is_active(at(MON, 18))
+    assert schedule.is_active(at(TUE, 6, 59))
+    assert not schedule.is_active(at(TUE, 7))
+    assert not schedule.is_active(at(TUE, 12))
+    # Friday night runs into Saturday morning; Sunday night is not a weekday
+    assert schedule.is_active(at(SAT, 6))
+    assert not schedule.is_active(at(SAT, 8))
+    assert not schedule.is_active(at(SUN, 23))
+    assert not schedule.is_active(at(MON, 6))
+
+
+def test_sunday_overnight_wraps_to_monday():
+    schedule = compile_schedule({"days": "sun", "start": "22:00", "end": "02:00"})
+    assert schedule.starts == [0, at(SUN, 22)]
+    assert schedule.ends == [at(MON, 2), WEEK_SEC]
+    assert schedule.is_active(at(SUN, 23)) and schedule.is_active(at(MON, 1))
+    assert not schedule.is_active(at(MON, 2))
+
+
+def test_text_and_dict_forms_compile_alike():
+    text = compile_schedule("mon-fri 18:00-07:00; sat,sun 00:00-24:00")
+    spec = compile_schedule({"windows": [
+        {"days": "weekdays", "start": "18:00", "end": "07:00"},
+        {"days": ["sat", "sun"]}
+    ]})
+    assert (text.starts, text.ends) == (spec.starts, spec.ends)
+
+
+def test_adjacent_windows_merge():
+    schedule = compile_schedule("daily 00:00-12:00; daily 12:00-24:00")
+    assert (schedule.starts, schedule.ends) == ([0], [WEEK_SEC])
+
+
+def test_next_boundary():
+    schedule = compile_schedule("weekdays 09:00-17:00")
+    assert schedule.next_boundary(at(MON, 8)) == HOUR  # Switches on
+    assert schedule.next_boundary(at(MON, 16)) == HOUR  # Switches off
+    assert schedule.next_boundary(at(SAT, 12)) == at(MON, 9) + WEEK_SEC - at(SAT, 12)  # Wraps the week
+
+
+@pytest.mark.parametrize("spec", [
+    "weekdays", "someday 18:00-07:00", "25:00-26:00", 5, {"start": 1800}, {"windows": "x"}, {"windows": [3]}
+])
+def test_invalid_specs_raise_value_error(spec):
+    with pytest.raises(ValueError):
+        compile_schedule(spec)
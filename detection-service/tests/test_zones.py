@@ -0,0 +1,102 @@
+"""Vectorized zone geometry against the scalar reference."""
+import numpy as np
+
+from detectsvc.accel.base import Detection
+from detectsvc.pipeline.tracker import Track
+from detectsvc.pipeline.zones import TRIPWIRE_REARM_PX, ZoneChecker, point_in_polygon
+
+
+def _polygons(rng, count):
+    """Random star-shaped (often concave) polygons."""
+    polygons = []
+    for _ in range(count):
+        cx, cy = rng.uniform(100, 540), rng.uniform(100, 380)
+        n = rng.integers(3, 12)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, n))
+        radii = rng.uniform(20, 150, n)
+        polygons.append(np.column_stack([cx + radii * np.cos(angles), cy + radii * np.sin(angles)]).tolist())
+    return polygons
+
+
+def test_points_in_polygons_matches_point_in_polygon():
+    rng = np.random.default_rng(27)
+    polygons = _polygons(rng, 12)
+    checker = ZoneChecker([
+        {"zone_id": f"z{i}", "name": f"z{i}", "type": "polygon", "points": points}
+        for i, points in enumerate(polygons)
+    ])
+    px = rng.uniform(0, 640, (500, 1))
+    py = rng.uniform(0, 480, (500, 1))
+    eligible = np.ones((500, len(polygons)), dtype=bool)
+
+    inside = checker._points_in_polygons(px, py, eligible)
+
+    expected = np.array([
+        [point_in_polygon((x, y), polygon) for polygon in polygons]
+        for x, y in zip(px[:, 0], py[:, 0])
+    ])
+    assert inside.any()
+    np.testing.assert_array_equal(inside, expected)
+
+
+def test_ineligible_pairs_are_never_inside():
+    square = [[0, 0], [100, 0], [100, 100], [0, 100]]
+    checker = ZoneChecker([{"zone_id": "a", "name": "a", "type": "polygon", "points": square}])
+    inside = checker._points_in_polygons(np.array([[50.0], [50.0]]), np.array([[50.0], [50.0]]), np.array([[True], [False]]))
+    assert inside[:, 0].tolist() == [True, False]
+
+
+class _Walker:
+    """One tracked object moved to given centers, checked frame by frame."""
+
+    def __init__(self, checker, track_id=1):
+        self.checker = checker
+        self.track_id = track_id
+        self.tracks = {}
+        self.ts = 0.0
+
+    def step(self, x, y=100.0):
+        self.ts += 0.1
+        det = Detection("person", 0.9, (x - 5, y - 5, x + 5, y + 5))
+        det.track_id = self.track_id
+        track = self.tracks.get(self.track_id)
+        if track is None:
+            self.tracks[self.track_id] = Track(self.track_id, det, self.ts)
+        else:
+            track.update(det, self.ts)
+        result = self.checker.check_detections([det], self.tracks, self.ts)[0]
+        return (result["zone_id"], result.get("direction")) if result else None
+
+
+# Vertical wire at x=100: side A (left of p1 -> p2 in image coordinates) is x < 100
+WIRE = {"zone_id": "w", "name": "wire", "type": "tripwire", "points": [[100, 0], [100, 200]]}
+
+
+def test_tripwire_direction_follows_side_convention():
+    walker = _Walker(ZoneChecker([WIRE]))
+    assert [walker.step(x) for x in (90, 95, 105)] == [None, None, ("w", "AtoB")]
+
+    walker = _Walker(ZoneChecker([WIRE]))
+    assert [walker.step(x) for x in (110, 105, 95)] == [None, None, ("w", "BtoA")]
+
+
+def test_tripwire_direction_filter():
+    walker = _Walker(ZoneChecker([dict(WIRE, direction="BtoA")]))
+    assert [walker.step(x) for x in (90, 105, 120, 90)] == [None, None, None, ("w", "BtoA")]
+
+
+def test_tripwire_rearms_only_after_leaving_the_line():
+    walker = _Walker(ZoneChecker([WIRE]))
+    walker.step(90)
+    assert walker.step(102) == ("w", "AtoB")
+    # Jitter across the line within TRIPWIRE_REARM_PX is ignored
+    assert [walker.step(x) for x in (98, 103, 97)] == [None, None, None]
+    # Clear of the line on side A, the wire re-arms and fires again
+    walker.step(100 - TRIPWIRE_REARM_PX - 2)
+    assert walker.step(104) == ("w", "AtoB")
+
+
+def test_tripwire_crossing_inside_a_polygon_is_reported():
+    yard = {"zone_id": "p", "name": "yard", "type": "polygon", "points": [[0, 0], [200, 0], [200, 200], [0, 200]]}
+    walker = _Walker(ZoneChecker([yard, WIRE]))
+    assert [walker.step(x) for x in (94, 98, 102, 106)] == [("p", None), ("p", None), ("w", "AtoB"), ("p", None)]
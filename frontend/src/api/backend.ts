@@ -89,10 +89,33 @@ export const eventsApi = {
   }) => api.get<Event[]>('/api/events', { params }).then(r => r.data)
 }
 
+export interface QueryResult {
+  event_id: string
+  cls: string
+  conf: number
+  t_start: number
+  snapshot_path?: string
+  bbox_xyxy: number[]
+  zone?: string
+}
+
+export interface QueryAnswer {
+  query: string
+  plan: Record<string, any>
+  kind: 'count' | 'list'
+  answer: string
+  count?: number
+  groups: { key: any; count: number }[]
+  events: QueryResult[]
+}
+
 // Query API
 export const queryApi = {
   query: (query: string, t_start?: number, t_end?: number) =>
-    api.post('/api/query', { query, t_start, t_end }).then(r => r.data)
+    api.post('/api/query', { query, t_start, t_end }).then(r => r.data),
+  // Counts ("how many cars today") are answered from rollups; other questions list events
+  ask: (query: string, t_start?: number, t_end?: number) =>
+    api.post<QueryAnswer>('/api/query/ask', { query, t_start, t_end }).then(r => r.data)
 }
 
 // SOS API
@@ -1,5 +1,5 @@
 import { useState } from 'react'
-import { queryApi } from '../api/backend'
+import { queryApi, QueryAnswer } from '../api/backend'
 import './Chatbot.css'
 
 interface QueryResult {
@@ -16,60 +16,22 @@ interface QueryResult {
 export default function Chatbot() {
   const [query, setQuery] = useState('')
   const [results, setResults] = useState<QueryResult[]>([])
+  const [answer, setAnswer] = useState<QueryAnswer | null>(null)
   const [loading, setLoading] = useState(false)
   const [downloadFormat, setDownloadFormat] = useState<'zip' | 'json' | 'csv'>('zip')
 
-  const parseQuery = (queryText: string): { object: string; startTime?: number; endTime?: number } => {
-    // Parse queries like "find me person between 10:00 and 12:00"
-    const lowerQuery = queryText.toLowerCase()
-    const findMatch = lowerQuery.match(/find me (.+?)(?: between|$)/)
-    const betweenMatch = lowerQuery.match(/between (.+?) and (.+?)(?:$| on| today)/)
-    
-    let object = 'person' // default
-    if (findMatch) {
-      object = findMatch[1].trim()
-    }
-    
-    let startTime: number | undefined
-    let endTime: number | undefined
-    
-    if (betweenMatch) {
-      const startStr = betweenMatch[1].trim()
-      const endStr = betweenMatch[2].trim()
-      
-      // Parse time strings (e.g., "10:00", "12:00")
-      const parseTime = (timeStr: string): number => {
-        const [hours, minutes] = timeStr.split(':').map(Number)
-        const now = new Date()
-        const date = new Date(now.getFullYear(), now.getMonth(), now.getDate(), hours || 0, minutes || 0)
-        return date.getTime() / 1000
-      }
-      
-      try {
-        startTime = parseTime(startStr)
-        endTime = parseTime(endStr)
-      } catch (e) {
-        console.error('Failed to parse time:', e)
-      }
-    }
-    
-    return { object, startTime, endTime }
-  }
-
   const handleQuery = async () => {
     if (!query.trim()) return
 
     setLoading(true)
     try {
-      const parsed = parseQuery(query)
-      const data = await queryApi.query(
-        parsed.object,
-        parsed.startTime,
-        parsed.endTime
-      )
-      setResults(Array.isArray(data) ? data : [])
+      // The backend parses the question, including its time range ("between 10:00 and 12:00", "today")
+      const data = await queryApi.ask(query)
+      setAnswer(data)
+      setResults(data.events)
     } catch (error) {
       console.error('Query failed:', error)
+      setAnswer(null)
       setResults([])
       alert('Query failed. Please check your query format.')
     } finally {
@@ -170,7 +132,7 @@ export default function Chatbot() {
       <div className="chatbot-input">
         <input
           type="text"
-          placeholder='e.g., "find me person between 10:00 and 12:00"'
+          placeholder='e.g., "find me person between 10:00 and 12:00" or "how many cars today"'
           value={query}
           onChange={(e) => setQuery(e.target.value)}
           onKeyPress={(e) => e.key === 'Enter' && handleQuery()}
@@ -180,6 +142,21 @@ export default function Chatbot() {
         </button>
       </div>
 
+      {answer?.kind === 'count' && (
+        <div className="results-header">
+          <span>{answer.answer}</span>
+          {answer.groups.length > 0 && (
+            <ul className="result-groups">
+              {answer.groups.map((group) => (
+                <li key={String(group.key)}>
+                  {group.key ?? 'none'}: {group.count}
+                </li>
+              ))}
+            </ul>
+          )}
+        </div>
+      )}
+
       {results.length > 0 && (
         <>
           <div className="results-header">
@@ -247,7 +224,7 @@ export default function Chatbot() {
         </>
       )}
 
-      {!loading && results.length === 0 && query && (
+      {!loading && results.length === 0 && answer?.kind !== 'count' && query && (
         <div className="no-results">No results found</div>
       )}
     </div>